@@ -0,0 +1,196 @@
+"""
+Gallery analysis: per-image color/tone features and the config they suggest.
+
+Features are computed from tiny samples (the 32px LQIP stored with each image,
+or a downsampled thumbnail) stacked into one (N, 32, 32, 3) array, so every
+statistic is a single NumPy expression over the whole gallery rather than a
+Python loop per image. Results are plain lists/floats so they can be cached in
+images.metadata["features"] and reused on the next analysis.
+"""
+
+import base64
+import io
+
+from imaging import downsample
+
+FEATURES_VERSION = 1
+SAMPLE_SIZE = 32
+HISTOGRAM_BINS = 8
+PALETTE_SIZE = 5
+_PALETTE_BITS = 4  # 16 levels per channel -> 4096 color cells
+
+# Threshold is the cursor distance (px) before the next image appears; the frontend allows 20-200
+MIN_THRESHOLD = 40
+MAX_THRESHOLD = 140
+
+ANIMATION_FOR_MOOD = {
+    "calm": "fade",
+    "elegant": "fade",
+    "mysterious": "fade",
+    "dramatic": "zoom",
+    "energetic": "burst",
+    "playful": "slide",
+}
+
+
+def _np():
+    import numpy
+    return numpy
+
+
+def sample_from_data_uri(Image, data_uri):
+    """Decode a stored LQIP data: URI into a SAMPLE_SIZE square RGB image"""
+    encoded = data_uri.split(",", 1)[1]
+    img = Image.open(io.BytesIO(base64.b64decode(encoded))).convert("RGB")
+    return img.resize((SAMPLE_SIZE, SAMPLE_SIZE))
+
+
+def sample_from_image(img):
+    """Downsample an opened image (thumbnail or original) into a SAMPLE_SIZE square RGB image"""
+    return downsample(img, SAMPLE_SIZE).resize((SAMPLE_SIZE, SAMPLE_SIZE))
+
+
+def extract_features(samples):
+    """
+    Features for a batch of SAMPLE_SIZE square RGB images, one dict per image.
+    All arithmetic runs on the stacked (N, H, W, 3) array.
+    """
+    np = _np()
+    if not samples:
+        return []
+    pixels = np.stack([np.asarray(s, dtype=np.uint8) for s in samples])  # (N, H, W, 3)
+    n = pixels.shape[0]
+    flat = pixels.reshape(n, -1, 3)
+    rgb = flat.astype(np.float32) / 255.0
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+
+    luma = 0.299 * r + 0.587 * g + 0.114 * b
+    cmax = rgb.max(axis=2)
+    cmin = rgb.min(axis=2)
+    delta = cmax - cmin
+    saturation = np.where(cmax > 0, delta / np.maximum(cmax, 1e-6), 0.0)
+
+    # Hue in [0, 1); only meaningful where there is some chroma
+    safe = np.maximum(delta, 1e-6)
+    hue = np.select(
+        [cmax == r, cmax == g],
+        [((g - b) / safe) % 6, (b - r) / safe + 2],
+        (r - g) / safe + 4
+    ) / 6.0
+
+    # Per-image histograms via one bincount over offset bin indices
+    offsets = (np.arange(n) * HISTOGRAM_BINS)[:, None]
+    luma_bins = np.minimum((luma * HISTOGRAM_BINS).astype(np.int64), HISTOGRAM_BINS - 1) + offsets
+    luma_hist = np.bincount(luma_bins.ravel(), minlength=n * HISTOGRAM_BINS).reshape(n, HISTOGRAM_BINS)
+    hue_bins = np.minimum((hue * HISTOGRAM_BINS).astype(np.int64), HISTOGRAM_BINS - 1) + offsets
+    hue_hist = np.bincount(hue_bins.ravel(), weights=saturation.ravel(),
+                           minlength=n * HISTOGRAM_BINS).reshape(n, HISTOGRAM_BINS)
+    luma_hist = luma_hist / luma_hist.sum(axis=1, keepdims=True)
+    hue_hist = hue_hist / np.maximum(hue_hist.sum(axis=1, keepdims=True), 1e-6)
+
+    # Palette: most populated cells of a 4-bit-per-channel histogram, with their mean colors
+    cells_per_image = 1 << (3 * _PALETTE_BITS)
+    shift = 8 - _PALETTE_BITS
+    q = (flat >> shift).astype(np.int64)
+    cells = (q[..., 0] << (2 * _PALETTE_BITS)) | (q[..., 1] << _PALETTE_BITS) | q[..., 2]
+    cells = (cells + (np.arange(n) * cells_per_image)[:, None]).ravel()
+    counts = np.bincount(cells, minlength=n * cells_per_image).reshape(n, cells_per_image)
+    sums = np.stack([
+        np.bincount(cells, weights=flat[..., c].ravel(), minlength=n * cells_per_image)
+        for c in range(3)
+    ], axis=-1).reshape(n, cells_per_image, 3)
+    top = np.argsort(-counts, axis=1, kind="stable")[:, :PALETTE_SIZE]
+    top_counts = np.take_along_axis(counts, top, axis=1)
+    top_colors = np.take_along_axis(sums, top[..., None], axis=1) / np.maximum(top_counts, 1)[..., None]
+    pixel_count = flat.shape[1]
+
+    brightness = luma.mean(axis=1)
+    contrast = luma.std(axis=1)
+    mean_saturation = saturation.mean(axis=1)
+    warmth = (r - b).mean(axis=1)
+
+    features = []
+    for i in range(n):
+        palette = [
+            {"color": "#%02x%02x%02x" % tuple(int(round(v)) for v in top_colors[i, k]),
+             "share": round(float(top_counts[i, k]) / pixel_count, 3)}
+            for k in range(PALETTE_SIZE) if top_counts[i, k] > 0
+        ]
+        features.append({
+            "version": FEATURES_VERSION,
+            "brightness": round(float(brightness[i]), 4),
+            "contrast": round(float(contrast[i]), 4),
+            "saturation": round(float(mean_saturation[i]), 4),
+            "warmth": round(float(warmth[i]), 4),
+            "luma_histogram": [round(float(v), 4) for v in luma_hist[i]],
+            "hue_histogram": [round(float(v), 4) for v in hue_hist[i]],
+            "palette": palette,
+        })
+    return features
+
+
+def _aspect_distribution(np, dimensions):
+    ratios = np.array([w / h for w, h in dimensions if w and h], dtype=np.float64)
+    if not ratios.size:
+        return {"landscape": 0.0, "portrait": 0.0, "square": 0.0, "mean_ratio": None}
+    return {
+        "landscape": round(float((ratios > 1.1).mean()), 3),
+        "portrait": round(float((ratios < 0.9).mean()), 3),
+        "square": round(float(((ratios >= 0.9) & (ratios <= 1.1)).mean()), 3),
+        "mean_ratio": round(float(ratios.mean()), 3),
+    }
+
+
+def _gallery_palette(features):
+    weights = {}
+    for feature in features:
+        for entry in feature["palette"]:
+            weights[entry["color"]] = weights.get(entry["color"], 0.0) + entry["share"]
+    ranked = sorted(weights.items(), key=lambda item: item[1], reverse=True)[:PALETTE_SIZE]
+    total = len(features) or 1
+    return [{"color": color, "share": round(weight / total, 3)} for color, weight in ranked]
+
+
+def pick_mood(brightness, contrast, saturation, warmth):
+    if brightness < 0.3:
+        return "dramatic" if contrast > 0.2 else "mysterious"
+    if saturation > 0.45:
+        return "playful" if warmth > 0.05 and brightness > 0.55 else "energetic"
+    if saturation < 0.18 and contrast < 0.22:
+        return "elegant"
+    if contrast > 0.28:
+        return "dramatic"
+    return "calm"
+
+
+def suggest_config(features, dimensions):
+    """
+    Gallery-level summary plus the threshold/animationType/mood it suggests.
+    `features` come from extract_features (or the cache), `dimensions` are (width, height) pairs.
+    """
+    np = _np()
+    stats = np.array([[f["brightness"], f["contrast"], f["saturation"], f["warmth"]] for f in features])
+    brightness, contrast, saturation, warmth = stats.mean(axis=0)
+    # How different the images are from each other: busy, varied galleries read better with a shorter trail step
+    variety = float(stats[:, :3].std(axis=0).mean()) if len(features) > 1 else 0.0
+
+    mood = pick_mood(brightness, contrast, saturation, warmth)
+    energy = min(1.0, 0.5 * saturation / 0.5 + 0.3 * contrast / 0.3 + 0.2 * variety / 0.15)
+    threshold = int(round((MAX_THRESHOLD - energy * (MAX_THRESHOLD - MIN_THRESHOLD)) / 5.0) * 5)
+
+    aspects = _aspect_distribution(np, dimensions)
+    animation = ANIMATION_FOR_MOOD[mood]
+    if animation == "fade" and max(aspects["landscape"], aspects["portrait"]) < 0.7 and len(dimensions) > 3:
+        animation = "slide"  # Mixed orientations: sliding hides the changing frame shape better than a cross-fade
+
+    summary = {
+        "imageCount": len(features),
+        "brightness": round(float(brightness), 3),
+        "contrast": round(float(contrast), 3),
+        "saturation": round(float(saturation), 3),
+        "warmth": round(float(warmth), 3),
+        "variety": round(variety, 3),
+        "palette": _gallery_palette(features),
+        "aspects": aspects,
+    }
+    return {"threshold": threshold, "animationType": animation, "mood": mood}, summary
@@ -1,29 +1,49 @@
 import os
 import re
-import uuid
-from datetime import datetime
-from flask import Flask, request, jsonify
-from supabase import create_client, Client
-from dotenv import load_dotenv
+from datetime import datetime, timezone
+from flask import Flask, request, jsonify, g, has_request_context, Response
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import threading
 import time
-import requests
-try:
-    from PIL import Image  # Optional: may fail on serverless without native libs
-    PIL_AVAILABLE = True
-except Exception as _pil_err:
-    Image = None  # type: ignore
-    PIL_AVAILABLE = False
-    print(f"[WARN] Pillow import failed or unavailable: {_pil_err}")
 import io
 import hashlib
-
-# Load environment variables from .env file
-load_dotenv()
+import tempfile
+import logging
+from log_config import configure_logging, writer_paused
+from metrics import Counter, Gauge, Histogram, render_metrics, SIZE_BUCKETS, COUNT_BUCKETS
+from singleflight import SingleFlight
+from ttl_cache import TTLCache
+from concurrency import TaskGroup
+from disk_cache import DiskLRUCache
+from image_pool import ImagePool, ImagePoolBusy
+from pixel_budget import PixelBudget, DecodeBudgetBusy, ImageTooLarge, decode_cost
+from jobs import JobQueue
+from ingest import IngestRequest
+from imaging import compute_placeholder, get_pil_image, MAX_IMAGE_PIXELS
+from tracing import RequestTrace, TraceBuffer, apply_headers
+from storage_gc import StorageGC
+import analysis
+
+# Heavy dependencies (supabase, Pillow, requests) are imported on first use so
+# that cold starts on Vercel only pay for what the request actually touches.
+# Vercel sets VERCEL=1 in every serverless function environment.
+IS_SERVERLESS = bool(os.environ.get("VERCEL") or os.environ.get("AWS_LAMBDA_FUNCTION_NAME"))
+
+# Load environment variables from .env file (serverless platforms inject them directly)
+if not IS_SERVERLESS:
+    from dotenv import load_dotenv
+    load_dotenv()
+
+configure_logging(serverless=IS_SERVERLESS)
+log = logging.getLogger("cursorgallery")
+auth_log = logging.getLogger("cursorgallery.auth")
+user_log = logging.getLogger("cursorgallery.user")
+gallery_log = logging.getLogger("cursorgallery.gallery")
 
 app = Flask(__name__)
+# Uploaded files are hashed and size-checked while they stream in (see ingest.py)
+app.request_class = IngestRequest
 # Enable CORS for all routes, allowing your React app to make requests
 # Production: Will be restricted via environment variable
 # Development: Allows all origins for local testing
@@ -37,24 +57,269 @@ SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in the .env file")
 
+_supabase_client = None
+_supabase_lock = threading.Lock()
+
+
+def get_supabase_client():
+    """Create the Supabase client on first use (importing supabase-py alone costs ~400ms)"""
+    global _supabase_client
+    if _supabase_client is None:
+        with _supabase_lock:
+            if _supabase_client is None:
+                from supabase import create_client
+                _instrument_supabase_http()
+                _supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _supabase_client
+
+
+class _LazySupabase:
+    """Proxy that forwards attribute access to the lazily created client"""
+
+    def __getattr__(self, name):
+        return getattr(get_supabase_client(), name)
+
+
 # Use a SINGLE Supabase client for all operations (including admin)
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-admin_supabase: Client = supabase
+supabase = _LazySupabase()
+admin_supabase = supabase
 
 # Basic startup status message (critical environment vars)
-print(f"Supabase URL configured: {bool(SUPABASE_URL)}")
-print(f"Supabase Key configured: {bool(SUPABASE_KEY)}")
+log.info("Supabase URL configured: %s", bool(SUPABASE_URL))
+log.info("Supabase Key configured: %s", bool(SUPABASE_KEY))
 
 if "service_role" in SUPABASE_KEY or SUPABASE_KEY.startswith("eyJ"):
-    print("[INFO] Using service_role key - Admin operations enabled.")
+    log.info("Using service_role key - Admin operations enabled.")
 else:
-    print("[WARNING] SUPABASE_KEY may be anon key - Admin operations may not work.")
+    log.warning("SUPABASE_KEY may be anon key - Admin operations may not work.")
+
+# Coalesce identical concurrent lookups (same token, same public gallery, same owner)
+token_flight = SingleFlight("auth_token")
+public_gallery_flight = SingleFlight("public_gallery")
+owner_flight = SingleFlight("gallery_owner")
 
 # Configuration
 STORAGE_BUCKET = "gallery-images"
+STORAGE_REMOVE_BATCH = 1000  # Keys per Storage remove call (the API's limit)
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp'}
+MAX_IMAGES_PER_GALLERY = 50
 THUMBNAIL_SIZE = (400, 400)
+VARIANT_SIZES = (800, 1600)  # Longest side of the resized copies served instead of the original
+VARIANT_QUALITY = 82
+IMAGE_FORMATS = {'jpeg': 'image/jpeg', 'webp': 'image/webp', 'avif': 'image/avif', 'png': 'image/png'}
+# Encoder quality per format; WebP/AVIF reach JPEG's visual quality at lower settings
+ENCODE_QUALITY = {
+    'jpeg': int(os.environ.get("JPEG_QUALITY", 85)),
+    'webp': int(os.environ.get("WEBP_QUALITY", 80)),
+    'avif': int(os.environ.get("AVIF_QUALITY", 60))
+}
+# Stored next to the JPEG thumbnail/variants, for clients that accept them (skipped if Pillow can't encode them)
+DERIVATIVE_FORMATS = tuple(f.strip().lower() for f in os.environ.get("DERIVATIVE_FORMATS", "webp,avif").split(",")
+                           if f.strip().lower() in ('webp', 'avif'))
+# Keep transparency in WebP/AVIF derivatives (JPEG ones are always flattened onto white)
+PRESERVE_ALPHA = os.environ.get("DERIVATIVE_PRESERVE_ALPHA", "true").lower() in ("1", "true", "yes")
+# Preference order for content negotiation; JPEG is what every client can decode
+NEGOTIATED_FORMATS = ('avif', 'webp', 'jpeg')
+RENDER_FITS = ('contain', 'cover', 'fill')
+MAX_RENDER_DIMENSION = 4096
+MANIFEST_FORMAT = 1  # Bump when the manifest layout changes
+MANIFEST_SIZE_CLASSES = (THUMBNAIL_SIZE[0],) + VARIANT_SIZES
+UUID_PATTERN = re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$')
+DUPLICATE_JOB_DELAY = 5  # Seconds a duplicate's derivatives job waits for the first copy's job
+ANALYSIS_FETCH_BATCH = 8  # Stored images /analyze downloads and decodes at once
+ANALYSIS_FETCH_TIMEOUT = 60  # Seconds for one such batch
+
+app.config["MAX_FILE_SIZE"] = MAX_FILE_SIZE
+app.config["MAX_IMAGE_PIXELS"] = MAX_IMAGE_PIXELS
+# Reject oversized bodies before parsing: a full gallery's worth of files plus form overhead
+app.config["MAX_CONTENT_LENGTH"] = MAX_IMAGES_PER_GALLERY * MAX_FILE_SIZE + 1024 * 1024
+app.config["UPLOAD_SPOOL_MEMORY"] = int(os.environ.get("UPLOAD_SPOOL_MEMORY", 1024 * 1024))
+
+# Defaults for a new user_settings row (mirrors the column defaults in migrations/)
+DEFAULT_PROFILE = {
+    "bio": "",
+    "website": "",
+    "location": ""
+}
+DEFAULT_PREFERENCES = {
+    "emailNotifications": True,
+    "browserNotifications": False,
+    "galleryUpdates": True,
+    "marketingEmails": False,
+    "defaultGalleryVisibility": "private",
+    "autoSave": True,
+    "compressImages": True,
+    "defaultThreshold": 80,
+    "language": "en"
+}
+
+# user_settings rows keyed by user id; writes in this process update it directly. Serverless instances
+# never see each other's writes, so there it is off by default (every read goes to Supabase)
+user_settings_cache = TTLCache("user_settings", maxsize=2048,
+                               ttl=int(os.environ.get("USER_SETTINGS_CACHE_TTL", 0 if IS_SERVERLESS else 300)))
+
+# Rendered sizes for /api/images/<id>/render, shared by the worker processes on this machine
+render_cache = DiskLRUCache(
+    "render",
+    os.environ.get("RENDER_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "cursorgallery-render"),
+    int(os.environ.get("RENDER_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+)
+# images rows needed to render (storage keys, dimensions, gallery visibility); short TTL so deletes and unpublishing
+# stop being served quickly
+render_sources = TTLCache("render_sources", maxsize=4096, ttl=60)
+render_flight = SingleFlight("render")
+
+# Preload manifests by (gallery id, with LQIPs); ?v= requests for the current version are immutable downstream
+manifest_cache = TTLCache("gallery_manifest", maxsize=1024, ttl=30)
+manifest_flight = SingleFlight("gallery_manifest")
+
+# Thumbnails and other derivatives are produced by background jobs (see jobs.py);
+# serverless instances have no worker that outlives the request, so jobs run inline there, in a
+# per-instance /tmp file: responses that enqueue carry the outcome (inline_job_results)
+job_queue = JobQueue(
+    os.environ.get("JOB_DB_PATH") or ("/tmp/jobs.sqlite3" if IS_SERVERLESS
+                                      else os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.sqlite3")),
+    workers=int(os.environ.get("JOB_WORKERS", 4)),
+    lease=int(os.environ.get("JOB_LEASE", 300)),
+    inline=IS_SERVERLESS
+)
+
+# Decoding, resizing and encoding run in worker processes, off the request threads' GIL
+# (see image_pool.py); the workers are forked at the end of this module
+image_pool = ImagePool(
+    workers=int(os.environ["IMAGE_POOL_WORKERS"]) if os.environ.get("IMAGE_POOL_WORKERS") else None,
+    max_pending=int(os.environ.get("IMAGE_POOL_MAX_PENDING", 0)) or None,
+    wait=float(os.environ.get("IMAGE_POOL_WAIT", 30)),
+    timeout=float(os.environ.get("IMAGE_POOL_TIMEOUT", 120)),
+    enabled=not IS_SERVERLESS
+)
+# Megapixels all in-flight decodes may hold at once (see pixel_budget.py)
+decode_budget = PixelBudget(
+    int(float(os.environ.get("DECODE_BUDGET_MEGAPIXELS", 64)) * 1_000_000),
+    wait=float(os.environ.get("DECODE_BUDGET_WAIT", 30))
+)
+
+
+# ==================== Metrics ====================
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+HTTP_RESPONSE_SIZE = Histogram("http_response_size_bytes", "HTTP response body size", ("route",), buckets=SIZE_BUCKETS)
+SUPABASE_CALLS = Counter("supabase_calls_total", "Supabase HTTP calls by service", ("service", "method"))
+SUPABASE_LATENCY = Histogram("supabase_call_duration_seconds", "Supabase HTTP call latency", ("service",))
+SUPABASE_CALLS_PER_REQUEST = Histogram("supabase_calls_per_request", "Supabase calls made while serving one request",
+                                       ("route",), buckets=COUNT_BUCKETS)
+AUTH_METADATA_WRITES = Counter("auth_metadata_writes_total",
+                               "Auth user_metadata writes on sign-in; result=skipped means already up to date",
+                               ("route", "result"))
+SUPABASE_TIME_PER_REQUEST = Histogram("supabase_time_per_request_seconds", "Total Supabase time spent in one request",
+                                      ("route",))
+IMAGE_UPLOADS = Counter("image_uploads_total",
+                        "Uploaded images; result=deduplicated reused existing storage objects", ("result",))
+DEDUPE_BYTES_SAVED = Counter("image_dedupe_bytes_saved_total", "Upload bytes not stored again thanks to deduplication")
+ANALYSIS_IMAGES = Counter("gallery_analysis_images_total",
+                          "Images analyzed by where their features came from (cache, lqip, thumbnail)", ("source",))
+ANALYSIS_DURATION = Histogram("gallery_analysis_duration_seconds", "Time to compute gallery analysis features")
+CONDITIONAL_GETS = Counter("conditional_gets_total",
+                           "ETag-validated reads; not_modified answered 304 without building the body", ("route", "result"))
+
+
+def _supabase_service(path):
+    """Map a Supabase URL path to the service that handled it"""
+    for prefix, service in (("/rest/", "rest"), ("/auth/", "auth"), ("/storage/", "storage")):
+        if path.startswith(prefix):
+            return service
+    return "other"
+
+
+# Development/CI only: record every Supabase call of a request as a span (see tracing.py)
+SUPABASE_TRACE = os.environ.get("SUPABASE_TRACE", "").lower() in ("1", "true", "yes")
+recent_traces = TraceBuffer(maxlen=int(os.environ.get("SUPABASE_TRACE_BUFFER", 200)))
+
+
+def record_supabase_call(method, path, duration, start=None, prefer="", status=None):
+    """Count a Supabase round trip globally and against the current request"""
+    service = _supabase_service(path)
+    SUPABASE_CALLS.inc(service=service, method=method)
+    SUPABASE_LATENCY.observe(duration, service=service)
+    if has_request_context() and "metrics_start" in g:
+        g.supabase_calls = g.get("supabase_calls", 0) + 1
+        g.supabase_time = g.get("supabase_time", 0.0) + duration
+        trace = g.get("supabase_trace")
+        if trace is not None:
+            trace.record(method, path, start if start is not None else time.perf_counter() - duration,
+                         duration, prefer, status)
+
+
+def _instrument_supabase_http():
+    """Time every HTTP call made through httpx (supabase-py uses it for REST, Auth and Storage)"""
+    import httpx
+    original_send = httpx.Client.send
+    if getattr(original_send, "_supabase_instrumented", False):
+        return
+
+    def send(self, http_request, *args, **kwargs):
+        start = time.perf_counter()
+        status = None
+        try:
+            response = original_send(self, http_request, *args, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            record_supabase_call(http_request.method, http_request.url.path, time.perf_counter() - start,
+                                 start, http_request.headers.get("prefer", ""), status)
+
+    send._supabase_instrumented = True
+    httpx.Client.send = send
+
+
+def _route_label():
+    """Use the URL rule (not the raw path) so ids don't explode label cardinality"""
+    return request.url_rule.rule if request.url_rule else "<unmatched>"
+
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_start = time.perf_counter()
+    HTTP_IN_FLIGHT.inc()
+    if SUPABASE_TRACE:
+        g.supabase_trace = RequestTrace(request.method, _route_label(), request.path)
+
+
+@app.after_request
+def record_request_metrics(response):
+    if "metrics_start" in g:
+        route = _route_label()
+        HTTP_REQUESTS.inc(method=request.method, route=route, status=response.status_code)
+        HTTP_LATENCY.observe(time.perf_counter() - g.metrics_start, method=request.method, route=route)
+        size = response.calculate_content_length()
+        if size is not None:
+            HTTP_RESPONSE_SIZE.observe(size, route=route)
+        SUPABASE_CALLS_PER_REQUEST.observe(g.get("supabase_calls", 0), route=route)
+        SUPABASE_TIME_PER_REQUEST.observe(g.get("supabase_time", 0.0), route=route)
+    trace = g.get("supabase_trace")
+    if trace is not None:
+        summary = trace.summary()
+        recent_traces.add(summary)
+        apply_headers(response, summary)
+    return response
+
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if g.pop("metrics_start", None) is not None:
+        HTTP_IN_FLIGHT.dec()
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint. Set METRICS_TOKEN to require a bearer token."""
+    metrics_token = os.environ.get("METRICS_TOKEN")
+    if metrics_token and request.headers.get('Authorization') != f"Bearer {metrics_token}":
+        return jsonify({"error": "Unauthorized"}), 401
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
 
 
 # ==================== Utility Functions ====================
@@ -75,16 +340,13 @@ def keep_warm():
     while True:
         try:
             time.sleep(600)  # Wait 10 minutes
+            import requests  # Deferred so startup doesn't pay for it
             # Only ping if we're in production (not localhost)
             if not app.debug:
                 requests.get('https://cursorgallery-backend.onrender.com/health', timeout=5)
         except:
             pass  # Ignore errors
 
-# Start keep-warm thread in production
-if not app.debug:
-    warm_thread = threading.Thread(target=keep_warm, daemon=True)
-    warm_thread.start()
 
 def get_user_from_token():
     """Extract user from Authorization header with improved error handling"""
@@ -98,8 +360,8 @@ def get_user_from_token():
     max_retries = 2
     for attempt in range(max_retries):
         try:
-            # Get user from token
-            user = supabase.auth.get_user(token)
+            # Get user from token (concurrent requests with the same token share one call)
+            user = token_flight.do(token, lambda: supabase.auth.get_user(token))
             return user.user if user else None
         except OSError as e:
             # Handle Windows socket errors (WinError 10035, etc.)
@@ -107,18 +369,18 @@ def get_user_from_token():
             if error_code == 10035 or 'non-blocking' in str(e).lower():
                 # Transient network error - retry
                 if attempt < max_retries - 1:
-                    print(f"[INFO] Transient socket error (attempt {attempt + 1}/{max_retries}), retrying...")
+                    auth_log.info("Transient socket error (attempt %d/%d), retrying...", attempt + 1, max_retries)
                     import time
                     time.sleep(0.1)  # Brief delay before retry
                     continue
                 else:
-                    print(f"[WARN] Socket error persisted after retries: {e}")
+                    auth_log.warning("Socket error persisted after retries: %s", e)
                     # Don't fail auth on transient network errors - this is too strict
                     # Instead, try to decode token locally as fallback
                     return None
             else:
                 # Other OS errors
-                print(f"[ERROR] OS error during token validation: {e}")
+                auth_log.error("OS error during token validation: %s", e)
                 return None
         except Exception as e:
             # Log error without exposing details
@@ -126,17 +388,17 @@ def get_user_from_token():
             
             # Check if it's a token expiry issue
             if 'expired' in error_msg.lower() or 'invalid' in error_msg.lower():
-                print(f"[INFO] Token expired or invalid (expected behavior)")
+                auth_log.info("Token expired or invalid (expected behavior)", extra={"sample": 20})
             elif 'network' in error_msg.lower() or 'timeout' in error_msg.lower():
                 # Network errors - retry once more
                 if attempt < max_retries - 1:
-                    print(f"[INFO] Network error (attempt {attempt + 1}/{max_retries}), retrying...")
+                    auth_log.info("Network error (attempt %d/%d), retrying...", attempt + 1, max_retries)
                     import time
                     time.sleep(0.1)
                     continue
-                print(f"[WARN] Network error during token validation: {error_msg}")
+                auth_log.warning("Network error during token validation: %s", error_msg)
             else:
-                print(f"[ERROR] Token validation error: {error_msg}")
+                auth_log.error("Token validation error: %s", error_msg)
             
             return None
 
@@ -170,58 +432,514 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def default_user_settings(user_id):
+    """A fresh user_settings row with default profile and preferences"""
+    return {
+        "user_id": user_id,
+        "profile": dict(DEFAULT_PROFILE),
+        "preferences": dict(DEFAULT_PREFERENCES)
+    }
+
+
+def get_user_settings_row(user_id, fresh=False):
+    """Return {"profile", "preferences", "updated_at"} for a user (cached unless `fresh`), or None if no row exists"""
+    settings = None if fresh else user_settings_cache.get(user_id)
+    if settings is None:
+        result = supabase.table('user_settings').select('profile, preferences, updated_at').eq('user_id', user_id).execute()
+        if not result.data:
+            return None
+        settings = cache_user_settings(user_id, result.data[0])
+    return settings
+
+
+def cache_user_settings(user_id, row):
+    """Store the profile/preferences (and updated_at, for ETags) of a user_settings row returned by Supabase"""
+    settings = {
+        "profile": row.get('profile') or {},
+        "preferences": row.get('preferences') or {},
+        "updated_at": row.get('updated_at')
+    }
+    user_settings_cache.set(user_id, settings)
+    return settings
+
+
+def upsert_user_settings(user_id, **columns):
+    """Insert or update the user's settings row in one round trip (UNIQUE on user_id)"""
+    result = supabase.table('user_settings').upsert(
+        {"user_id": user_id, **columns},
+        on_conflict='user_id'
+    ).execute()
+    if result.data:
+        return cache_user_settings(user_id, result.data[0])
+    user_settings_cache.invalidate(user_id)
+    return None
+
+
+def etag_for(*parts):
+    """Strong ETag from the validators a response depends on (ids, versions, updated_at)"""
+    return hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()[:32]
+
+
+def private_revalidated(response, etag):
+    """Tag a per-user response so browsers keep it but revalidate on every use"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Authorization')
+    return response
+
+
+def revalidating_elsewhere():
+    """
+    True for a conditional request on serverless: the client's ETag may come from
+    a write another instance handled, so it must be checked against fresh rows,
+    not this instance's caches, or it gets a false 304
+    """
+    return IS_SERVERLESS and bool(request.if_none_match)
+
+
+def not_modified(etag):
+    """A 304 if the client's If-None-Match already holds `etag`, else None (the caller builds the body)"""
+    if request.if_none_match.contains(etag):
+        CONDITIONAL_GETS.inc(route=_route_label(), result="not_modified")
+        return private_revalidated(Response(status=304), etag)
+    CONDITIONAL_GETS.inc(route=_route_label(), result="modified")
+    return None
+
+
+def lanczos():
+    Image = get_pil_image()
+    # Pillow 10: use Image.Resampling if available
+    try:
+        return Image.Resampling.LANCZOS
+    except Exception:
+        return Image.LANCZOS
+
+
+def flatten_alpha(img):
+    """RGB copy of an image with any transparency composited onto white"""
+    Image = get_pil_image()
+    if img.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+        return background
+    return img if img.mode == 'RGB' else img.convert('RGB')
+
+
+def has_alpha(img):
+    return img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info)
+
+
+def normalize_mode(img):
+    """RGB, or RGBA if the image has transparency, so resizing uses the real resampling filter"""
+    if img.mode in ('RGB', 'RGBA'):
+        return img
+    return img.convert('RGBA' if has_alpha(img) else 'RGB')
+
+
+_encodable_formats = {}
+
+
+def can_encode(fmt):
+    """Whether this Pillow build can write `fmt` (AVIF needs Pillow 11.3+ or the pillow-avif plugin)"""
+    if fmt not in _encodable_formats:
+        Image = get_pil_image()
+        if Image is None:
+            return False
+        Image.init()
+        _encodable_formats[fmt] = fmt.upper() in Image.SAVE
+    return _encodable_formats[fmt]
+
+
+def encode_image(img, fmt='jpeg', quality=None, alpha=True):
+    """
+    Encode an image as jpeg, webp, avif or png. JPEG has no alpha, so it is
+    flattened onto white; the other formats keep transparency unless alpha=False.
+    """
+    out = io.BytesIO()
+    quality = quality or ENCODE_QUALITY.get(fmt)
+    if fmt == 'jpeg' or not alpha:
+        img = flatten_alpha(img)
+    else:
+        img = normalize_mode(img)
+    if fmt == 'jpeg':
+        img.save(out, format='JPEG', quality=quality)
+    elif fmt == 'webp':
+        img.save(out, format='WEBP', quality=quality, method=4)
+    elif fmt == 'avif':
+        img.save(out, format='AVIF', quality=quality)
+    else:
+        img.save(out, format='PNG', optimize=False)
+    return out.getvalue()
+
+
+def shrink(img, size):
+    """Copy of an opened image that fits inside `size`, never upscaled"""
+    img = img.copy()
+    img.thumbnail(size, lanczos())
+    return img
+
+
+def resize_to_jpeg(img, size, quality=None):
+    """Shrink an opened image to fit `size`, flatten transparency onto white and encode as JPEG.
+    Returns (jpeg_bytes, resized_image)."""
+    img = flatten_alpha(shrink(img, size))
+    return encode_image(img, 'jpeg', quality), img
+
+
+def negotiate_format(accept, preferred=None):
+    """
+    Best stored/renderable format for a client's Accept header: the image's own
+    preference (metadata["delivery_format"]) if the client takes it, else the
+    smallest format it names explicitly. image/* is not enough, since browsers
+    send it without being able to decode AVIF. JPEG is the fallback.
+    """
+    named = {value.lower() for value, quality in accept if quality > 0}
+    for fmt in ((preferred,) if preferred in NEGOTIATED_FORMATS else ()) + NEGOTIATED_FORMATS:
+        if fmt == 'jpeg' or (IMAGE_FORMATS[fmt] in named and can_encode(fmt)):
+            return fmt
+    return 'jpeg'
+
+
+def render_image(image_data, width, height, fit, fmt):
+    """
+    Resize original (or derivative) bytes for /render:
+    contain - fit inside width x height, never upscaled (like create_thumbnail)
+    cover   - fill width x height exactly, cropping the overflow around the center
+    fill    - stretch to width x height
+    """
+    Image = get_pil_image()
+    from PIL import ImageOps
+    img = Image.open(io.BytesIO(image_data) if isinstance(image_data, bytes) else image_data)
+    # JPEGs decode at 1/2..1/8 scale when that still covers the requested box
+    img.draft('RGB', (width or 1, height or 1))
+
+    if fit == 'cover' and width and height:
+        img = ImageOps.fit(img, (width, height), lanczos())
+    elif fit == 'fill' and width and height:
+        img = img.resize((width, height), lanczos())
+    else:
+        img.thumbnail((width or MAX_RENDER_DIMENSION, height or MAX_RENDER_DIMENSION), lanczos())
+    return encode_image(img, fmt)
+
+
 def create_thumbnail(image_data):
-    """Create a thumbnail from image data. Safe if Pillow is unavailable."""
-    if not PIL_AVAILABLE:
+    """Create a thumbnail from image bytes or a file object. Safe if Pillow is unavailable."""
+    Image = get_pil_image()
+    if Image is None:
         return None
     try:
-        img = Image.open(io.BytesIO(image_data))
-        # Pillow 10: use Image.Resampling if available
+        img = Image.open(io.BytesIO(image_data) if isinstance(image_data, bytes) else image_data)
+        # Decode JPEGs at 1/2..1/8 scale; shrink() copies, which would otherwise load every pixel first
+        img.draft('RGB', THUMBNAIL_SIZE)
+        return resize_to_jpeg(img, THUMBNAIL_SIZE)[0]
+    except Exception as e:
+        gallery_log.warning("Thumbnail creation error: %s", e)
+        return None
+
+
+def decode_in_pool(fn, image_data, box, *args):
+    """
+    fn(image_data, *args) in the image pool, once the pixels it will decode fit the
+    decode budget. `box` is the size fn drafts JPEGs to (None: decoded at full size).
+    Raises ImageTooLarge before any pixel is decoded, or DecodeBudgetBusy.
+    """
+    Image = get_pil_image()
+    pixels = 0
+    if Image is not None:
         try:
-            resample = Image.Resampling.LANCZOS
+            pixels = decode_cost(Image, image_data, box, MAX_IMAGE_PIXELS).pixels
+        except ImageTooLarge:
+            raise
         except Exception:
-            resample = Image.LANCZOS
-        img.thumbnail(THUMBNAIL_SIZE, resample)
-
-        if img.mode in ('RGBA', 'LA', 'P'):
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-            img = background
-
-        thumb_io = io.BytesIO()
-        img.save(thumb_io, format='JPEG', quality=85)
-        thumb_io.seek(0)
-        return thumb_io.read()
+            pass  # Not something Pillow can identify; fn fails on its own terms without decoding
+    with decode_budget.reserve(pixels):
+        return image_pool.run(fn, image_data, *args)
+
+
+def create_derivatives(image_data):
+    """
+    Decode an original once and derive everything served instead of it:
+    {"variants": {max_side: jpeg_bytes}, "thumbnail": jpeg_bytes, "placeholder": {...},
+     "formats": {"webp": {"variants": {max_side: bytes}, "thumbnail": bytes}, ...}}.
+    Variants are only made for sizes smaller than the original; each size is
+    resized from the previous (larger) one and encoded once per format.
+    Returns None if the image can't be decoded.
+    """
+    Image = get_pil_image()
+    if Image is None:
+        return None
+    formats = [fmt for fmt in DERIVATIVE_FORMATS if can_encode(fmt)]
+    try:
+        img = Image.open(io.BytesIO(image_data) if isinstance(image_data, bytes) else image_data)
+        # JPEGs can be decoded at 1/2..1/8 scale straight to the largest size we need
+        img.draft('RGB', (VARIANT_SIZES[-1], VARIANT_SIZES[-1]))
+        img = normalize_mode(img)
+        alpha = PRESERVE_ALPHA and has_alpha(img)
+
+        variants = {}
+        alternates = {fmt: {"variants": {}} for fmt in formats}
+        current = img
+        for size in reversed(VARIANT_SIZES):
+            if max(current.size) > size:
+                current = shrink(current, (size, size))
+                variants[size] = encode_image(current, 'jpeg', VARIANT_QUALITY)
+                for fmt in formats:
+                    alternates[fmt]["variants"][size] = encode_image(current, fmt, alpha=alpha)
+        thumb_img = shrink(current, THUMBNAIL_SIZE)
+        thumbnail = encode_image(thumb_img, 'jpeg')
+        for fmt in formats:
+            alternates[fmt]["thumbnail"] = encode_image(thumb_img, fmt, alpha=alpha)
+    except Exception as e:
+        gallery_log.warning("Derivative creation error: %s", e)
+        return None
+
+    try:
+        placeholder = compute_placeholder(flatten_alpha(thumb_img))
+    except Exception as e:
+        gallery_log.warning("Placeholder creation error: %s", e)
+        placeholder = None
+    return {"variants": variants, "thumbnail": thumbnail, "placeholder": placeholder, "formats": alternates}
+
+
+def storage_path_from_url(url):
+    """Object key inside STORAGE_BUCKET for one of its public URLs, or None"""
+    if not url or STORAGE_BUCKET not in url:
+        return None
+    return url.split(f"{STORAGE_BUCKET}/")[-1].split("?")[0]
+
+
+def acquire_image_object(user_id, sha256):
+    """Take a reference on the user's stored object with this hash; None if it isn't indexed"""
+    try:
+        result = supabase.rpc('acquire_image_object', {"p_user_id": user_id, "p_sha256": sha256}).execute()
+    except Exception as e:
+        gallery_log.warning("Image index lookup failed, storing without dedupe: %s", e)
+        return None
+    return result.data[0] if result.data else None
+
+
+def index_image_object(user_id, row):
+    """
+    Add newly stored objects to the hash index with one reference.
+    If a concurrent upload of the same bytes indexed first, take a reference
+    on that row instead and drop our copy. Returns the row the image should use.
+    """
+    try:
+        result = supabase.table('image_objects').upsert(
+            {"user_id": user_id, "ref_count": 1, **row},
+            on_conflict='user_id,sha256',
+            ignore_duplicates=True
+        ).execute()
+    except Exception as e:
+        gallery_log.warning("Image index insert failed: %s", e)
+        return row
+    if result.data:
+        return result.data[0]
+
+    existing = acquire_image_object(user_id, row['sha256'])
+    if existing is None:
+        return row
+    ours = {row['storage_key'], row.get('thumbnail_key')} - {existing['storage_key'], existing.get('thumbnail_key'), None}
+    if ours:
+        try:
+            supabase.storage.from_(STORAGE_BUCKET).remove(sorted(ours))
+        except Exception as e:
+            gallery_log.warning("Error deleting duplicate upload from storage: %s", e)
+    return existing
+
+
+def store_image_object(user_id, gallery_id, file_ext, spool):
+    """Upload an ingested file under its content-addressed key and index it (derivatives come from a job)"""
+    bucket = supabase.storage.from_(STORAGE_BUCKET)
+    sha256 = spool.sha256
+
+    # Upload original image, streamed from the spool (upsert: the key is the content, so overwriting is harmless)
+    storage_key = f"{user_id}/{gallery_id}/{sha256}.{file_ext}"
+    with spool.upload_source() as body:
+        bucket.upload(storage_key, body, file_options={"content-type": f"image/{file_ext}", "upsert": "true"})
+
+    return index_image_object(user_id, {
+        "sha256": sha256,
+        "storage_key": storage_key,
+        "thumbnail_key": None,
+        "url": bucket.get_public_url(storage_key),
+        "thumbnail_url": None,
+        # Image metadata was probed from the header while the file streamed in
+        "metadata": {"size": spool.size, **(spool.probe or {})}
+    })
+
+
+def _derived_extension(fmt):
+    return 'jpg' if fmt == 'jpeg' else fmt
+
+
+def thumbnail_key_for(storage_key, fmt='jpeg'):
+    """thumbs/ sibling of an original's key: a/b/c.png -> a/b/thumbs/c.jpg (c.webp, ...)"""
+    folder, _, name = storage_key.rpartition('/')
+    return f"{folder}/thumbs/{name.rsplit('.', 1)[0]}.{_derived_extension(fmt)}"
+
+
+def variant_key_for(storage_key, size, fmt='jpeg'):
+    """variants/ sibling of an original's key: a/b/c.png -> a/b/variants/c_1600.jpg (c_1600.webp, ...)"""
+    folder, _, name = storage_key.rpartition('/')
+    return f"{folder}/variants/{name.rsplit('.', 1)[0]}_{size}.{_derived_extension(fmt)}"
+
+
+def derived_keys_for(storage_key):
+    """Every key a derivatives job may have written for this original (in any format, whatever is configured now)"""
+    return [key for fmt in NEGOTIATED_FORMATS
+            for key in [thumbnail_key_for(storage_key, fmt)] + [variant_key_for(storage_key, size, fmt)
+                                                               for size in VARIANT_SIZES]]
+
+
+def referenced_keys_of(row):
+    """Every storage key an images or image_objects row points at, derivatives included"""
+    metadata = row.get('metadata') or {}
+    original = row.get('storage_key') or metadata.get('storage_key') or storage_path_from_url(row.get('url'))
+    keys = {original, row.get('thumbnail_key'), metadata.get('thumbnail_key'),
+            storage_path_from_url(row.get('thumbnail_url'))}
+    urls = list((metadata.get('variants') or {}).values())
+    for entry in (metadata.get('formats') or {}).values():
+        urls.append(entry.get('thumbnail_url'))
+        urls.extend((entry.get('variants') or {}).values())
+    keys.update(storage_path_from_url(url) for url in urls)
+    if original:
+        keys.update(derived_keys_for(original))
+    keys.discard(None)
+    return keys
+
+
+def select_all(query, page=1000):
+    """Every row of the query `query()` builds, a page at a time (PostgREST caps the rows per response)"""
+    rows, start = [], 0
+    while True:
+        batch = query().range(start, start + page - 1).execute().data or []
+        rows.extend(batch)
+        if len(batch) < page:
+            return rows
+        start += page
+
+
+def referenced_storage_keys(user_ids):
+    """Keys still in use by these users' images and content-addressed objects (what the storage GC keeps)"""
+    galleries = select_all(lambda: supabase.table('galleries').select(
+        'id, images(url, thumbnail_url, metadata)').in_('user_id', user_ids).order('id'))
+    objects = select_all(lambda: supabase.table('image_objects').select(
+        'id, storage_key, thumbnail_key, metadata').in_('user_id', user_ids).order('id'))
+    keys = set()
+    for row in objects + [image for gallery in galleries for image in gallery.get('images') or []]:
+        keys.update(referenced_keys_of(row))
+    return keys
+
+
+def schedule_derivatives(user_id, image, storage_key, sha256=None, delay=0):
+    """Queue thumbnail/placeholder generation for an images row; returns the job id (None if queueing failed)"""
+    try:
+        job = job_queue.enqueue("image_derivatives", {
+            "image_id": image['id'],
+            "user_id": user_id,
+            "storage_key": storage_key,
+            "sha256": sha256
+        }, idempotency_key=f"derivatives:{image['id']}", owner=user_id, delay=delay)
+        return job['id']
     except Exception as e:
-        print(f"Thumbnail creation error: {e}")
+        gallery_log.error("Could not schedule derivatives for image %s: %s", image['id'], e)
         return None
 
 
+def image_file_paths(images, released=()):
+    """
+    Storage keys to remove for deleted images rows: the files of images from
+    before deduplication, which own them outright, and the content-addressed
+    objects that release_image_objects reported as no longer referenced.
+    """
+    paths = set()
+    for image in images:
+        if (image.get('metadata') or {}).get('sha256'):
+            continue  # Shared object; removed only once it is released
+        original = storage_path_from_url(image.get('url'))
+        paths.update(filter(None, (original, storage_path_from_url(image.get('thumbnail_url')))))
+        if original:
+            paths.update(derived_keys_for(original))
+    for row in released:
+        paths.update(filter(None, (row.get('storage_key'), row.get('thumbnail_key'))))
+        paths.update(derived_keys_for(row['storage_key']))
+    return sorted(paths)
+
+
+def remove_storage_objects(paths):
+    """Remove objects from STORAGE_BUCKET, many keys per call; keys that are already gone are skipped"""
+    bucket = supabase.storage.from_(STORAGE_BUCKET)
+    for start in range(0, len(paths), STORAGE_REMOVE_BATCH):
+        bucket.remove(paths[start:start + STORAGE_REMOVE_BATCH])
+
+
+def release_image_files(user_id, images):
+    """
+    Remove the storage objects behind deleted images rows.
+    Content-addressed objects are only removed once no images row references
+    them; images from before deduplication own their objects outright.
+    """
+    hashes = [sha256 for sha256 in ((image.get('metadata') or {}).get('sha256') for image in images) if sha256]
+    released = []
+    if hashes:
+        try:
+            result = supabase.rpc('release_image_objects', {"p_user_id": user_id, "p_hashes": hashes}).execute()
+            released = result.data or []
+        except Exception as e:
+            gallery_log.warning("Releasing image references failed: %s", e)
+
+    paths = image_file_paths(images, released)
+    if paths:
+        try:
+            remove_storage_objects(paths)
+        except Exception as e:
+            gallery_log.warning("Error deleting images from storage: %s", e)
+
+
 # ==================== Auth Routes ====================
 
 @app.route("/")
 def home():
     """A simple route to check if the backend is running."""
-    print("[HOME] Root endpoint accessed")
+    log.debug("Root endpoint accessed")
     return jsonify({"message": "CursorGallery API is running!", "version": "1.0.0"})
 
 @app.route("/api/debug", methods=["GET"])
 def debug_info():
-    """Debug endpoint to check environment configuration"""
-    print("[DEBUG] Debug endpoint accessed")
-    
+    """Debug endpoint to check environment configuration.
+
+    With SUPABASE_TRACE=1, ?trace=<X-Trace-Id> returns that request's Supabase
+    spans and ?traces=<n>[&route=<rule>] lists the most recent request traces.
+    """
+    log.debug("Debug endpoint accessed")
+
+    if SUPABASE_TRACE and request.args.get("trace"):
+        summary = recent_traces.get(request.args["trace"])
+        if summary is None:
+            return jsonify({"error": "Trace not found (it may have been evicted)"}), 404
+        return jsonify(summary), 200
+    if SUPABASE_TRACE and request.args.get("traces"):
+        limit = request.args.get("traces", type=int) or 20
+        return jsonify({"traces": recent_traces.recent(limit, request.args.get("route"))}), 200
+
     env_status = {
         "SUPABASE_URL": bool(os.environ.get("SUPABASE_URL")),
         "SUPABASE_KEY": bool(os.environ.get("SUPABASE_KEY")),
         "GOOGLE_AUTH_SALT": bool(os.environ.get("GOOGLE_AUTH_SALT")),
         "CORS_ORIGINS": os.environ.get("CORS_ORIGINS", "*"),
-        "PIL_AVAILABLE": PIL_AVAILABLE,
+        "PIL_AVAILABLE": get_pil_image() is not None,
+        "IMAGE_POOL": image_pool.stats(),
+        "JOBS": {"inline": job_queue.inline, "by_status": job_queue.counts()},
+        "DECODE_BUDGET": {"max_pixels": decode_budget.max_pixels, "in_use": decode_budget.in_use(),
+                          "max_image_pixels": MAX_IMAGE_PIXELS},
+        "SUPABASE_TRACE": SUPABASE_TRACE,
         "python_version": f"{os.sys.version_info.major}.{os.sys.version_info.minor}.{os.sys.version_info.micro}",
     }
     
-    print(f"[DEBUG] Environment status: {env_status}")
+    log.debug("Environment status: %s", env_status)
     
     return jsonify({
         "status": "ok",
@@ -242,96 +960,74 @@ def google_auth():
     regardless of method, it is linked using the same password so login can happen from either side.
     """
     try:
-        print(f"[GOOGLE AUTH] ===== REQUEST STARTED =====")
-        print(f"[GOOGLE AUTH] Request headers: {dict(request.headers)}")
-        print(f"[GOOGLE AUTH] Request method: {request.method}")
-        print(f"[GOOGLE AUTH] Request path: {request.path}")
-        
+        # Header names only: values include the bearer token and cookies
+        if auth_log.isEnabledFor(logging.DEBUG):
+            auth_log.debug("Google auth request %s %s, headers: %s", request.method, request.path, sorted(request.headers.keys()))
+
         data = request.get_json()
-        print(f"[GOOGLE AUTH] Request body received: {bool(data)}")
-        
+
         if not data:
-            print(f"[GOOGLE AUTH] ERROR: No JSON data in request body")
+            auth_log.info("Google auth: no JSON data in request body")
             return jsonify({"error": "Missing JSON data"}), 400
 
         id_token = data.get("idToken")
         email = data.get("email")
         name = data.get("name", "User")
-        
-        print(f"[GOOGLE AUTH] Parsed data - Email: {email}, Name: {name}, Token present: {bool(id_token)}")
 
         if not id_token or not email:
-            print(f"[GOOGLE AUTH] ERROR: Missing required fields - idToken: {bool(id_token)}, email: {bool(email)}")
+            auth_log.info("Google auth: missing required fields - idToken: %s, email: %s", bool(id_token), bool(email))
             return jsonify({"error": "Missing required fields (idToken, email)"}), 400
 
         # Use a consistent password hash for Google login (unify logic)
         secret_salt = os.environ.get("GOOGLE_AUTH_SALT", "cursor-gallery-google-auth-2024")
-        print(f"[GOOGLE AUTH] Salt configured: {bool(secret_salt)}")
-        
+
         password_hash = hashlib.sha256(f"{email}{secret_salt}".encode()).hexdigest()
         google_password = password_hash[:32]
-        print(f"[GOOGLE AUTH] Generated password hash for user")
 
         try:
-            print(f"[GOOGLE AUTH] Attempting sign-in with existing credentials...")
             res = supabase.auth.sign_in_with_password({
                 "email": email,
                 "password": google_password
             })
-            print(f"[GOOGLE AUTH] ✅ Sign-in successful for existing user")
+            auth_log.debug("Google sign-in successful for existing user")
 
             user = res.user
             session = res.session
 
-            # Always update user metadata to latest name from Google
-            try:
-                print(f"[GOOGLE AUTH] Updating user metadata...")
-                admin_supabase.auth.admin.update_user_by_id(
-                    user.id,
-                    {"user_metadata": {"full_name": name, "auth_provider": "google"}}
-                )
-                print(f"[GOOGLE AUTH] ✅ Metadata updated")
-            except Exception as e:
-                print(f"[GOOGLE AUTH] ⚠️ Metadata update failed (non-critical): {str(e)}")
-
-            # Always fetch latest user data
-            try:
-                print(f"[GOOGLE AUTH] Fetching fresh user data...")
-                fresh_user_response = admin_supabase.auth.admin.get_user_by_id(user.id)
-                if fresh_user_response and fresh_user_response.user:
-                    fresh_user = fresh_user_response.user
-                    print(f"[GOOGLE AUTH] ✅ Fresh user data fetched")
-                    return jsonify({
-                        "user": {
-                            "id": fresh_user.id,
-                            "email": fresh_user.email,
-                            "name": fresh_user.user_metadata.get("full_name", name),
-                            "createdAt": fresh_user.created_at
-                        },
-                        "token": session.access_token
-                    }), 200
-            except Exception as e:
-                print(f"[GOOGLE AUTH] ⚠️ Fresh user fetch failed (non-critical): {str(e)}")
+            # Update metadata to the latest name from Google, but only if it changed.
+            # A "unified" account already supports Google login, so keep that provider.
+            metadata = user.user_metadata or {}
+            current_name = metadata.get("full_name", name)
+            provider = "unified" if metadata.get("auth_provider") == "unified" else "google"
+            if metadata.get("full_name") != name or metadata.get("auth_provider") != provider:
+                try:
+                    admin_supabase.auth.admin.update_user_by_id(
+                        user.id,
+                        {"user_metadata": {"full_name": name, "auth_provider": provider}}
+                    )
+                    current_name = name
+                    AUTH_METADATA_WRITES.inc(route="google", result="written")
+                except Exception as e:
+                    auth_log.warning("Google auth metadata update failed (non-critical): %s", e)
+            else:
+                AUTH_METADATA_WRITES.inc(route="google", result="skipped")
 
-            # Fallback on old token
-            print(f"[GOOGLE AUTH] ✅ Returning with existing token")
+            # The sign-in response already carries the user; no need to re-fetch it
             return jsonify({
                 "user": {
                     "id": user.id,
                     "email": user.email,
-                    "name": user.user_metadata.get("full_name", name),
+                    "name": current_name,
                     "createdAt": user.created_at
                 },
                 "token": session.access_token
             }), 200
 
         except Exception as signin_error:
-            print(f"[GOOGLE AUTH] Sign-in failed, attempting account creation/unification...")
-            print(f"[GOOGLE AUTH] Sign-in error type: {type(signin_error).__name__}")
-            print(f"[GOOGLE AUTH] Sign-in error message: {str(signin_error)}")
-            
+            auth_log.info("Google sign-in failed (%s: %s), attempting account creation/unification",
+                          type(signin_error).__name__, signin_error)
+
             try:
-                print(f"[GOOGLE AUTH] Fetching existing users to check for account...")
                 users_response = supabase.auth.admin.list_users()
                 existing_user = None
 
@@ -339,11 +1035,10 @@ def google_auth():
                     for u in users_response:
                         if u.email == email:
                             existing_user = u
-                            print(f"[GOOGLE AUTH] Found existing user with email: {email}")
                             break
 
                 if existing_user:
-                    print(f"[GOOGLE AUTH] Unifying existing account...")
+                    auth_log.info("Unifying existing account %s with Google sign-in", existing_user.id)
                     # Unify account (update password for Google login)
                     admin_supabase.auth.admin.update_user_by_id(
                         existing_user.id,
@@ -355,29 +1050,12 @@ def google_auth():
                             }
                         }
                     )
-                    print(f"[GOOGLE AUTH] ✅ Account unified, attempting sign-in...")
-                    
+
+                    # Sign-in happens after the update, so its user already has the new metadata
                     final_signin = supabase.auth.sign_in_with_password({
                         "email": email,
                         "password": google_password
                     })
-                    print(f"[GOOGLE AUTH] ✅ Unified account sign-in successful")
-
-                    try:
-                        fresh_user_response = admin_supabase.auth.admin.get_user_by_id(final_signin.user.id)
-                        if fresh_user_response and fresh_user_response.user:
-                            fresh_user = fresh_user_response.user
-                            return jsonify({
-                                "user": {
-                                    "id": fresh_user.id,
-                                    "email": fresh_user.email,
-                                    "name": fresh_user.user_metadata.get("full_name", name),
-                                    "createdAt": fresh_user.created_at
-                                },
-                                "token": final_signin.session.access_token
-                            }), 200
-                    except Exception as e:
-                        print(f"[GOOGLE AUTH] ⚠️ Fresh user fetch failed (non-critical): {str(e)}")
 
                     return jsonify({
                         "user": {
@@ -390,7 +1068,7 @@ def google_auth():
                     }), 200
 
                 else:
-                    print(f"[GOOGLE AUTH] No existing user found, creating new account...")
+                    auth_log.info("No existing user found, creating new Google account")
                     # User does not exist, create new account
                     signup_res = supabase.auth.sign_up({
                         "email": email,
@@ -402,56 +1080,18 @@ def google_auth():
                             }
                         }
                     })
-                    print(f"[GOOGLE AUTH] ✅ New account created")
 
                     user = signup_res.user
                     session = signup_res.session
 
                     if user:
                         try:
-                            print(f"[GOOGLE AUTH] Creating user settings...")
-                            user_settings_data = {
-                                "user_id": user.id,
-                                "profile": {
-                                    "bio": "",
-                                    "website": "",
-                                    "location": ""
-                                },
-                                "preferences": {
-                                    "emailNotifications": True,
-                                    "browserNotifications": False,
-                                    "galleryUpdates": True,
-                                    "marketingEmails": False,
-                                    "defaultGalleryVisibility": "private",
-                                    "autoSave": True,
-                                    "compressImages": True,
-                                    "defaultThreshold": 80,
-                                    "language": "en"
-                                }
-                            }
+                            user_settings_data = default_user_settings(user.id)
                             supabase.table('user_settings').insert(user_settings_data).execute()
-                            print(f"[GOOGLE AUTH] ✅ User settings created")
                         except Exception as settings_error:
-                            print(f"[GOOGLE AUTH] ⚠️ User settings creation failed (non-critical): {str(settings_error)}")
+                            auth_log.warning("User settings creation failed (non-critical): %s", settings_error)
 
                     if session and session.access_token:
-                        try:
-                            fresh_user_response = admin_supabase.auth.admin.get_user_by_id(user.id)
-                            if fresh_user_response and fresh_user_response.user:
-                                fresh_user = fresh_user_response.user
-                                print(f"[GOOGLE AUTH] ✅ New user account fully set up")
-                                return jsonify({
-                                    "user": {
-                                        "id": fresh_user.id,
-                                        "email": fresh_user.email,
-                                        "name": fresh_user.user_metadata.get("full_name", name),
-                                        "createdAt": fresh_user.created_at
-                                    },
-                                    "token": session.access_token
-                                }), 201
-                        except Exception as e:
-                            print(f"[GOOGLE AUTH] ⚠️ Fresh user fetch failed (non-critical): {str(e)}")
-
                         return jsonify({
                             "user": {
                                 "id": user.id,
@@ -462,29 +1102,12 @@ def google_auth():
                             "token": session.access_token
                         }), 201
                     else:
-                        print(f"[GOOGLE AUTH] No session token after signup, attempting sign-in...")
+                        auth_log.info("No session token after Google signup, attempting sign-in")
                         try:
                             signin_res = supabase.auth.sign_in_with_password({
                                 "email": email,
                                 "password": google_password
                             })
-                            print(f"[GOOGLE AUTH] ✅ Post-signup sign-in successful")
-                            
-                            try:
-                                fresh_user_response = admin_supabase.auth.admin.get_user_by_id(signin_res.user.id)
-                                if fresh_user_response and fresh_user_response.user:
-                                    fresh_user = fresh_user_response.user
-                                    return jsonify({
-                                        "user": {
-                                            "id": fresh_user.id,
-                                            "email": fresh_user.email,
-                                            "name": fresh_user.user_metadata.get("full_name", name),
-                                            "createdAt": fresh_user.created_at
-                                        },
-                                        "token": signin_res.session.access_token
-                                    }), 201
-                            except Exception as e:
-                                print(f"[GOOGLE AUTH] ⚠️ Fresh user fetch failed (non-critical): {str(e)}")
 
                             return jsonify({
                                 "user": {
@@ -496,20 +1119,15 @@ def google_auth():
                                 "token": signin_res.session.access_token
                             }), 201
                         except Exception as post_signin_error:
-                            print(f"[GOOGLE AUTH] ❌ Post-signup sign-in failed")
-                            print(f"[GOOGLE AUTH] Error type: {type(post_signin_error).__name__}")
-                            print(f"[GOOGLE AUTH] Error: {str(post_signin_error)}")
+                            auth_log.error("Post-signup sign-in failed: %s: %s",
+                                           type(post_signin_error).__name__, post_signin_error)
                             return jsonify({
                                 "error": "Account created but email confirmation may be required. Please check your email or try logging in with email/password.",
                                 "details": str(post_signin_error)
                             }), 500
 
             except Exception as lookup_error:
-                print(f"[GOOGLE AUTH] ❌ CRITICAL: Account lookup/creation failed")
-                print(f"[GOOGLE AUTH] Error type: {type(lookup_error).__name__}")
-                print(f"[GOOGLE AUTH] Error: {str(lookup_error)}")
-                import traceback
-                print(f"[GOOGLE AUTH] Traceback: {traceback.format_exc()}")
+                auth_log.exception("Google account lookup/creation failed")
                 return jsonify({
                     "error": f"Authentication error: {str(lookup_error)}",
                     "errorType": type(lookup_error).__name__,
@@ -519,13 +1137,8 @@ def google_auth():
     except Exception as e:
         error_message = str(e)
         error_type = type(e).__name__
-        print(f"[GOOGLE AUTH] ❌ CRITICAL TOP-LEVEL ERROR")
-        print(f"[GOOGLE AUTH] Error type: {error_type}")
-        print(f"[GOOGLE AUTH] Error message: {error_message}")
-        import traceback
-        print(f"[GOOGLE AUTH] Full traceback:")
-        print(traceback.format_exc())
-        
+        auth_log.exception("Google auth handler failed")
+
         return jsonify({
             "error": f"Server error: {error_message}",
             "errorType": error_type,
@@ -566,7 +1179,7 @@ def signup():
                         break
 
             if existing_user:
-                print(f"User {email} already exists from Google auth, unifying account...")
+                auth_log.info("User %s already exists from Google auth, unifying account", existing_user.id)
 
                 # Update password and mark as unified
                 admin_supabase.auth.admin.update_user_by_id(
@@ -601,7 +1214,7 @@ def signup():
                             "message": "Account linked successfully"
                         }), 200
                 except Exception as e:
-                    print(f"Error fetching fresh user data: {e}")
+                    auth_log.warning("Error fetching fresh user data: %s", e)
 
                 return jsonify({
                     "user": {
@@ -614,7 +1227,7 @@ def signup():
                     "message": "Account linked successfully"
                 }), 200
         except Exception as e:
-            print(f"Error checking existing user: {e}")
+            auth_log.warning("Error checking existing user: %s", e)
 
         # Create a new user in Supabase Auth
         res = supabase.auth.sign_up({
@@ -634,28 +1247,10 @@ def signup():
         # Create user settings entry
         if user:
             try:
-                user_settings_data = {
-                    "user_id": user.id,
-                    "profile": {
-                        "bio": "",
-                        "website": "",
-                        "location": ""
-                    },
-                    "preferences": {
-                        "emailNotifications": True,
-                        "browserNotifications": False,
-                        "galleryUpdates": True,
-                        "marketingEmails": False,
-                        "defaultGalleryVisibility": "private",
-                        "autoSave": True,
-                        "compressImages": True,
-                        "defaultThreshold": 80,
-                        "language": "en"
-                    }
-                }
+                user_settings_data = default_user_settings(user.id)
                 supabase.table('user_settings').insert(user_settings_data).execute()
             except Exception as e:
-                print(f"Error creating user settings: {e}")
+                auth_log.warning("Error creating user settings: %s", e)
 
         if session:
             try:
@@ -672,7 +1267,7 @@ def signup():
                         "token": session.access_token
                     }), 201
             except Exception as e:
-                print(f"Error fetching fresh user data: {e}")
+                auth_log.warning("Error fetching fresh user data: %s", e)
 
             return jsonify({
                 "user": {
@@ -701,7 +1296,7 @@ def signup():
         if "User already registered" in error_message:
             return jsonify({"error": "User with this email already exists"}), 409
 
-        print(f"Error during signup: {e}")
+        auth_log.error("Error during signup: %s", e)
         return jsonify({"error": error_message}), 500
 
 
@@ -732,10 +1327,11 @@ def login():
         user = res.user
         session = res.session
 
-        # Mark account as unified if they log in via email/password (even if originally Google)
-        try:
-            current_provider = user.user_metadata.get("auth_provider", "")
-            if current_provider != "unified":
+        # Mark account as unified if they log in via email/password (even if originally Google).
+        # Only written when it changes, so a returning user costs a single Auth round trip.
+        current_provider = user.user_metadata.get("auth_provider", "")
+        if current_provider != "unified":
+            try:
                 supabase.auth.admin.update_user_by_id(
                     user.id,
                     {"user_metadata": {
@@ -743,43 +1339,23 @@ def login():
                         "auth_provider": "unified"
                     }}
                 )
-        except Exception:
-            pass  # non-critical
+                AUTH_METADATA_WRITES.inc(route="login", result="written")
+            except Exception:
+                pass  # non-critical
+        else:
+            AUTH_METADATA_WRITES.inc(route="login", result="skipped")
 
-        try:
-            fresh_user_response = admin_supabase.auth.admin.get_user_by_id(user.id)
-            if fresh_user_response and fresh_user_response.user:
-                fresh_user = fresh_user_response.user
-                return jsonify({
-                    "user": {
-                        "id": fresh_user.id,
-                        "email": fresh_user.email,
-                        "name": fresh_user.user_metadata.get("full_name", ""),
-                        "createdAt": fresh_user.created_at
-                    },
-                    "token": session.access_token
-                }), 200
-            else:
-                return jsonify({
-                    "user": {
-                        "id": user.id,
-                        "email": user.email,
-                        "name": user.user_metadata.get("full_name", ""),
-                        "createdAt": user.created_at
-                    },
-                    "token": session.access_token
-                }), 200
-        except Exception:
-            # Fallback to token user data
-            return jsonify({
-                "user": {
-                    "id": user.id,
-                    "email": user.email,
-                    "name": user.user_metadata.get("full_name", ""),
-                    "createdAt": user.created_at
-                },
-                "token": session.access_token
-            }), 200
+        # The sign-in response already carries the user (the update above only changes
+        # auth_provider, which isn't returned), so build the response from it
+        return jsonify({
+            "user": {
+                "id": user.id,
+                "email": user.email,
+                "name": user.user_metadata.get("full_name", ""),
+                "createdAt": user.created_at
+            },
+            "token": session.access_token
+        }), 200
 
     except Exception as e:
         error_message = str(e)
@@ -787,7 +1363,7 @@ def login():
         if "Invalid login credentials" in error_message:
             return jsonify({"error": "Invalid email or password"}), 401
 
-        print(f"[ERROR] Login error: {error_message}")
+        auth_log.error("Login error: %s", error_message)
         return jsonify({"error": error_message}), 500
 
 
@@ -805,36 +1381,45 @@ def get_current_user():
         return jsonify({"error": "Unauthorized"}), 401
 
     try:
-        # Try to read name from user_settings first (RLS safe)
-        user_settings_result = supabase.table('user_settings').select('profile').eq('user_id', user.id).execute()
+        # The token lookup already returned a fresh Auth user, and the settings row is
+        # cached, so a client with a current copy gets a 304 before the admin API call
+        settings = get_user_settings_row(user.id, fresh=revalidating_elsewhere())
+        etag = etag_for("me", user.id, user.email, user.created_at, getattr(user, 'updated_at', None),
+                        settings and settings.get('updated_at'))
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+
+        # Try to read name from user_settings first (RLS safe, cached per user)
         name_from_settings = ""
-        if user_settings_result.data and 'profile' in user_settings_result.data[0]:
+        if settings:
             # If `name` exists in profile, prefer it
-            name_from_settings = user_settings_result.data[0]['profile'].get("name", "")
+            name_from_settings = settings['profile'].get("name", "")
 
-        # Fallback: try admin API to get Auth metadata (may fail if RLS/service_role not allowed, so non-fatal)
+        # Fallback: admin API Auth metadata, only needed without a settings name (non-fatal if it fails)
         name_from_auth = ""
-        try:
-            fresh_user_response = admin_supabase.auth.admin.get_user_by_id(user.id)
-            if fresh_user_response and fresh_user_response.user:
-                name_from_auth = fresh_user_response.user.user_metadata.get("full_name", "")
-        except Exception:
-            pass  # non-critical
+        if not name_from_settings:
+            try:
+                fresh_user_response = admin_supabase.auth.admin.get_user_by_id(user.id)
+                if fresh_user_response and fresh_user_response.user:
+                    name_from_auth = fresh_user_response.user.user_metadata.get("full_name", "")
+            except Exception as e:
+                auth_log.warning("Admin user lookup failed: %s", e)
 
         # Choose name: prefer user_settings (so it's always available), fallback to Auth, fallback to empty
         final_name = name_from_settings or name_from_auth or user.user_metadata.get("full_name", "")
 
-        return jsonify({
+        return private_revalidated(jsonify({
             "user": {
                 "id": user.id,
                 "email": user.email,
                 "name": final_name,
                 "createdAt": user.created_at
             }
-        }), 200
+        }), etag), 200
 
     except Exception as e:
-        print(f"[ERROR] /api/auth/me failed: {e}")
+        auth_log.error("/api/auth/me failed: %s", e)
         # Fallback to token user
         return jsonify({
             "user": {
@@ -856,45 +1441,30 @@ def get_user_settings():
         return jsonify({"error": "Unauthorized"}), 401
     
     try:
-        # Fetch user settings
-        result = supabase.table('user_settings').select('*').eq('user_id', user.id).execute()
-        
-        if result.data and len(result.data) > 0:
-            settings = result.data[0]
-            # Include user info
-            return jsonify({
-                "profile": settings.get('profile', {}),
-                "preferences": settings.get('preferences', {})
-            }), 200
-        else:
+        # Fetch user settings (served from cache when this process has seen them recently)
+        settings = get_user_settings_row(user.id, fresh=revalidating_elsewhere())
+
+        if settings is None:
             # Create default settings if not exist
-            default_settings = {
-                "user_id": user.id,
-                "profile": {
-                    "bio": "",
-                    "website": "",
-                    "location": ""
-                },
-                "preferences": {
-                    "emailNotifications": True,
-                    "browserNotifications": False,
-                    "galleryUpdates": True,
-                    "marketingEmails": False,
-                    "defaultGalleryVisibility": "private",
-                    "autoSave": True,
-                    "compressImages": True,
-                    "defaultThreshold": 80,
-                    "language": "en"
-                }
-            }
-            result = supabase.table('user_settings').insert(default_settings).execute()
-            return jsonify({
-                "profile": default_settings["profile"],
-                "preferences": default_settings["preferences"]
-            }), 200
+            default_settings = default_user_settings(user.id)
+            result = supabase.table('user_settings').upsert(
+                default_settings, on_conflict='user_id', ignore_duplicates=True
+            ).execute()
+            # An empty result means a concurrent request created the row first
+            settings = cache_user_settings(user.id, result.data[0]) if result.data else get_user_settings_row(user.id)
+
+        etag = etag_for("settings", user.id, settings.get("updated_at"))
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+
+        return private_revalidated(jsonify({
+            "profile": settings["profile"],
+            "preferences": settings["preferences"]
+        }), etag), 200
     
     except Exception as e:
-        print(f"Error fetching user settings: {e}")
+        user_log.error("Error fetching user settings: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -910,9 +1480,6 @@ def update_user_profile():
         if not data:
             return jsonify({"error": "Missing JSON data"}), 400
 
-        # Get current settings
-        result = supabase.table('user_settings').select('*').eq('user_id', user.id).execute()
-
         # Prepare profile data for user_settings table
         profile_data = {
             "name": data.get("name", ""),  # Store name in user_settings
@@ -921,26 +1488,8 @@ def update_user_profile():
             "location": data.get("location", "")
         }
 
-        if result.data and len(result.data) > 0:
-            # Update existing
-            supabase.table('user_settings').update({"profile": profile_data}).eq('user_id', user.id).execute()
-        else:
-            # Create new
-            supabase.table('user_settings').insert({
-                "user_id": user.id,
-                "profile": profile_data,
-                "preferences": {
-                    "emailNotifications": True,
-                    "browserNotifications": False,
-                    "galleryUpdates": True,
-                    "marketingEmails": False,
-                    "defaultGalleryVisibility": "private",
-                    "autoSave": True,
-                    "compressImages": True,
-                    "defaultThreshold": 80,
-                    "language": "en"
-                }
-            }).execute()
+        # Single upsert; a new row gets the column default for preferences
+        upsert_user_settings(user.id, profile=profile_data)
 
         # ALSO TRY to update auth metadata (best effort - won't fail if it doesn't work, and runs AFTER user_settings updates)
         if "name" in data and data["name"]:
@@ -963,7 +1512,7 @@ def update_user_profile():
         return jsonify(response_data), 200
 
     except Exception as e:
-        print(f"[ERROR] /api/user/profile failed: {e}")
+        user_log.error("/api/user/profile failed: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/user/preferences", methods=["PUT"])
@@ -978,23 +1527,13 @@ def update_user_preferences():
         if not data:
             return jsonify({"error": "Missing JSON data"}), 400
         
-        # Get current settings
-        result = supabase.table('user_settings').select('*').eq('user_id', user.id).execute()
-        
-        if result.data and len(result.data) > 0:
-            # Update existing
-            supabase.table('user_settings').update({"preferences": data}).eq('user_id', user.id).execute()
-        else:
-            # Create new
-            supabase.table('user_settings').insert({
-                "user_id": user.id,
-                "preferences": data
-            }).execute()
-        
+        # Single upsert; a new row gets the column default for profile
+        upsert_user_settings(user.id, preferences=data)
+
         return jsonify({"message": "Preferences updated successfully", "preferences": data}), 200
     
     except Exception as e:
-        print(f"Error updating preferences: {e}")
+        user_log.error("Error updating preferences: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -1036,11 +1575,11 @@ def change_password():
             )
             return jsonify({"message": "Password changed successfully"}), 200
         except Exception as e:
-            print(f"Error updating password: {e}")
+            user_log.error("Error updating password: %s", e)
             return jsonify({"error": "Failed to update password"}), 500
     
     except Exception as e:
-        print(f"Error changing password: {e}")
+        user_log.error("Error changing password: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -1052,18 +1591,17 @@ def export_user_data():
         return jsonify({"error": "Unauthorized"}), 401
     
     try:
-        # Fetch all user galleries
-        result = supabase.table('galleries').select('*').eq('user_id', user.id).execute()
-        
-        galleries = result.data if result.data else []
-        
-        # Fetch images for each gallery
+        # All galleries with their images, and the settings, in one parallel round trip
+        with TaskGroup() as tasks:
+            galleries_task = tasks.spawn(
+                lambda: supabase.table('galleries').select('*, images(*)').eq('user_id', user.id).execute())
+            settings_task = tasks.spawn(
+                lambda: supabase.table('user_settings').select('*').eq('user_id', user.id).execute())
+
+        galleries = galleries_task.result().data or []
         for gallery in galleries:
-            images_result = supabase.table('images').select('*').eq('gallery_id', gallery['id']).execute()
-            gallery['images'] = images_result.data if images_result.data else []
-        
-        # Fetch user settings
-        settings_result = supabase.table('user_settings').select('*').eq('user_id', user.id).execute()
+            gallery['images'] = gallery.get('images') or []
+        settings_result = settings_task.result()
         settings = settings_result.data[0] if settings_result.data else {}
         
         # Compile export data
@@ -1082,7 +1620,7 @@ def export_user_data():
         return jsonify(export_data), 200
     
     except Exception as e:
-        print(f"Error exporting data: {e}")
+        user_log.error("Error exporting data: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -1095,39 +1633,35 @@ def delete_user_account():
     
     try:
         # Get all galleries
-        galleries_result = supabase.table('galleries').select('*').eq('user_id', user.id).execute()
-        galleries = galleries_result.data if galleries_result.data else []
-        
-        # Delete all images from storage
-        for gallery in galleries:
-            images_result = supabase.table('images').select('url').eq('gallery_id', gallery['id']).execute()
-            if images_result.data:
-                for image in images_result.data:
-                    try:
-                        # Extract file path from URL
-                        url = image['url']
-                        if STORAGE_BUCKET in url:
-                            file_path = url.split(f"{STORAGE_BUCKET}/")[-1].split("?")[0]
-                            supabase.storage.from_(STORAGE_BUCKET).remove([file_path])
-                    except Exception as e:
-                        print(f"Error deleting image from storage: {e}")
-        
+        galleries_result = supabase.table('galleries').select('id').eq('user_id', user.id).execute()
+        gallery_ids = [gallery['id'] for gallery in galleries_result.data or []]
+
+        # Get all images whose files need deleting from storage
+        images = []
+        if gallery_ids:
+            images_result = supabase.table('images').select('url, thumbnail_url, metadata').in_('gallery_id', gallery_ids).execute()
+            images = images_result.data or []
+
         # Delete user settings
         supabase.table('user_settings').delete().eq('user_id', user.id).execute()
-        
+        user_settings_cache.invalidate(user.id)
+
         # Delete galleries (cascade will delete images from database)
         supabase.table('galleries').delete().eq('user_id', user.id).execute()
-        
+
+        # Delete images from storage
+        release_image_files(user.id, images)
+
         # Delete user from auth
         try:
             admin_supabase.auth.admin.delete_user(user.id)
         except Exception as e:
-            print(f"Error deleting user from auth: {e}")
+            user_log.error("Error deleting user from auth: %s", e)
         
         return jsonify({"message": "Account deleted successfully"}), 200
     
     except Exception as e:
-        print(f"Error deleting account: {e}")
+        user_log.error("Error deleting account: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -1141,20 +1675,24 @@ def list_galleries():
         return jsonify({"error": "Unauthorized"}), 401
     
     try:
-        # Fetch galleries for this user
-        result = supabase.table('galleries').select('*').eq('user_id', user.id).order('created_at', desc=True).execute()
-        
+        # Fetch galleries for this user, with their image ids for an exact image_count in the same round trip
+        result = supabase.table('galleries').select('*, images(id)').eq('user_id', user.id).order(
+            'created_at', desc=True).execute()
+
         galleries = result.data if result.data else []
-        
-        # Update image_count for each gallery
         for gallery in galleries:
-            images_result = supabase.table('images').select('id').eq('gallery_id', gallery['id']).execute()
-            gallery['image_count'] = len(images_result.data) if images_result.data else 0
-        
-        return jsonify(galleries), 200
+            gallery['image_count'] = len(gallery.pop('images', None) or [])
+
+        # version changes with every gallery or image write (migrations/add_gallery_version.sql)
+        etag = etag_for("galleries", user.id, *[(g['id'], g.get('version'), g.get('updated_at')) for g in galleries])
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+
+        return private_revalidated(jsonify(galleries), etag), 200
     
     except Exception as e:
-        print(f"Error fetching galleries: {e}")
+        gallery_log.error("Error fetching galleries: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -1212,7 +1750,7 @@ def create_gallery():
             return jsonify({"error": "Failed to create gallery"}), 500
     
     except Exception as e:
-        print(f"Error creating gallery: {e}")
+        gallery_log.error("Error creating gallery: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -1231,6 +1769,12 @@ def get_gallery(gallery_id):
             return jsonify({"error": "Gallery not found"}), 404
         
         gallery = gallery_result.data[0]
+
+        # The images query is only needed if the client's copy is out of date
+        etag = etag_for("gallery", gallery_id, gallery.get('version'), gallery.get('updated_at'))
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
         
         # Fetch images for this gallery
         images_result = supabase.table('images').select('*').eq('gallery_id', gallery_id).order('order_index').execute()
@@ -1240,10 +1784,10 @@ def get_gallery(gallery_id):
         # Update image_count to match actual count
         gallery['image_count'] = len(gallery['images'])
         
-        return jsonify(gallery), 200
+        return private_revalidated(jsonify(gallery), etag), 200
     
     except Exception as e:
-        print(f"Error fetching gallery: {e}")
+        gallery_log.error("Error fetching gallery: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -1295,7 +1839,7 @@ def update_gallery(gallery_id):
             return jsonify({"error": "Failed to update gallery"}), 500
 
     except Exception as e:
-        print(f"Error updating gallery: {e}")
+        gallery_log.error("Error updating gallery: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -1313,29 +1857,82 @@ def delete_gallery(gallery_id):
         if not gallery_result.data:
             return jsonify({"error": "Gallery not found"}), 404
         
-        # Get all images to delete from storage
-        images_result = supabase.table('images').select('url').eq('gallery_id', gallery_id).execute()
-        
-        # Delete images from storage
-        if images_result.data:
-            for image in images_result.data:
-                try:
-                    # Extract file path from URL
-                    url = image['url']
-                    if STORAGE_BUCKET in url:
-                        file_path = url.split(f"{STORAGE_BUCKET}/")[-1].split("?")[0]
-                        supabase.storage.from_(STORAGE_BUCKET).remove([file_path])
-                except Exception as e:
-                    print(f"Error deleting image from storage: {e}")
-        
+        # Get all images whose files may need deleting from storage
+        images_result = supabase.table('images').select('url, thumbnail_url, metadata').eq('gallery_id', gallery_id).execute()
+
         # Delete gallery (cascade will delete images from database)
         supabase.table('galleries').delete().eq('id', gallery_id).execute()
-        
+
+        # Drop the images' references; files still used by other galleries are kept
+        release_image_files(user.id, images_result.data or [])
+
         return jsonify({"message": "Gallery deleted successfully"}), 200
     
     except Exception as e:
-        print(f"Error deleting gallery: {e}")
+        gallery_log.error("Error deleting gallery: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/galleries/<gallery_id>/images", methods=["DELETE"])
+def delete_gallery_images(gallery_id):
+    """
+    Delete several images of a gallery at once: {"imageIds": [...], "compact": true}.
+    One database call removes the rows, drops their object references and sets
+    image_count (delete_gallery_images, migrations/add_delete_gallery_images.sql).
+    With "compact" it also renumbers the remaining order_index values to 0..n-1.
+    Storage objects are removed afterwards by a background job.
+    """
+    user = get_user_from_token()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+    if not UUID_PATTERN.match(gallery_id):
+        return jsonify({"error": "Gallery not found"}), 404
+
+    data = request.get_json(silent=True) or {}
+    image_ids = data.get('imageIds')
+    if not isinstance(image_ids, list) or not image_ids:
+        return jsonify({"error": "imageIds must be a non-empty list"}), 400
+    if not all(isinstance(image_id, str) and UUID_PATTERN.match(image_id) for image_id in image_ids):
+        return jsonify({"error": "imageIds must be image ids"}), 400
+    image_ids = list(dict.fromkeys(image_ids))
+    if len(image_ids) > MAX_IMAGES_PER_GALLERY:
+        return jsonify({"error": f"At most {MAX_IMAGES_PER_GALLERY} images per request"}), 400
+
+    try:
+        result = supabase.rpc('delete_gallery_images', {
+            "p_user_id": user.id,
+            "p_gallery_id": gallery_id,
+            "p_image_ids": image_ids,
+            "p_compact": bool(data.get('compact'))
+        }).execute()
+    except Exception as e:
+        gallery_log.error("Error deleting images: %s", e)
         return jsonify({"error": str(e)}), 500
+    if not result.data:
+        return jsonify({"error": "Gallery not found"}), 404
+    outcome = result.data[0]
+    deleted = outcome.get('deleted') or []
+
+    for image in deleted:
+        render_sources.invalidate(image['id'])
+    for with_lqip in (False, True):
+        manifest_cache.invalidate((gallery_id, with_lqip))
+
+    job_id = None
+    paths = image_file_paths(deleted, outcome.get('released') or [])
+    if paths:
+        try:
+            job_id = job_queue.enqueue("storage_cleanup", {"paths": paths}, owner=user.id)['id']
+        except Exception as e:
+            gallery_log.error("Could not schedule removal of %d storage objects: %s", len(paths), e)
+
+    return jsonify({
+        "deleted": [image['id'] for image in deleted],
+        "imageCount": outcome.get('image_count'),
+        "version": outcome.get('version'),
+        "cleanupJobId": job_id,
+        **inline_job_results([job_id])
+    }), 200
 
 
 @app.route("/api/galleries/<gallery_id>/register-image", methods=["POST"])
@@ -1371,8 +1968,11 @@ def register_uploaded_image(gallery_id):
 
         if not url or not storage_key:
             return jsonify({"error": "Missing required fields (url, storageKey)"}), 400
+        # Client-reported, so only a first line of defence; the derivatives job checks the real header
+        if isinstance(width, int) and isinstance(height, int) and width * height > MAX_IMAGE_PIXELS:
+            return jsonify({"error": f"Image exceeds {MAX_IMAGE_PIXELS // 1_000_000} megapixel limit"}), 413
 
-        # Use same URL for thumbnail (Supabase can do transforms later)
+        # Use same URL for thumbnail until the derivatives job replaces it
         thumbnail_url = url
 
         # Get current max order index
@@ -1408,13 +2008,20 @@ def register_uploaded_image(gallery_id):
             "status": "processing" if new_count > 0 else gallery['status']
         }).eq('id', gallery_id).execute()
 
+        # The file never passed through us; the job fetches it back (only from the user's own folder)
+        job_id = None
+        if storage_key.startswith(f"{user.id}/"):
+            job_id = schedule_derivatives(user.id, image_result.data[0], storage_key)
+
         return jsonify({
             "success": True,
-            "image": image_result.data[0]
+            "image": image_result.data[0],
+            "jobId": job_id,
+            **inline_job_results([job_id])
         }), 200
 
     except Exception as e:
-        print(f"Register image error: {e}")
+        gallery_log.error("Register image error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -1444,10 +2051,13 @@ def upload_images(gallery_id):
             return jsonify({"error": "No images provided"}), 400
         
         # Check total image count
-        if gallery['image_count'] + len(files) > 50:
-            return jsonify({"error": "Maximum 50 images per gallery"}), 400
+        if gallery['image_count'] + len(files) > MAX_IMAGES_PER_GALLERY:
+            return jsonify({"error": f"Maximum {MAX_IMAGES_PER_GALLERY} images per gallery"}), 400
         
         uploaded_images = []
+        rejected = []
+        jobs = {}
+        scheduled_hashes = set()
         
         # Get current max order index
         max_order_result = supabase.table('images').select('order_index').eq('gallery_id', gallery_id).order('order_index', desc=True).limit(1).execute()
@@ -1455,71 +2065,63 @@ def upload_images(gallery_id):
         
         for idx, file in enumerate(files):
             if file and allowed_file(file.filename):
-                # Read file data
-                file_data = file.read()
-                
-                # Check file size
-                if len(file_data) > MAX_FILE_SIZE:
+                # Already hashed, measured and probed while the request body streamed in
+                spool = file.stream
+                if spool.too_large:
+                    rejected.append({"filename": file.filename, "error": f"File exceeds {MAX_FILE_SIZE // (1024 * 1024)}MB limit"})
                     continue
-                
-                # Generate unique filename
+                if spool.too_many_pixels:
+                    rejected.append({"filename": file.filename,
+                                     "error": f"Image exceeds {MAX_IMAGE_PIXELS // 1_000_000} megapixel limit"})
+                    continue
+                sha256 = spool.sha256
+
                 file_ext = file.filename.rsplit('.', 1)[1].lower()
-                unique_filename = f"{user.id}/{gallery_id}/{uuid.uuid4()}.{file_ext}"
-                
+
+                image_data = None
                 try:
-                    # Upload original image
-                    supabase.storage.from_(STORAGE_BUCKET).upload(
-                        unique_filename,
-                        file_data,
-                        file_options={"content-type": f"image/{file_ext}"}
-                    )
-                    
-                    # Get public URL
-                    image_url = supabase.storage.from_(STORAGE_BUCKET).get_public_url(unique_filename)
-                    
-                    # Create and upload thumbnail
-                    thumbnail_data = create_thumbnail(file_data)
-                    thumbnail_filename = None
-                    thumbnail_url = None
-                    
-                    if thumbnail_data:
-                        thumbnail_filename = f"{user.id}/{gallery_id}/thumbs/{uuid.uuid4()}.jpg"
-                        supabase.storage.from_(STORAGE_BUCKET).upload(
-                            thumbnail_filename,
-                            thumbnail_data,
-                            file_options={"content-type": "image/jpeg"}
-                        )
-                        thumbnail_url = supabase.storage.from_(STORAGE_BUCKET).get_public_url(thumbnail_filename)
-                    
-                    # Get image metadata (safe if Pillow unavailable)
-                    metadata = {"size": len(file_data)}
-                    if PIL_AVAILABLE:
-                        try:
-                            img = Image.open(io.BytesIO(file_data))
-                            metadata.update({
-                                "width": img.width,
-                                "height": img.height,
-                                "format": img.format
-                            })
-                        except Exception as meta_err:
-                            print(f"Pillow metadata read failed: {meta_err}")
-                    
+                    # Same bytes already stored for this user: reuse the objects, skip upload and derivatives
+                    stored = acquire_image_object(user.id, sha256)
+                    if stored is not None:
+                        IMAGE_UPLOADS.inc(result="deduplicated")
+                        DEDUPE_BYTES_SAVED.inc(spool.size)
+                    else:
+                        stored = store_image_object(user.id, gallery_id, file_ext, spool)
+                        IMAGE_UPLOADS.inc(result="stored")
+
                     # Save image record to database
                     image_data = {
                         "gallery_id": gallery_id,
-                        "url": image_url,
-                        "thumbnail_url": thumbnail_url,
-                        "metadata": metadata,
+                        "url": stored['url'],
+                        "thumbnail_url": stored.get('thumbnail_url'),
+                        "metadata": {
+                            **(stored.get('metadata') or {}),
+                            "sha256": sha256,
+                            "storage_key": stored['storage_key'],
+                            "thumbnail_key": stored.get('thumbnail_key')
+                        },
                         "order_index": current_max_order + idx + 1
                     }
-                    
+
                     image_result = supabase.table('images').insert(image_data).execute()
-                    
-                    if image_result.data:
-                        uploaded_images.append(image_result.data[0])
-                
+
+                    if not image_result.data:
+                        raise RuntimeError("Failed to save image record")
+                    image_row = image_result.data[0]
+                    uploaded_images.append(image_row)
+
+                    # Thumbnail and placeholder are made in the background (a duplicate may still be waiting for its own)
+                    if not stored.get('thumbnail_key'):
+                        # Same bytes twice in one batch: let the first job finish so the second just copies its result
+                        delay = DUPLICATE_JOB_DELAY if sha256 in scheduled_hashes else 0
+                        jobs[image_row['id']] = schedule_derivatives(user.id, image_row, stored['storage_key'], sha256, delay)
+                        scheduled_hashes.add(sha256)
+
                 except Exception as e:
-                    print(f"Error uploading image: {e}")
+                    gallery_log.error("Error uploading image: %s", e)
+                    if image_data is not None:
+                        # Give back the reference this image would have held
+                        release_image_files(user.id, [image_data])
                     continue
         
         # Update gallery image_count and status
@@ -1533,17 +2135,20 @@ def upload_images(gallery_id):
         
         return jsonify({
             "uploadedCount": len(uploaded_images),
-            "images": uploaded_images
+            "images": uploaded_images,
+            "rejected": rejected,
+            "jobs": jobs,
+            **inline_job_results(jobs.values())
         }), 200
     
     except Exception as e:
-        print(f"Error uploading images: {e}")
+        gallery_log.error("Error uploading images: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/api/galleries/<gallery_id>/analyze", methods=["POST"])
 def analyze_gallery(gallery_id):
-    """Analyze gallery (placeholder for future AI integration)"""
+    """Analyze gallery images (tone, color, palette, aspect ratios) and suggest threshold/animation/mood"""
     user = get_user_from_token()
     if not user:
         return jsonify({"error": "Unauthorized"}), 401
@@ -1554,16 +2159,28 @@ def analyze_gallery(gallery_id):
         
         if not gallery_result.data:
             return jsonify({"error": "Gallery not found"}), 404
+
+        gallery = gallery_result.data[0]
+        images_result = supabase.table('images').select('id, gallery_id, url, thumbnail_url, metadata').eq('gallery_id', gallery_id).execute()
+        images = images_result.data or []
+
+        started = time.perf_counter()
+        features = load_image_features(images)
+        analyzed = [(image, feature) for image, feature in zip(images, features) if feature is not None]
+        if analyzed:
+            suggested, summary = analysis.suggest_config(
+                [feature for _, feature in analyzed],
+                [((image.get('metadata') or {}).get('width'), (image.get('metadata') or {}).get('height'))
+                 for image, _ in analyzed]
+            )
+        else:
+            suggested, summary = {"threshold": 80, "animationType": "fade", "mood": "calm"}, {"imageCount": 0}
+        ANALYSIS_DURATION.observe(time.perf_counter() - started)
+
+        # Keep branding and other settings stored alongside the suggestion
+        config = {**(gallery.get('config') or {}), **suggested, "analysis": summary}
         
-        # For now, just mark as analyzed with default config
-        # In the future, this will integrate with AI services
-        config = {
-            "threshold": 80,
-            "animationType": "fade",
-            "mood": "calm"
-        }
-        
-        result = supabase.table('galleries').update({
+        supabase.table('galleries').update({
             "status": "analyzed",
             "analysis_complete": True,
             "config": config
@@ -1572,14 +2189,92 @@ def analyze_gallery(gallery_id):
         return jsonify({
             "analysisComplete": True,
             "config": config,
-            "message": "Gallery marked as analyzed. AI analysis coming soon!"
+            "message": f"Analyzed {summary['imageCount']} images"
         }), 200
     
     except Exception as e:
-        print(f"Error analyzing gallery: {e}")
+        gallery_log.error("Error analyzing gallery: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
+def sample_image(image_data):
+    """Analysis sample of one stored image (bytes or file); runs in the image pool"""
+    Image = get_pil_image()
+    return analysis.sample_from_image(Image.open(io.BytesIO(image_data) if isinstance(image_data, bytes)
+                                                 else image_data))
+
+
+def fetch_sample(key):
+    """Download one stored image and sample it, admitted by the decode budget like every other decode"""
+    data = supabase.storage.from_(STORAGE_BUCKET).download(key)
+    return decode_in_pool(sample_image, data, (analysis.SAMPLE_SIZE * 2,) * 2)
+
+
+def load_image_features(images):
+    """
+    Analysis features for each images row (None where none could be computed).
+    Features cached in metadata are reused; the rest are computed in one batch
+    from the stored LQIP, or the thumbnail if there is none, and cached back.
+    """
+    Image = get_pil_image()
+    features = [None] * len(images)
+    samples = {}
+    downloads = {}
+
+    for index, image in enumerate(images):
+        metadata = image.get('metadata') or {}
+        cached = metadata.get('features')
+        if cached and cached.get('version') == analysis.FEATURES_VERSION:
+            features[index] = cached
+            ANALYSIS_IMAGES.inc(source="cache")
+            continue
+        if Image is None:
+            continue
+        lqip = (metadata.get('placeholder') or {}).get('lqip')
+        if lqip:
+            try:
+                samples[index] = analysis.sample_from_data_uri(Image, lqip)
+                ANALYSIS_IMAGES.inc(source="lqip")
+                continue
+            except Exception as e:
+                gallery_log.warning("Could not decode placeholder of image %s: %s", image.get('id'), e)
+        key = metadata.get('thumbnail_key') or storage_path_from_url(image.get('thumbnail_url') or image.get('url'))
+        if key:
+            downloads[index] = key
+
+    # Images without derivatives yet fall back to their original (up to MAX_FILE_SIZE each), so only
+    # ANALYSIS_FETCH_BATCH are held at once; each is decoded in its own pool task under the decode budget
+    pending = sorted(downloads)
+    for start in range(0, len(pending), ANALYSIS_FETCH_BATCH):
+        with TaskGroup(timeout=ANALYSIS_FETCH_TIMEOUT) as tasks:
+            fetched = {index: tasks.spawn(fetch_sample, downloads[index])
+                       for index in pending[start:start + ANALYSIS_FETCH_BATCH]}
+        for index, task in fetched.items():
+            try:
+                samples[index] = task.result()
+            except Exception as e:
+                gallery_log.warning("Could not analyze image %s: %s", images[index].get('id'), e)
+                continue
+            ANALYSIS_IMAGES.inc(source="thumbnail")
+
+    if not samples:
+        return features
+
+    order = sorted(samples)
+    patches = []
+    for index, feature in zip(order, analysis.extract_features([samples[i] for i in order])):
+        features[index] = feature
+        patches.append({"id": images[index]['id'], "metadata": {"features": feature}})
+
+    # Cache the new features with the images in one round trip, setting only metadata.features:
+    # a derivatives job may have written the rest of metadata since it was read
+    try:
+        supabase.rpc('merge_image_metadata', {"p_patches": patches}).execute()
+    except Exception as e:
+        gallery_log.warning("Could not cache image features: %s", e)
+    return features
+
+
 @app.route("/api/images/<image_id>/transform", methods=["PATCH"])
 def update_image_transform(image_id):
     """Update image transformation metadata (crop, scale, rotation)"""
@@ -1636,10 +2331,141 @@ def update_image_transform(image_id):
             return jsonify({"error": "Failed to update image"}), 500
 
     except Exception as e:
-        print(f"Error updating image transform: {e}")
+        gallery_log.error("Error updating image transform: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/images/<image_id>/render", methods=["GET"])
+def render_image_variant(image_id):
+    """
+    Image resized/re-encoded on demand: ?w=&h=&fit=contain|cover|fill&fmt=auto|jpeg|webp|avif|png.
+    fmt=auto (the default) picks AVIF/WebP/JPEG from the Accept header and the
+    image's metadata["delivery_format"]. Images of published galleries are public;
+    others render only for their owner. Rendered bytes are kept in a disk LRU cache
+    and served with a strong ETag derived from the stored copy they were rendered
+    from, which changes once derivatives land. ?v=<that ETag> answers are cacheable
+    forever; other requests are cached briefly and revalidate.
+    """
+    try:
+        width = int(request.args['w']) if request.args.get('w') else None
+        height = int(request.args['h']) if request.args.get('h') else None
+    except ValueError:
+        return jsonify({"error": "w and h must be integers"}), 400
+    fit = request.args.get('fit', 'contain')
+    fmt = request.args.get('fmt', 'auto').lower().replace('jpg', 'jpeg')
+    if not width and not height:
+        return jsonify({"error": "w or h is required"}), 400
+    if any(v is not None and not 0 < v <= MAX_RENDER_DIMENSION for v in (width, height)):
+        return jsonify({"error": f"w and h must be between 1 and {MAX_RENDER_DIMENSION}"}), 400
+    if fit not in RENDER_FITS or (fmt != 'auto' and not (fmt in IMAGE_FORMATS and can_encode(fmt))):
+        return jsonify({"error": "Unsupported fit or fmt"}), 400
+    if not UUID_PATTERN.match(image_id):
+        return jsonify({"error": "Image not found"}), 404
+
+    try:
+        image = render_sources.get(image_id)
+        if image is None:
+            result = supabase.table('images').select(
+                'url, thumbnail_url, metadata, galleries(user_id, status)').eq('id', image_id).execute()
+            if not result.data:
+                return jsonify({"error": "Image not found"}), 404
+            image = result.data[0]
+            render_sources.set(image_id, image)
+
+        gallery = image.get('galleries') or {}
+        published = gallery.get('status') == 'published'
+        if not published:
+            user = get_user_from_token()
+            if not user or user.id != gallery.get('user_id'):
+                return jsonify({"error": "Image not found"}), 404
+
+        negotiated = fmt == 'auto'
+        if negotiated:
+            fmt = negotiate_format(request.accept_mimetypes, (image.get('metadata') or {}).get('delivery_format'))
+        source_key = pick_render_source(image, width, height, fit, fmt)
+        if not source_key:
+            return jsonify({"error": "Image not found"}), 404
+
+        cache_key = f"{source_key}|{width}|{height}|{fit}|{fmt}"
+        etag = hashlib.sha256(cache_key.encode()).hexdigest()[:32]
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            mapped = render_cache.get(cache_key)
+            if mapped is not None:
+                body, length = _mmap_chunks(mapped), len(mapped)
+            else:
+                def render():
+                    data = decode_in_pool(render_image, supabase.storage.from_(STORAGE_BUCKET).download(source_key),
+                                          (width or 1, height or 1), width, height, fit, fmt)
+                    render_cache.set(cache_key, data)
+                    return data
+                data = render_flight.do(cache_key, render)
+                body, length = data, len(data)
+            response = Response(body, mimetype=IMAGE_FORMATS[fmt])
+            response.headers['Content-Length'] = str(length)
+            if mapped is not None:
+                # Runs once the server is done with the response, even if the body was never
+                # (fully) iterated: HEAD requests, client disconnects, aborted streams
+                response.call_on_close(mapped.close)
+
+        if not published:
+            private_revalidated(response, etag)  # Owner-only: never shared between users by a cache
+        else:
+            response.set_etag(etag)
+            if request.args.get('v') == etag:
+                response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+            else:
+                response.headers['Cache-Control'] = 'public, max-age=60, stale-while-revalidate=600'
+        if negotiated:
+            response.vary.add('Accept')
+        return response
+
+    except ImageTooLarge as e:
+        return jsonify({"error": str(e)}), 422
+    except (ImagePoolBusy, DecodeBudgetBusy):
+        response = jsonify({"error": "Image renderer busy, try again shortly"})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    except Exception as e:
+        gallery_log.error("Error rendering image %s: %s", image_id, e)
+        return jsonify({"error": str(e)}), 500
+
+
+def pick_render_source(image, width, height, fit, fmt):
+    """
+    Storage key of the smallest stored copy big enough for the requested size:
+    the 400px thumbnail, an 800/1600px variant, or the original. Derivatives are
+    flattened JPEGs, so transparent formats keep rendering from the original.
+    """
+    metadata = image.get('metadata') or {}
+    original = metadata.get('storage_key') or storage_path_from_url(image.get('url'))
+    if fmt != 'jpeg' and str(metadata.get('format', '')).lower() in ('png', 'webp'):
+        return original
+
+    source_w, source_h = metadata.get('width'), metadata.get('height')
+    if not source_w or not source_h:
+        return original
+    # Scale the output will have relative to the original; stored copies are bounded on their long side
+    scales = [target / side for target, side in ((width, source_w), (height, source_h)) if target]
+    scale = max(scales) if fit in ('cover', 'fill') else min(scales)
+    needed = max(source_w, source_h) * min(scale, 1.0)
+
+    candidates = [(int(size), storage_path_from_url(url)) for size, url in (metadata.get('variants') or {}).items()]
+    if metadata.get('thumbnail_key'):
+        candidates.append((THUMBNAIL_SIZE[0], metadata['thumbnail_key']))
+    for size, key in sorted(candidates):
+        if key and size >= needed:
+            return key
+    return original
+
+
+def _mmap_chunks(mapped, chunk_size=256 * 1024):
+    """Stream a memory-mapped cache entry in slices; the response closes the mapping"""
+    for offset in range(0, len(mapped), chunk_size):
+        yield mapped[offset:offset + chunk_size]
+
+
 @app.route("/api/galleries/<gallery_id>/branding", methods=["PATCH"])
 def update_gallery_branding(gallery_id):
     """Update gallery branding (custom name, email, social links)"""
@@ -1689,7 +2515,7 @@ def update_gallery_branding(gallery_id):
             return jsonify({"error": "Failed to update gallery branding"}), 500
 
     except Exception as e:
-        print(f"[ERROR] /api/galleries/<gallery_id>/branding failed: {e}")
+        gallery_log.error("/api/galleries/<gallery_id>/branding failed: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -1711,12 +2537,7 @@ def get_public_gallery(username, slug):
         gallery = gallery_result.data[0]
         
         # Get user info
-        user_result = admin_supabase.auth.admin.get_user_by_id(gallery['user_id'])
-        
-        owner_info = {
-            "username": user_result.user.email.split('@')[0] if user_result.user else "user",
-            "name": user_result.user.user_metadata.get("full_name", "") if user_result.user else ""
-        }
+        owner_info = get_gallery_owner_info(gallery['user_id'])
         
         # Format response
         response = {
@@ -1733,43 +2554,376 @@ def get_public_gallery(username, slug):
         return jsonify(response), 200
     
     except Exception as e:
-        print(f"Error fetching public gallery: {e}")
+        gallery_log.warning("Error fetching public gallery: %s", e)
         return jsonify({"error": "Gallery not found"}), 404
 
 
-@app.route("/api/gallery/<gallery_id>", methods=["GET"])
-def get_public_gallery_by_id(gallery_id):
-    """Get a published gallery by ID (public access, alternative route)"""
-    try:
+def get_gallery_owner_info(user_id):
+    """Public owner info for a gallery; concurrent lookups for the same owner share one Auth call"""
+    def fetch():
+        user_result = admin_supabase.auth.admin.get_user_by_id(user_id)
+        return {
+            "username": user_result.user.email.split('@')[0] if user_result.user else "user",
+            "name": user_result.user.user_metadata.get("full_name", "") if user_result.user else ""
+        }
+    return owner_flight.do(user_id, fetch)
+
+
+def load_public_gallery(gallery_id):
+    """Fetch a published gallery with images and owner, or None. The result is shared between
+    concurrent callers, so treat it as read-only."""
+    def fetch():
         gallery_result = supabase.table('galleries').select('*').eq('id', gallery_id).eq('status', 'published').execute()
-        
         if not gallery_result.data:
-            return jsonify({"error": "Gallery not found or not published"}), 404
-        
+            return None
+
         gallery = gallery_result.data[0]
-        
+
         # Get images
         images_result = supabase.table('images').select('*').eq('gallery_id', gallery_id).order('order_index').execute()
-        
         gallery['images'] = images_result.data if images_result.data else []
-        
+
         # Get user info
         try:
-            user_result = admin_supabase.auth.admin.get_user_by_id(gallery['user_id'])
-            gallery['owner'] = {
-                "username": user_result.user.email.split('@')[0] if user_result.user else "user",
-                "name": user_result.user.user_metadata.get("full_name", "") if user_result.user else ""
-            }
-        except:
+            gallery['owner'] = get_gallery_owner_info(gallery['user_id'])
+        except Exception:
             gallery['owner'] = {"username": "user", "name": ""}
-        
+        return gallery
+
+    return public_gallery_flight.do(gallery_id, fetch)
+
+
+@app.route("/api/gallery/<gallery_id>", methods=["GET"])
+def get_public_gallery_by_id(gallery_id):
+    """Get a published gallery by ID (public access, alternative route)"""
+    try:
+        gallery = load_public_gallery(gallery_id)
+
+        if gallery is None:
+            return jsonify({"error": "Gallery not found or not published"}), 404
+
         return jsonify(gallery), 200
     
     except Exception as e:
-        print(f"Error fetching public gallery: {e}")
+        gallery_log.warning("Error fetching public gallery: %s", e)
         return jsonify({"error": "Gallery not found"}), 404
 
 
+@app.route("/api/gallery/<gallery_id>/manifest", methods=["GET"])
+def get_gallery_manifest(gallery_id):
+    """
+    What the cursor trail needs for first paint of a published gallery, in a compact
+    columnar layout (see build_gallery_manifest). ?v=<version> answers for the current
+    version are cacheable forever; other requests are cached briefly and revalidate.
+    ?lqip=1 adds the inline previews.
+    """
+    if not UUID_PATTERN.match(gallery_id):
+        return jsonify({"error": "Gallery not found or not published"}), 404
+    with_lqip = request.args.get('lqip') in ('1', 'true')
+    cache_key = (gallery_id, with_lqip)
+    try:
+        requested = request.args.get('v', type=int)
+        manifest = manifest_cache.get(cache_key)
+        if manifest is None or (requested is not None and requested > manifest['version']):
+            manifest = manifest_flight.do(cache_key, lambda: load_gallery_manifest(gallery_id, with_lqip))
+            if manifest is None:
+                return jsonify({"error": "Gallery not found or not published"}), 404
+            manifest_cache.set(cache_key, manifest)
+    except Exception as e:
+        gallery_log.warning("Error fetching gallery manifest: %s", e)
+        return jsonify({"error": "Gallery not found"}), 404
+
+    etag = f"{gallery_id}-{manifest['version']}-{int(with_lqip)}-{MANIFEST_FORMAT}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(manifest)
+    response.set_etag(etag)
+    if requested == manifest['version']:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'public, max-age=60, stale-while-revalidate=600'
+    return response
+
+
+def load_gallery_manifest(gallery_id, with_lqip=False):
+    """Published gallery and its images in one PostgREST call, as a manifest; None if not published"""
+    result = supabase.table('galleries').select(
+        'id, version, config, images(id, url, thumbnail_url, metadata, order_index)'
+    ).eq('id', gallery_id).eq('status', 'published').execute()
+    if not result.data:
+        return None
+    return build_gallery_manifest(result.data[0], with_lqip)
+
+
+def build_gallery_manifest(gallery, with_lqip=False):
+    """
+    Parallel arrays, one entry per image in display order:
+
+        {"format": 1, "id": <gallery id>, "version": 7, "config": {...},
+         "base": "<public bucket URL>/", "sizes": [400, 800, 1600],
+         "ids": [...], "w": [...], "h": [...],
+         "src": {"400": [...], "800": [...], "1600": [...], "full": [...]},
+         "alt": {"webp": [1, 0, ...]}, "blurhash": [...], "color": [...], "lqip": [...]}
+
+    src paths are relative to base unless they are absolute URLs. Each size class
+    holds the smallest stored copy at least that large, else the original (the
+    same path as in "full"). An image with alt[fmt] == 1 also has each of those
+    derivatives under the same path with the extension swapped to that format.
+    """
+    base = f"{SUPABASE_URL.rstrip('/')}/storage/v1/object/public/{STORAGE_BUCKET}/"
+
+    def relative(url):
+        return url[len(base):] if url and url.startswith(base) else url
+
+    images = sorted(gallery.get('images') or [], key=lambda image: image.get('order_index') or 0)
+    src = {str(size): [] for size in MANIFEST_SIZE_CLASSES}
+    src['full'] = []
+    columns = {"ids": [], "w": [], "h": [], "blurhash": [], "color": [], "lqip": []}
+    alt = {fmt: [] for fmt in DERIVATIVE_FORMATS}
+
+    for image in images:
+        metadata = image.get('metadata') or {}
+        placeholder = metadata.get('placeholder') or {}
+        columns['ids'].append(image['id'])
+        columns['w'].append(metadata.get('width'))
+        columns['h'].append(metadata.get('height'))
+        columns['blurhash'].append(placeholder.get('blurhash'))
+        columns['color'].append(placeholder.get('dominant_color'))
+        columns['lqip'].append(placeholder.get('lqip'))
+
+        stored = sorted([(int(size), url) for size, url in (metadata.get('variants') or {}).items()])
+        if image.get('thumbnail_url'):
+            stored.insert(0, (THUMBNAIL_SIZE[0], image['thumbnail_url']))
+        for size in MANIFEST_SIZE_CLASSES:
+            fit = next((url for stored_size, url in stored if stored_size >= size), image['url'])
+            src[str(size)].append(relative(fit))
+        src['full'].append(relative(image['url']))
+        for fmt in alt:
+            alt[fmt].append(1 if fmt in (metadata.get('formats') or {}) else 0)
+
+    manifest = {
+        "format": MANIFEST_FORMAT,
+        "id": gallery['id'],
+        "version": gallery.get('version') or 0,
+        "config": gallery.get('config') or {},
+        "base": base,
+        "sizes": list(MANIFEST_SIZE_CLASSES),
+        "ids": columns['ids'],
+        "w": columns['w'],
+        "h": columns['h'],
+        "src": src,
+        "alt": {fmt: flags for fmt, flags in alt.items() if any(flags)},
+        "blurhash": columns['blurhash'],
+        "color": columns['color'],
+    }
+    if with_lqip:
+        manifest['lqip'] = columns['lqip']
+    return manifest
+
+
+# ==================== Background Jobs ====================
+
+@job_queue.handler("image_derivatives", concurrency=int(os.environ.get("DERIVATIVE_CONCURRENCY", 2)))
+def generate_image_derivatives(payload):
+    """
+    Thumbnail, size variants and placeholder for a stored original, then patch the images row.
+    Content-addressed originals also get their hash index entry patched, so later
+    duplicates reuse the derivatives; if another job already made them, nothing is regenerated.
+    """
+    user_id, sha256, storage_key = payload['user_id'], payload.get('sha256'), payload['storage_key']
+    bucket = supabase.storage.from_(STORAGE_BUCKET)
+
+    indexed = None
+    if sha256:
+        index_result = supabase.table('image_objects').select('*').eq('user_id', user_id).eq('sha256', sha256).execute()
+        indexed = index_result.data[0] if index_result.data else None
+
+    if indexed and indexed.get('thumbnail_key'):
+        thumbnail_url = indexed['thumbnail_url']
+        derived = {key: value for key, value in (indexed.get('metadata') or {}).items()
+                   if key in ('placeholder', 'variants', 'formats')}
+        derived['thumbnail_key'] = indexed['thumbnail_key']
+    else:
+        try:
+            derivatives = decode_in_pool(create_derivatives, bucket.download(storage_key), (VARIANT_SIZES[-1],) * 2)
+        except ImageTooLarge as e:
+            gallery_log.warning("Not deriving %s: %s", storage_key, e)
+            return {"thumbnail": False, "error": str(e)}
+        if derivatives is None:
+            return {"thumbnail": False}  # Not decodable (or no Pillow); retrying won't help
+
+        variants = {}
+        for size, data in derivatives['variants'].items():
+            key = variant_key_for(storage_key, size)
+            bucket.upload(key, data, file_options={"content-type": "image/jpeg", "upsert": "true"})
+            variants[str(size)] = bucket.get_public_url(key)
+
+        thumbnail_key = thumbnail_key_for(storage_key)
+        bucket.upload(thumbnail_key, derivatives['thumbnail'],
+                      file_options={"content-type": "image/jpeg", "upsert": "true"})
+        thumbnail_url = bucket.get_public_url(thumbnail_key)
+
+        # WebP/AVIF copies of the same sizes: {"webp": {"thumbnail_url": ..., "variants": {"800": url}}}
+        formats = {}
+        for fmt, encoded in derivatives['formats'].items():
+            content_type = {"content-type": IMAGE_FORMATS[fmt], "upsert": "true"}
+            entry = {"variants": {}}
+            for size, data in encoded['variants'].items():
+                key = variant_key_for(storage_key, size, fmt)
+                bucket.upload(key, data, file_options=content_type)
+                entry['variants'][str(size)] = bucket.get_public_url(key)
+            key = thumbnail_key_for(storage_key, fmt)
+            bucket.upload(key, encoded['thumbnail'], file_options=content_type)
+            entry['thumbnail_url'] = bucket.get_public_url(key)
+            formats[fmt] = entry
+
+        derived = {"thumbnail_key": thumbnail_key, "variants": variants}
+        if formats:
+            derived['formats'] = formats
+        if derivatives['placeholder']:
+            derived['placeholder'] = derivatives['placeholder']
+
+        if indexed:
+            supabase.table('image_objects').update({
+                "thumbnail_key": thumbnail_key,
+                "thumbnail_url": thumbnail_url,
+                "metadata": {**(indexed.get('metadata') or {}),
+                             **{k: v for k, v in derived.items() if k != 'thumbnail_key'}}
+            }).eq('id', indexed['id']).execute()
+
+    # Merged in the database, so features or a transform written meanwhile are kept
+    merged = supabase.rpc('merge_image_metadata', {"p_patches": [
+        {"id": payload['image_id'], "thumbnail_url": thumbnail_url, "metadata": derived}
+    ]}).execute()
+    if not merged.data:
+        return {"thumbnail": True, "image": "deleted"}
+    return {"thumbnail": True, "thumbnailUrl": thumbnail_url, "variants": sorted(derived.get('variants') or {}),
+            "formats": sorted(derived.get('formats') or {})}
+
+
+@job_queue.handler("storage_cleanup", concurrency=1)
+def remove_deleted_image_files(payload):
+    """
+    Storage objects of deleted images. Keys are content-addressed, so the same
+    image uploaded again after the delete gets the same key back; every key is
+    checked against the owners' images and image_objects rows right before the
+    remove, and keys in use again are kept. Removing keys that are already gone
+    is a no-op, so retries are safe.
+    """
+    paths = payload['paths']
+    referenced = referenced_storage_keys(sorted({path.split('/', 1)[0] for path in paths}))
+    unreferenced = [path for path in paths if path not in referenced]
+    remove_storage_objects(unreferenced)
+    return {"removed": len(unreferenced), "kept": len(paths) - len(unreferenced)}
+
+
+# Orphaned storage objects are collected in passes of STORAGE_GC_INTERVAL seconds (0 = off), each a chain of
+# storage_gc jobs whose payload carries the position, so a pass resumes after a restart (see storage_gc.py)
+STORAGE_GC_INTERVAL = int(os.environ.get("STORAGE_GC_INTERVAL", 0))
+storage_gc = StorageGC(
+    lambda: supabase.storage.from_(STORAGE_BUCKET),
+    referenced_storage_keys,
+    grace=int(os.environ.get("STORAGE_GC_GRACE", 86400)),
+    rate=float(os.environ.get("STORAGE_GC_RATE", 5)),
+    batch=int(os.environ.get("STORAGE_GC_BATCH", 10)),
+    dry_run=os.environ.get("STORAGE_GC_DRY_RUN", "").lower() in ("1", "true", "yes")
+)
+
+
+def schedule_storage_gc(number, cursor="", delay=0):
+    """Queue the slice of GC pass `number` that starts after `cursor` (a no-op if this DB already has it)"""
+    try:
+        job_queue.enqueue("storage_gc", {"pass": number, "cursor": cursor},
+                          idempotency_key=f"storage_gc:{number}:{cursor}", delay=delay)
+    except Exception as e:
+        gallery_log.error("Could not schedule storage GC pass %d: %s", number, e)
+
+
+@job_queue.handler("storage_gc", concurrency=1)
+def collect_orphaned_objects(payload):
+    """One slice of a GC pass; queues the next slice, or the next pass once the bucket is done"""
+    cursor, stats = storage_gc.run_slice(payload['cursor'])
+    if cursor:
+        schedule_storage_gc(payload['pass'], cursor)
+    else:
+        gallery_log.info("Storage GC pass %d finished", payload['pass'])
+        next_pass = payload['pass'] + 1
+        schedule_storage_gc(next_pass, delay=max(0, next_pass * STORAGE_GC_INTERVAL - time.time()))
+    return {**stats, "next": cursor}
+
+
+def _job_timestamp(value):
+    return datetime.fromtimestamp(value, timezone.utc).isoformat() if value else None
+
+
+def job_json(job):
+    """A job as the API returns it"""
+    return {
+        "id": job['id'],
+        "kind": job['kind'],
+        "status": job['status'],
+        "attempts": job['attempts'],
+        "maxAttempts": job['max_attempts'],
+        "result": job['result'],
+        "error": job['error'],
+        "createdAt": _job_timestamp(job['created_at']),
+        "updatedAt": _job_timestamp(job['updated_at'])
+    }
+
+
+def inline_job_results(job_ids):
+    """
+    {"jobResults": {id: job}} for a response that enqueued these jobs, when jobs run
+    inline (serverless). They already ran in this request, and the queue is this
+    instance's /tmp file, so a later poll of /api/jobs/<id> may land on an instance
+    that has never heard of them. Elsewhere {}: clients poll /api/jobs/<id>.
+    """
+    if not job_queue.inline:
+        return {}
+    jobs = (job_queue.get(job_id) for job_id in job_ids if job_id)
+    return {"jobResults": {job['id']: job_json(job) for job in jobs if job}}
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job_status(job_id):
+    """
+    Status of a background job started by one of the user's requests. The queue
+    is a local SQLite file, so this only works where one process serves every
+    request (the Render deployment). On serverless the enqueueing response carries
+    the job's outcome instead (see inline_job_results); polling there only
+    reaches the job when it lands on the same instance.
+    """
+    user = get_user_from_token()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    job = job_queue.get(job_id)
+    if not job or job['owner'] != user.id:
+        return jsonify({"error": "Job not found"}), 404
+    if job_queue.inline and job['status'] == 'queued':
+        job = job_queue.run_due(job_id)  # No workers on serverless: polling is what retries a failed attempt
+
+    return jsonify(job_json(job)), 200
+
+
+# Image workers are forked before any other thread runs (they inherit everything defined above): the log
+# writer is paused across the fork, and keep-warm, job and server threads only start afterwards
+with writer_paused():
+    image_pool.start()
+
+# Start keep-warm thread in production (serverless instances are frozen between
+# invocations, so a background thread there only adds cold-start work)
+if not app.debug and not IS_SERVERLESS:
+    warm_thread = threading.Thread(target=keep_warm, daemon=True)
+    warm_thread.start()
+
+# Job workers start once every handler above is registered; pending jobs from before a restart resume here
+job_queue.start()
+if STORAGE_GC_INTERVAL and not IS_SERVERLESS:
+    schedule_storage_gc(int(time.time() // STORAGE_GC_INTERVAL))
+
+
 # ==================== Error Handlers ====================
 
 @app.errorhandler(404)
@@ -1777,6 +2931,11 @@ def not_found(e):
     return jsonify({"error": "Endpoint not found"}), 404
 
 
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"error": "Upload too large"}), 413
+
+
 @app.errorhandler(500)
 def internal_error(e):
     return jsonify({"error": "Internal server error"}), 500
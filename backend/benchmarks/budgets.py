@@ -0,0 +1,161 @@
+"""
+Supabase round-trip budgets per route, for CI.
+
+Runs every loadtest.py scenario once against the stand-in with
+SUPABASE_TRACE=1, then checks the trace headers against BUDGETS. A route that
+starts making extra sequential calls (an N+1 loop, a lookup that lost its
+cache or its TaskGroup) fails with its span list printed. Exits 1 on any
+failure.
+
+  - round_trips: serial waves of Supabase calls (parallel fan-out counts once)
+  - calls:       total Supabase HTTP calls
+
+Budgets are for a warm process (each scenario is requested once untimed
+first, so per-worker caches hold what they would in production), over the
+loadtest fixtures: a 12-image demo gallery and a second gallery for the
+demo user. Every scenario is measured twice in a row, with GALLERY_GROWTH
+more galleries added to the demo user in between. A route whose counts grow
+between the two makes calls per gallery (an N+1) and fails even while it is
+still under its budget.
+
+Usage:
+    python benchmarks/budgets.py
+    python benchmarks/budgets.py --scenario gallery_get --verbose
+    python benchmarks/budgets.py --record       # print measured counts as a BUDGETS table
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fake_supabase  # noqa: E402
+import loadtest  # noqa: E402
+
+# Galleries added to the demo user between the two measurements of a scenario
+GALLERY_GROWTH = 3
+
+# scenario: (max round trips, max calls). Tighten an entry when a route gets cheaper.
+BUDGETS = {
+    "health": (0, 0),
+    "metrics": (0, 0),
+    "me": (1, 1),
+    "settings_get": (1, 1),
+    "galleries_list": (2, 2),
+    "gallery_get": (3, 3),
+    "gallery_get_revalidate": (2, 2),
+    "public_gallery": (3, 3),
+    "public_slug": (2, 2),
+    "manifest": (0, 0),
+    "render": (0, 0),
+    "export_data": (2, 3),
+    "job_status": (1, 1),
+    "profile_put": (3, 3),
+    "preferences_put": (2, 2),
+    "gallery_update": (3, 3),
+    "branding": (3, 3),
+    "transform": (4, 4),
+    "login": (1, 1),
+    "google_login": (1, 1),
+    "logout": (0, 0),
+    "signup": (4, 4),
+    "change_password": (3, 3),
+    "gallery_create": (4, 4),
+    "gallery_delete": (5, 5),
+    "images_delete": (2, 2),
+    "account_delete": (7, 7),
+    "analyze": (4, 4),
+    "register_image": (5, 5),
+    "upload": (8, 8),
+}
+
+
+def measure(client, ctx, name):
+    """(round trips, calls, trace id) for one request of the scenario, after one warm-up request"""
+    method, prepare = loadtest.SCENARIOS[name]
+    for _ in range(2):
+        path, headers, body = prepare(ctx, 0)
+        status, response_headers, _ = client.request(method, path, headers, body)
+    if "X-Supabase-Round-Trips" not in response_headers:
+        raise RuntimeError("No trace headers in the response; SUPABASE_TRACE is not active in the app")
+    return (int(response_headers["X-Supabase-Round-Trips"]), int(response_headers["X-Supabase-Calls"]),
+            response_headers["X-Trace-Id"], status)
+
+
+def add_galleries(ctx, count):
+    for _ in range(count):
+        ctx.store.add_gallery(fake_supabase.DEMO_USER_ID, 3, image_bytes=ctx.photo)
+
+
+def print_spans(client, trace_id):
+    _, _, body = client.request("GET", f"/api/debug?trace={trace_id}", {}, None)
+    for span in json.loads(body).get("spans", []):
+        print(f"    #{span['round_trip']:<3} {span['mode']:<8} {span['service']:<8} {span['operation']:<20} "
+              f"{span['target'] or '':<20} {span['duration_ms']:>8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check Supabase round trips per route against budgets")
+    parser.add_argument("--scenario", action="append", choices=sorted(loadtest.SCENARIOS),
+                        help="Scenario(s) to check (default: all)")
+    parser.add_argument("--record", action="store_true", help="Print measured counts instead of checking")
+    parser.add_argument("--verbose", action="store_true", help="Print the span list of every request")
+    args = parser.parse_args()
+
+    names = args.scenario or list(loadtest.SCENARIOS)
+    missing = [name for name in names if name not in BUDGETS and not args.record]
+    if missing:
+        parser.error(f"No budget for: {', '.join(missing)} (run with --record and add them to BUDGETS)")
+
+    photo = loadtest.load_photo()
+    server, store, url = fake_supabase.serve()
+    store.seed(12, image_bytes=photo)
+    ctx = loadtest.Context(store, photo)
+
+    workdir = tempfile.mkdtemp(prefix="cursorgallery-budgets-")
+    port = loadtest.free_port()
+    proc = loadtest.start_app(url, port, workdir, {"SUPABASE_TRACE": "1"})
+    client = loadtest.Client(port)
+    failures = 0
+    try:
+        loadtest.prepare_shared(client, ctx)
+        add_galleries(ctx, 1)
+        print("BUDGETS = {" if args.record else f"{'scenario':<24} {'trips':>6} {'calls':>6} {'budget':>8}  status")
+        for name in names:
+            first_round_trips, first_calls, _, _ = measure(client, ctx, name)
+            add_galleries(ctx, GALLERY_GROWTH)
+            round_trips, calls, trace_id, status = measure(client, ctx, name)
+            grew = round_trips > first_round_trips or calls > first_calls
+            if args.record:
+                print(f'    "{name}": ({round_trips}, {calls}),'
+                      + (f"  # grows with galleries (was {first_round_trips}, {first_calls})" if grew else ""))
+                continue
+            max_round_trips, max_calls = BUDGETS[name]
+            over = round_trips > max_round_trips or calls > max_calls
+            failures += over or grew
+            status_text = "OVER BUDGET" if over else "ok"
+            if grew:
+                status_text = (f"GROWS WITH GALLERIES ({first_round_trips}/{first_calls} -> "
+                               f"{round_trips}/{calls} after +{GALLERY_GROWTH})")
+            print(f"{name:<24} {round_trips:>6} {calls:>6} {f'{max_round_trips}/{max_calls}':>8}  "
+                  f"{status_text}{f' (HTTP {status})' if status >= 400 else ''}")
+            if over or grew or args.verbose:
+                print_spans(client, trace_id)
+        if args.record:
+            print("}")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        print(f"\n{failures} route(s) over their Supabase round-trip budget or growing with the fixture")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Cold-start benchmark for the backend entry points.
+
+Each run spawns a fresh interpreter against the local Supabase stand-in
+(fake_supabase.py) and records:
+  - import_ms:        time for `from app import app` (or `api.index`)
+  - health_ms:        first GET /health after import
+  - gallery_ms:       first GET /api/gallery/<id> (public gallery read)
+  - peak_rss_kb:      peak resident set size of the child process
+  - process_ms:       wall time of the whole child, including interpreter startup
+
+Usage:
+    python benchmarks/coldstart.py --runs 10 --output coldstart.json
+    python benchmarks/coldstart.py --compare coldstart.json   # diff against an earlier run
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fake_supabase  # noqa: E402
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULT_MARKER = "COLDSTART_RESULT "
+METRICS = ("import_ms", "health_ms", "gallery_ms", "peak_rss_kb", "process_ms")
+
+# Entry points: name -> (module to import, extra environment)
+ENTRY_POINTS = {
+    "render": ("app", {}),
+    "vercel": ("api.index", {"VERCEL": "1"}),
+}
+
+CHILD_SCRIPT = r"""
+import json, resource, sys, time
+t0 = time.perf_counter()
+module = __import__(sys.argv[1], fromlist=["app"])
+t1 = time.perf_counter()
+client = module.app.test_client()
+r1 = client.get("/health")
+t2 = time.perf_counter()
+r2 = client.get("/api/gallery/" + sys.argv[2])
+t3 = time.perf_counter()
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == "darwin":
+    rss //= 1024  # macOS reports bytes, Linux reports KB
+print("COLDSTART_RESULT " + json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "health_ms": (t2 - t1) * 1000,
+    "gallery_ms": (t3 - t2) * 1000,
+    "health_status": r1.status_code,
+    "gallery_status": r2.status_code,
+    "peak_rss_kb": rss,
+}))
+"""
+
+
+def run_once(module, extra_env, supabase_url):
+    env = dict(os.environ)
+    env.pop("VERCEL", None)
+    env.update({"SUPABASE_URL": supabase_url, "SUPABASE_KEY": fake_supabase.SERVICE_KEY})
+    env.update(extra_env)
+
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT, module, fake_supabase.DEMO_GALLERY_ID],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            result = json.loads(line[len(RESULT_MARKER):])
+            result["process_ms"] = elapsed
+            return result
+    raise RuntimeError(f"Child for {module} produced no result:\n{proc.stderr[-2000:]}")
+
+
+def summarize(samples):
+    summary = {}
+    for metric in METRICS:
+        values = [s[metric] for s in samples]
+        summary[metric] = {
+            "median": round(statistics.median(values), 2),
+            "min": round(min(values), 2),
+            "max": round(max(values), 2),
+        }
+    summary["statuses"] = sorted({(s["health_status"], s["gallery_status"]) for s in samples})
+    return summary
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_table(results, baseline=None):
+    print(f"{'entry':<8} {'metric':<12} {'median':>10} {'min':>10} {'max':>10}" + ("  vs baseline" if baseline else ""))
+    for entry, summary in results["entries"].items():
+        for metric in METRICS:
+            row = summary[metric]
+            line = f"{entry:<8} {metric:<12} {row['median']:>10.1f} {row['min']:>10.1f} {row['max']:>10.1f}"
+            old = (baseline or {}).get("entries", {}).get(entry, {}).get(metric)
+            if old and old["median"]:
+                change = (row["median"] - old["median"]) / old["median"] * 100
+                line += f"  {change:+.1f}% (was {old['median']:.1f})"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark for app.py and api/index.py")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per entry point")
+    parser.add_argument("--entry", choices=sorted(ENTRY_POINTS), action="append",
+                        help="Entry point(s) to measure (default: all)")
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    server, store, url = fake_supabase.serve()
+    store.seed()
+
+    results = {
+        "benchmark": "coldstart",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "runs": args.runs,
+        "entries": {},
+    }
+    try:
+        for entry in args.entry or sorted(ENTRY_POINTS):
+            module, extra_env = ENTRY_POINTS[entry]
+            samples = [run_once(module, extra_env, url) for _ in range(args.runs)]
+            results["entries"][entry] = summarize(samples)
+    finally:
+        server.shutdown()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
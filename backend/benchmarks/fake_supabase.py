@@ -0,0 +1,750 @@
+"""
+Local Supabase stand-in for benchmarks.
+
+Serves the subset of Supabase that app.py uses, so every route can run
+without a live project:
+
+    PostgREST  /rest/v1    select (eq/neq/in/is/gt/gte/lt/lte, order, limit, offset,
+                           embedded children such as "*, images(*)" and parents
+                           such as "*, galleries(status)"), insert, upsert
+                           (merge/ignore duplicates), update, delete, and the
+                           image_objects RPCs
+    Storage    /storage/v1 upload (POST/PUT), download (private and public), remove, list
+    GoTrue     /auth/v1    user, password sign-in, sign-up, logout, admin users
+                           (list, get, update, delete)
+
+Data lives in memory. Unique constraints, ON DELETE CASCADE and the triggers
+the app relies on (image_count, galleries.version, updated_at) are emulated.
+Every response can be delayed by an injected latency per service, so that
+round trips cost roughly what they cost against a hosted project.
+
+Usage:
+    python benchmarks/fake_supabase.py --port 54321 --latency-ms 20 --jitter-ms 10
+    # then: SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_KEY=<printed key>
+"""
+
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+# supabase-py rejects keys that don't look like a JWT, but never verifies them
+SERVICE_KEY = ".".join(
+    base64.urlsafe_b64encode(json.dumps(part).encode()).decode().rstrip("=")
+    for part in ({"alg": "HS256", "typ": "JWT"}, {"role": "service_role", "iss": "fake-supabase"})
+) + ".c2lnbmF0dXJl"
+
+DEMO_USER_ID = "00000000-0000-4000-8000-000000000001"
+DEMO_GALLERY_ID = "00000000-0000-4000-8000-0000000000a1"
+DEMO_TOKEN = "demo-access-token"
+DEMO_EMAIL = "demo@example.com"
+DEMO_PASSWORD = "demo-password"
+BUCKET = "gallery-images"
+
+SERVICES = ("rest", "storage", "auth")
+
+# Column defaults applied on insert (mirrors docs/database_schema.sql and migrations/)
+TABLE_DEFAULTS = {
+    "galleries": lambda: {"description": None, "status": "draft", "image_count": 0, "version": 1,
+                          "config": {"threshold": 100, "animationType": "fade", "mood": "calm"},
+                          "analysis_complete": False},
+    "images": lambda: {"thumbnail_url": None, "metadata": {}, "order_index": 0},
+    "user_settings": lambda: {"profile": {}, "preferences": {}},
+    "image_objects": lambda: {"thumbnail_key": None, "thumbnail_url": None, "metadata": {}, "ref_count": 1},
+}
+UNIQUE_KEYS = {
+    "galleries": [("user_id", "slug")],
+    "user_settings": [("user_id",)],
+    "image_objects": [("user_id", "sha256")],
+}
+TOUCH_UPDATED_AT = ("galleries", "user_settings")
+# parent table -> (child table, foreign key column); deletes cascade and selects can embed children (or the parent)
+CHILDREN = {"galleries": [("images", "gallery_id")]}
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class PostgrestError(Exception):
+    def __init__(self, status, code, message):
+        super().__init__(message)
+        self.status = status
+        self.body = {"code": code, "details": None, "hint": None, "message": message}
+
+
+class AuthError(Exception):
+    def __init__(self, status, error_code, message):
+        super().__init__(message)
+        self.status = status
+        self.body = {"code": status, "error_code": error_code, "msg": message}
+
+
+class FakeSupabase:
+    """In-memory tables, storage objects and auth users behind a tiny HTTP server"""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, service_latency_ms=None):
+        self.lock = threading.Lock()
+        self.tables = {"galleries": [], "images": [], "user_settings": [], "image_objects": []}
+        self.objects = {}  # (bucket, key) -> {"data", "content_type", "created_at", "updated_at"}
+        self.users = {}
+        self.passwords = {}
+        self.tokens = {}
+        self.base_url = None
+        self.latency = {service: latency_ms / 1000.0 for service in SERVICES}
+        self.latency.update({service: ms / 1000.0 for service, ms in (service_latency_ms or {}).items()})
+        self.jitter = jitter_ms / 1000.0
+        self.calls = Counter()  # (service, method) -> requests served
+
+    def delay(self, service):
+        """Sleep for the injected latency of one `service` round trip"""
+        seconds = self.latency.get(service, 0.0) + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    # ---------- Fixtures ----------
+
+    def add_user(self, email, password="password", name="", user_id=None, token=None, provider="email"):
+        """Create an auth user (and their user_settings row); returns (user, access token)"""
+        now = _now()
+        user = {
+            "id": user_id or str(uuid.uuid4()),
+            "aud": "authenticated",
+            "role": "authenticated",
+            "email": email,
+            "app_metadata": {"provider": "email"},
+            "user_metadata": {"full_name": name, "auth_provider": provider},
+            "created_at": now,
+            "updated_at": now,
+        }
+        token = token or f"token-{uuid.uuid4().hex}"
+        with self.lock:
+            self.users[user["id"]] = user
+            self.passwords[user["id"]] = password
+            self.tokens[token] = user["id"]
+        self.insert("user_settings", [{"user_id": user["id"], "profile": {"name": name}}])
+        return user, token
+
+    def add_gallery(self, user_id, image_count=0, status="published", gallery_id=None, slug=None, image_bytes=None):
+        """Create a gallery with `image_count` images whose originals exist in storage"""
+        gallery_id = gallery_id or str(uuid.uuid4())
+        self.insert("galleries", [{
+            "id": gallery_id,
+            "user_id": user_id,
+            "name": "Demo Portfolio",
+            "description": "",
+            "slug": slug or f"portfolio-{gallery_id[:8]}",
+            "status": status,
+            "config": {"threshold": 80, "animationType": "fade", "mood": "calm"},
+        }])
+        for i in range(image_count):
+            self.add_image(user_id, gallery_id, i, image_bytes)
+        return gallery_id
+
+    def add_image(self, user_id, gallery_id, order_index=0, image_bytes=None):
+        key = f"{user_id}/{gallery_id}/{uuid.uuid4()}.jpg"
+        self.put_object(key, image_bytes or b"\xff\xd8\xff\xd9", "image/jpeg")
+        return self.insert("images", [{
+            "gallery_id": gallery_id,
+            "url": self.public_url(key),
+            "metadata": {"width": 1200, "height": 800, "size": len(image_bytes or b""), "format": "JPEG",
+                         "storage_key": key},
+            "order_index": order_index,
+        }])[0]
+
+    def put_object(self, key, data, content_type="application/octet-stream", bucket=BUCKET):
+        now = _now()
+        with self.lock:
+            created = self.objects.get((bucket, key), {}).get("created_at", now)
+            self.objects[(bucket, key)] = {"data": data, "content_type": content_type,
+                                           "created_at": created, "updated_at": now, "id": str(uuid.uuid4())}
+
+    def public_url(self, key, bucket=BUCKET):
+        return f"{self.base_url or ''}/storage/v1/object/public/{bucket}/{key}"
+
+    def seed(self, image_count=12, image_bytes=None):
+        """Create the demo user, a published gallery and `image_count` images"""
+        self.add_user(DEMO_EMAIL, DEMO_PASSWORD, "Demo User", user_id=DEMO_USER_ID, token=DEMO_TOKEN)
+        self.add_gallery(DEMO_USER_ID, image_count, gallery_id=DEMO_GALLERY_ID, slug="demo-portfolio",
+                         image_bytes=image_bytes)
+        return self
+
+    # ---------- PostgREST ----------
+
+    def select(self, table, params):
+        with self.lock:
+            rows = [dict(r) for r in self._filter(table, params)]
+            columns = dict(params).get("select", "*")
+            rows = [self._project(table, row, columns) for row in rows]
+
+        for key, value in params:
+            if key == "order":
+                for clause in reversed(value.split(",")):
+                    column, _, direction = clause.partition(".")
+                    rows.sort(key=lambda r: (r.get(column) is None, r.get(column)),
+                              reverse=direction.startswith("desc"))
+
+        offset = int(dict(params).get("offset") or 0)
+        limit = dict(params).get("limit")
+        rows = rows[offset:]
+        if limit is not None:
+            rows = rows[:int(limit)]
+        return rows
+
+    def insert(self, table, rows, upsert=None, on_conflict=None):
+        """Insert rows; upsert is None, "merge" or "ignore" (PostgREST resolution=...-duplicates)"""
+        written = []
+        with self.lock:
+            for row in rows:
+                conflict_keys = [tuple(on_conflict.split(","))] if on_conflict else UNIQUE_KEYS.get(table, [])
+                existing = self._find_conflict(table, row, conflict_keys + [("id",)])
+                if existing is not None:
+                    if upsert == "ignore":
+                        continue
+                    if upsert != "merge":
+                        raise PostgrestError(409, "23505", f"duplicate key value violates unique constraint on {table}")
+                    existing.update(row)
+                    self._after_update(table, existing, touched=row)
+                    written.append(dict(existing))
+                    continue
+                now = _now()
+                full = {**TABLE_DEFAULTS.get(table, dict)(), "id": str(uuid.uuid4()), "created_at": now, **row}
+                if table in TOUCH_UPDATED_AT:
+                    full.setdefault("updated_at", now)
+                self.tables.setdefault(table, []).append(full)
+                self._after_image_write(table, full)
+                written.append(dict(full))
+        return written
+
+    def update(self, table, params, values):
+        with self.lock:
+            matched = self._filter(table, params)
+            for row in matched:
+                previous_gallery = row.get("gallery_id")
+                row.update(values)
+                self._after_update(table, row, touched=values)
+                if table == "images" and previous_gallery != row.get("gallery_id"):
+                    self._bump_gallery(previous_gallery)
+            return [dict(r) for r in matched]
+
+    def delete(self, table, params):
+        with self.lock:
+            matched = self._filter(table, params)
+            self._delete_rows(table, matched)
+            return [dict(r) for r in matched]
+
+    def rpc(self, name, args):
+        with self.lock:
+            objects = self.tables["image_objects"]
+            if name == "acquire_image_object":
+                rows = [r for r in objects if r["user_id"] == args["p_user_id"] and r["sha256"] == args["p_sha256"]]
+                for row in rows:
+                    row["ref_count"] += 1
+                return [dict(r) for r in rows]
+            if name == "release_image_objects":
+                return self._release_image_objects(args["p_user_id"], args.get("p_hashes") or [])
+            if name == "delete_gallery_images":
+                return self._delete_gallery_images(args)
+            if name == "merge_image_metadata":
+                merged = []
+                for patch in args.get("p_patches") or []:
+                    for row in self.tables["images"]:
+                        if row["id"] == patch["id"]:
+                            row["metadata"] = {**(row.get("metadata") or {}), **(patch.get("metadata") or {})}
+                            if patch.get("thumbnail_url") is not None:
+                                row["thumbnail_url"] = patch["thumbnail_url"]
+                            self._after_update("images", row, touched={"metadata"})
+                            merged.append(row["id"])
+                return merged
+        raise PostgrestError(404, "PGRST202", f"Could not find the function public.{name}")
+
+    def _release_image_objects(self, user_id, hashes):
+        # Caller holds the lock
+        objects = self.tables["image_objects"]
+        released = []
+        for sha256 in hashes:
+            for row in list(objects):
+                if row["user_id"] == user_id and row["sha256"] == sha256:
+                    row["ref_count"] -= 1
+                    if row["ref_count"] <= 0:
+                        objects.remove(row)
+                        released.append({key: row[key] for key in ("sha256", "storage_key", "thumbnail_key")})
+        return released
+
+    def _delete_gallery_images(self, args):
+        # Caller holds the lock; mirrors migrations/add_delete_gallery_images.sql
+        gallery = next((g for g in self.tables["galleries"]
+                        if g["id"] == args["p_gallery_id"] and g["user_id"] == args["p_user_id"]), None)
+        if gallery is None:
+            return []
+        ids = set(args.get("p_image_ids") or [])
+        gone = [r for r in self.tables["images"] if r.get("gallery_id") == gallery["id"] and r["id"] in ids]
+        self._delete_rows("images", gone)
+        hashes = [(r.get("metadata") or {}).get("sha256") for r in gone]
+        released = self._release_image_objects(args["p_user_id"], [h for h in hashes if h])
+        remaining = sorted((r for r in self.tables["images"] if r.get("gallery_id") == gallery["id"]),
+                           key=lambda r: (r.get("order_index") or 0, r["created_at"], r["id"]))
+        if args.get("p_compact"):
+            for position, row in enumerate(remaining):
+                if row.get("order_index") != position:
+                    row["order_index"] = position
+                    self._after_image_write("images", row)
+        gallery["image_count"] = len(remaining)
+        self._after_update("galleries", gallery, touched={"image_count"})
+        return [{"deleted": [{k: r.get(k) for k in ("id", "url", "thumbnail_url", "metadata")} for r in gone],
+                 "released": released, "image_count": len(remaining), "version": gallery["version"]}]
+
+    def _filter(self, table, params):
+        # Caller holds the lock; returns the live row dicts
+        rows = self.tables.get(table)
+        if rows is None:
+            raise PostgrestError(404, "42P01", f'relation "public.{table}" does not exist')
+        for key, value in params:
+            if key in ("select", "order", "limit", "offset", "on_conflict", "columns"):
+                continue
+            rows = [r for r in rows if _matches(r.get(key), value)]
+        return list(rows)
+
+    def _project(self, table, row, columns):
+        columns = "".join(columns.split())
+        if columns == "*":
+            return row
+        result = {}
+        for item in _split_columns(columns):
+            if "(" in item:
+                child, _, inner = item.partition("(")
+                child = child.split("!")[0]
+                inner = inner[:-1]
+                for child_table, foreign_key in CHILDREN.get(table, []):
+                    if child_table == child:
+                        result[child] = [self._project(child, dict(r), inner)
+                                         for r in self.tables[child] if r.get(foreign_key) == row["id"]]
+                for child_table, foreign_key in CHILDREN.get(child, []):
+                    if child_table == table:  # Many-to-one: the parent row, or None
+                        parent = next((r for r in self.tables[child] if r["id"] == row.get(foreign_key)), None)
+                        result[child] = self._project(child, dict(parent), inner) if parent else None
+            elif item == "*":
+                result.update(row)
+            else:
+                alias, _, column = item.rpartition(":")
+                result[alias or column] = row.get(column)
+        return result
+
+    def _find_conflict(self, table, row, keys):
+        for columns in keys:
+            if all(column in row for column in columns):
+                for existing in self.tables.get(table, []):
+                    if all(existing.get(c) == row[c] for c in columns):
+                        return existing
+        return None
+
+    def _delete_rows(self, table, rows):
+        for child_table, foreign_key in CHILDREN.get(table, []):
+            ids = {r["id"] for r in rows}
+            self._delete_rows(child_table, [c for c in self.tables[child_table] if c.get(foreign_key) in ids])
+        for row in rows:
+            self.tables[table].remove(row)
+            self._after_image_write(table, row)
+
+    def _after_update(self, table, row, touched):
+        if table in TOUCH_UPDATED_AT and "updated_at" not in touched:
+            row["updated_at"] = _now()
+        if table == "galleries" and "version" not in touched:
+            row["version"] = row.get("version", 1) + 1
+        self._after_image_write(table, row)
+
+    def _after_image_write(self, table, row):
+        # update_gallery_image_count / bump_gallery_version_for_image triggers
+        if table == "images":
+            gallery_id = row.get("gallery_id")
+            for gallery in self.tables["galleries"]:
+                if gallery["id"] == gallery_id:
+                    gallery["image_count"] = sum(1 for i in self.tables["images"] if i.get("gallery_id") == gallery_id)
+            self._bump_gallery(gallery_id)
+
+    def _bump_gallery(self, gallery_id):
+        for gallery in self.tables["galleries"]:
+            if gallery["id"] == gallery_id:
+                gallery["version"] = gallery.get("version", 1) + 1
+                gallery["updated_at"] = _now()
+
+    # ---------- Storage ----------
+
+    def download(self, bucket, key):
+        with self.lock:
+            return self.objects.get((bucket, key))
+
+    def remove(self, bucket, keys):
+        removed = []
+        with self.lock:
+            for key in keys:
+                entry = self.objects.pop((bucket, key), None)
+                if entry is not None:
+                    removed.append(_object_info(bucket, key, entry))
+        return removed
+
+    def list(self, bucket, prefix="", limit=100, offset=0, search=""):
+        """Immediate children of a folder, like storage's list: folders have id None"""
+        prefix = prefix.strip("/")
+        base = f"{prefix}/" if prefix else ""
+        entries = {}
+        with self.lock:
+            for (object_bucket, key), entry in self.objects.items():
+                if object_bucket != bucket or not key.startswith(base):
+                    continue
+                name, slash, _ = key[len(base):].partition("/")
+                if search and search not in name:
+                    continue
+                if slash:
+                    entries.setdefault(name, {"name": name, "id": None, "updated_at": None, "created_at": None,
+                                              "last_accessed_at": None, "metadata": None})
+                else:
+                    info = _object_info(bucket, key, entry)
+                    info["name"] = name
+                    entries[name] = info
+        return [entries[name] for name in sorted(entries)][offset:offset + limit]
+
+    # ---------- GoTrue ----------
+
+    def user_for_token(self, token):
+        with self.lock:
+            user_id = self.tokens.get(token)
+            return dict(self.users[user_id]) if user_id in self.users else None
+
+    def sign_in(self, email, password):
+        with self.lock:
+            user = next((u for u in self.users.values() if u["email"] == email), None)
+            if user is None or self.passwords.get(user["id"]) != password:
+                raise AuthError(400, "invalid_credentials", "Invalid login credentials")
+        return self._session(user)
+
+    def sign_up(self, email, password, metadata):
+        with self.lock:
+            if any(u["email"] == email for u in self.users.values()):
+                raise AuthError(422, "user_already_exists", "User already registered")
+        user, _ = self.add_user(email, password, (metadata or {}).get("full_name", ""),
+                                provider=(metadata or {}).get("auth_provider", "email"))
+        with self.lock:
+            self.users[user["id"]]["user_metadata"].update(metadata or {})
+            user = dict(self.users[user["id"]])
+        return self._session(user)
+
+    def update_user(self, user_id, attributes):
+        with self.lock:
+            user = self.users.get(user_id)
+            if user is None:
+                raise AuthError(404, "user_not_found", "User not found")
+            if "password" in attributes:
+                self.passwords[user_id] = attributes["password"]
+            if "email" in attributes:
+                user["email"] = attributes["email"]
+            if "user_metadata" in attributes:
+                user["user_metadata"] = {**user["user_metadata"], **attributes["user_metadata"]}
+            user["updated_at"] = _now()
+            return dict(user)
+
+    def delete_user(self, user_id):
+        with self.lock:
+            if self.users.pop(user_id, None) is None:
+                raise AuthError(404, "user_not_found", "User not found")
+            self.passwords.pop(user_id, None)
+            for token in [t for t, owner in self.tokens.items() if owner == user_id]:
+                del self.tokens[token]
+            # auth.users ON DELETE CASCADE
+            for table in ("galleries", "user_settings", "image_objects"):
+                self._delete_rows(table, [r for r in self.tables[table] if r.get("user_id") == user_id])
+
+    def _session(self, user):
+        token = f"token-{uuid.uuid4().hex}"
+        with self.lock:
+            self.tokens[token] = user["id"]
+        return {"access_token": token, "token_type": "bearer", "expires_in": 3600,
+                "expires_at": int(time.time()) + 3600, "refresh_token": uuid.uuid4().hex, "user": user}
+
+
+def _as_text(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return "" if value is None else str(value)
+
+
+def _matches(actual, expression):
+    """PostgREST filter operators used by postgrest-py (eq, neq, in, is, gt, gte, lt, lte)"""
+    op, _, operand = expression.partition(".")
+    negate = op == "not"
+    if negate:
+        op, _, operand = operand.partition(".")
+    if op == "eq":
+        result = _as_text(actual) == operand
+    elif op == "neq":
+        result = _as_text(actual) != operand
+    elif op == "in":
+        values = [v.strip().strip('"') for v in operand.strip("()").split(",")] if operand.strip("()") else []
+        result = _as_text(actual) in values
+    elif op == "is":
+        result = {"null": actual is None, "true": actual is True, "false": actual is False}.get(operand, False)
+    elif op in ("gt", "gte", "lt", "lte"):
+        try:
+            left, right = float(actual), float(operand)
+        except (TypeError, ValueError):
+            left, right = _as_text(actual), operand
+        result = {"gt": left > right, "gte": left >= right, "lt": left < right, "lte": left <= right}[op]
+    else:
+        raise PostgrestError(400, "PGRST100", f"Operator {op} not implemented in fake_supabase")
+    return not result if negate else result
+
+
+def _split_columns(columns):
+    """Split a select list on top-level commas: "*,images(id,url)" -> ["*", "images(id,url)"]"""
+    items, depth, current = [], 0, ""
+    for char in columns:
+        if char == "," and depth == 0:
+            items.append(current)
+            current = ""
+            continue
+        depth += char == "("
+        depth -= char == ")"
+        current += char
+    if current:
+        items.append(current)
+    return items
+
+
+def _object_info(bucket, key, entry):
+    return {
+        "name": key, "bucket_id": bucket, "id": entry["id"],
+        "created_at": entry["created_at"], "updated_at": entry["updated_at"], "last_accessed_at": entry["updated_at"],
+        "metadata": {"size": len(entry["data"]), "mimetype": entry["content_type"]},
+    }
+
+
+def _parse_multipart(body, content_type):
+    """(data, content type) of the first file part of a multipart/form-data body"""
+    boundary = content_type.split("boundary=", 1)[1].strip('"').encode()
+    for part in body.split(b"--" + boundary):
+        head, sep, data = part.partition(b"\r\n\r\n")
+        if not sep or b"filename=" not in head:
+            continue
+        part_type = "application/octet-stream"
+        for line in head.split(b"\r\n"):
+            if line.lower().startswith(b"content-type:"):
+                part_type = line.split(b":", 1)[1].strip().decode()
+        return data[:-2] if data.endswith(b"\r\n") else data, part_type
+    return body, content_type
+
+
+def _make_handler(store):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; without this, Nagle plus delayed
+        # ACKs add ~40ms to every keep-alive request
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass  # Keep benchmark output clean
+
+        def _send(self, status, body=None, raw=None, content_type="application/json"):
+            payload = raw if raw is not None else json.dumps(body if body is not None else {}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _read_raw(self):
+            # Always drain the body: clients send "{}" even on GET and reuse the connection
+            if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                chunks = []
+                while True:
+                    size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                    if size == 0:
+                        self.rfile.readline()
+                        return b"".join(chunks)
+                    chunks.append(self.rfile.read(size))
+                    self.rfile.readline()
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length) if length else b""
+
+        def _read_json(self, raw):
+            return json.loads(raw) if raw.strip() else None
+
+        def _dispatch(self, method):
+            raw = self._read_raw()
+            parts = urlsplit(self.path)
+            path = unquote(parts.path).rstrip("/")
+            params = parse_qsl(parts.query, keep_blank_values=True)
+            service = path.split("/")[1] if path.count("/") > 1 else ""
+            service = {"rest": "rest", "storage": "storage", "auth": "auth"}.get(service)
+            store.calls[(service or "other", method)] += 1
+            if service:
+                store.delay(service)
+            try:
+                if service == "rest":
+                    return self._rest(method, path[len("/rest/v1/"):], params, raw)
+                if service == "storage":
+                    return self._storage(method, path[len("/storage/v1/"):], params, raw)
+                if service == "auth":
+                    return self._auth(method, path[len("/auth/v1/"):], params, raw)
+            except PostgrestError as e:
+                return self._send(e.status, e.body)
+            except AuthError as e:
+                return self._send(e.status, e.body)
+            return self._send(404, {"message": f"Not implemented in fake_supabase: {method} {path}"})
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+        def do_PATCH(self):
+            self._dispatch("PATCH")
+
+        def do_PUT(self):
+            self._dispatch("PUT")
+
+        def do_DELETE(self):
+            self._dispatch("DELETE")
+
+        def do_HEAD(self):
+            self._dispatch("HEAD")
+
+        # ---- PostgREST ----
+
+        def _rest(self, method, table, params, raw):
+            prefer = self.headers.get("Prefer", "")
+            minimal = "return=minimal" in prefer
+            if table.startswith("rpc/"):
+                return self._send(200, store.rpc(table[len("rpc/"):], self._read_json(raw) or {}))
+            if method == "GET":
+                return self._send(200, store.select(table, params))
+            if method == "POST":
+                body = self._read_json(raw)
+                rows = body if isinstance(body, list) else [body]
+                upsert = ("merge" if "resolution=merge-duplicates" in prefer
+                          else "ignore" if "resolution=ignore-duplicates" in prefer else None)
+                written = store.insert(table, rows, upsert, dict(params).get("on_conflict"))
+                return self._send(201, [] if minimal else written)
+            if method == "PATCH":
+                return self._send(200, store.update(table, params, self._read_json(raw) or {}))
+            if method == "DELETE":
+                return self._send(200, store.delete(table, params))
+            return self._send(405, {"message": f"{method} not supported"})
+
+        # ---- Storage ----
+
+        def _storage(self, method, path, params, raw):
+            if path.startswith("object/list/") and method == "POST":
+                body = self._read_json(raw) or {}
+                return self._send(200, store.list(path[len("object/list/"):], body.get("prefix", ""),
+                                                  int(body.get("limit", 100)), int(body.get("offset", 0)),
+                                                  body.get("search", "")))
+            for prefix in ("object/public/", "object/authenticated/", "object/"):
+                if path.startswith(prefix):
+                    bucket, _, key = path[len(prefix):].partition("/")
+                    break
+            else:
+                return self._send(404, {"statusCode": "404", "error": "not_found", "message": "Not found"})
+
+            if method == "DELETE" and not key:
+                return self._send(200, store.remove(bucket, (self._read_json(raw) or {}).get("prefixes", [])))
+            if method in ("GET", "HEAD"):
+                entry = store.download(bucket, key)
+                if entry is None:
+                    return self._send(400, {"statusCode": "404", "error": "not_found", "message": "Object not found"})
+                return self._send(200, raw=entry["data"] if method == "GET" else b"", content_type=entry["content_type"])
+            if method in ("POST", "PUT"):
+                content_type = self.headers.get("Content-Type", "application/octet-stream")
+                data, content_type = (_parse_multipart(raw, content_type) if content_type.startswith("multipart/")
+                                      else (raw, content_type))
+                exists = store.download(bucket, key) is not None
+                if method == "POST" and exists and self.headers.get("x-upsert") != "true":
+                    return self._send(400, {"statusCode": "409", "error": "Duplicate",
+                                            "message": "The resource already exists"})
+                store.put_object(key, data, content_type, bucket)
+                return self._send(200, {"Key": f"{bucket}/{key}", "Id": str(uuid.uuid4())})
+            return self._send(405, {"statusCode": "405", "error": "method_not_allowed", "message": method})
+
+        # ---- GoTrue ----
+
+        def _auth(self, method, path, params, raw):
+            body = self._read_json(raw) or {}
+            if path == "user" and method == "GET":
+                token = self.headers.get("Authorization", "").replace("Bearer ", "")
+                user = store.user_for_token(token)
+                if not user:
+                    return self._send(401, {"code": 401, "error_code": "bad_jwt", "msg": "invalid JWT: token is invalid"})
+                return self._send(200, user)
+            if path == "token" and method == "POST":
+                return self._send(200, store.sign_in(body.get("email"), body.get("password")))
+            if path == "signup" and method == "POST":
+                return self._send(200, store.sign_up(body.get("email"), body.get("password"), body.get("data")))
+            if path == "logout" and method == "POST":
+                return self._send(204, raw=b"")
+            if path == "admin/users" and method == "GET":
+                query = dict(params)
+                page, per_page = int(query.get("page") or 1), int(query.get("per_page") or 50)
+                with store.lock:
+                    users = list(store.users.values())
+                return self._send(200, {"aud": "authenticated",
+                                        "users": users[(page - 1) * per_page:page * per_page]})
+            if path.startswith("admin/users/"):
+                user_id = path.rsplit("/", 1)[-1]
+                if method == "GET":
+                    with store.lock:
+                        user = store.users.get(user_id)
+                    if not user:
+                        raise AuthError(404, "user_not_found", "User not found")
+                    return self._send(200, user)
+                if method == "PUT":
+                    return self._send(200, store.update_user(user_id, body))
+                if method == "DELETE":
+                    store.delete_user(user_id)
+                    return self._send(200, {})
+            return self._send(404, {"code": 404, "msg": f"Not implemented in fake_supabase: {method} {path}"})
+
+    return Handler
+
+
+def serve(store=None, host="127.0.0.1", port=0):
+    """Start the stand-in on a background thread. Returns (server, store, base_url)."""
+    store = store or FakeSupabase()
+    server = ThreadingHTTPServer((host, port), _make_handler(store))
+    server.daemon_threads = True
+    store.base_url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, store, store.base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Supabase stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--images", type=int, default=12, help="Images in the seeded gallery")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Injected delay per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Extra random delay, uniform in [0, jitter]")
+    args = parser.parse_args()
+
+    store = FakeSupabase(args.latency_ms, args.jitter_ms)
+    server, store, url = serve(store, args.host, args.port)
+    store.seed(args.images)
+    print(f"Fake Supabase listening on {url}")
+    print(f"SUPABASE_URL={url}")
+    print(f"SUPABASE_KEY={SERVICE_KEY}")
+    print(f"Demo bearer token: {DEMO_TOKEN}  gallery: {DEMO_GALLERY_ID}")
+    print(f"Demo login: {DEMO_EMAIL} / {DEMO_PASSWORD}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Output-format benchmark for image derivatives.
+
+Resizes every image in the bundled corpus (frontend/public/images) to each
+derivative size (the 400px thumbnail and the VARIANT_SIZES) and encodes it as
+JPEG, WebP and AVIF (when this Pillow build can write it) with the app's
+ENCODE_QUALITY settings. For each format and size it reports:
+  - bytes:       total encoded size over the corpus
+  - saved_pct:   size reduction against JPEG at the same dimensions
+  - encode_ms:   median encode time per image
+  - time_ratio:  encode time relative to JPEG
+
+Usage:
+    python benchmarks/formats.py --output formats.json
+    python benchmarks/formats.py --quality webp=75 --quality avif=50 --compare formats.json
+"""
+
+import argparse
+import glob
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fake_supabase  # noqa: E402
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "frontend", "public", "images")
+FORMATS = ("jpeg", "webp", "avif")
+
+
+def load_app():
+    """Import app.py for its encoders; nothing here talks to Supabase, so the stand-in need not run"""
+    os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+    os.environ.setdefault("SUPABASE_KEY", fake_supabase.SERVICE_KEY)
+    os.environ.setdefault("JOB_DB_PATH", os.path.join(tempfile.gettempdir(), "cursorgallery-bench-jobs.sqlite3"))
+    sys.path.insert(0, BACKEND_DIR)
+    import app
+    return app
+
+
+def load_corpus(app, paths, sizes):
+    """{size: [resized images]} for every corpus file, decoded once each"""
+    Image = app.get_pil_image()
+    resized = {size: [] for size in sizes}
+    for path in paths:
+        with open(path, "rb") as f:
+            img = Image.open(io.BytesIO(f.read()))
+        img.draft("RGB", (max(sizes), max(sizes)))
+        img = app.normalize_mode(img)
+        for size in sorted(sizes, reverse=True):
+            img = app.shrink(img, (size, size))
+            resized[size].append(img)
+    return resized
+
+
+def measure(app, images, fmt, quality, repeat):
+    """(total bytes, median ms per image) for encoding `images` as `fmt`"""
+    total, timings = 0, []
+    for img in images:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = app.encode_image(img, fmt, quality)
+            elapsed = (time.perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        total += len(data)
+        timings.append(best)
+    return total, statistics.median(timings)
+
+
+def run(app, paths, quality, repeat):
+    sizes = (app.THUMBNAIL_SIZE[0],) + tuple(app.VARIANT_SIZES)
+    corpus = load_corpus(app, paths, sizes)
+    results = {}
+    for fmt in FORMATS:
+        if not app.can_encode(fmt):
+            print(f"Skipping {fmt}: this Pillow build can't encode it")
+            continue
+        results[fmt] = {}
+        for size in sizes:
+            total, median_ms = measure(app, corpus[size], fmt, quality.get(fmt), repeat)
+            results[fmt][str(size)] = {"bytes": total, "encode_ms": round(median_ms, 2)}
+
+    for fmt, by_size in results.items():
+        for size, row in by_size.items():
+            jpeg = results["jpeg"][size]
+            row["saved_pct"] = round((1 - row["bytes"] / jpeg["bytes"]) * 100, 1)
+            row["time_ratio"] = round(row["encode_ms"] / jpeg["encode_ms"], 2) if jpeg["encode_ms"] else None
+    return results
+
+
+def print_table(results, baseline=None):
+    print(f"{'format':<6} {'size':>5} {'bytes':>11} {'saved':>7} {'encode_ms':>10} {'x jpeg':>7}"
+          + ("  vs baseline" if baseline else ""))
+    for fmt, by_size in results["formats"].items():
+        for size, row in by_size.items():
+            line = (f"{fmt:<6} {size:>5} {row['bytes']:>11,} {row['saved_pct']:>6.1f}% "
+                    f"{row['encode_ms']:>10.2f} {row['time_ratio']:>7.2f}")
+            old = (baseline or {}).get("formats", {}).get(fmt, {}).get(size)
+            if old:
+                line += (f"  bytes {(row['bytes'] - old['bytes']) / old['bytes'] * 100:+.1f}%"
+                         f", ms {row['encode_ms'] - old['encode_ms']:+.2f}")
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes saved vs encode time for JPEG/WebP/AVIF derivatives")
+    parser.add_argument("--corpus", default=CORPUS_DIR, help="Directory of sample images")
+    parser.add_argument("--limit", type=int, help="Only use the first N images")
+    parser.add_argument("--repeat", type=int, default=3, help="Encodes per image (the fastest is kept)")
+    parser.add_argument("--quality", action="append", default=[], metavar="FORMAT=Q",
+                        help="Override a format's quality (default: the app's ENCODE_QUALITY)")
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    app = load_app()
+    quality = dict(app.ENCODE_QUALITY)
+    for override in args.quality:
+        fmt, _, value = override.partition("=")
+        quality[fmt.strip().lower()] = int(value)
+
+    paths = sorted(p for p in glob.glob(os.path.join(args.corpus, "*"))
+                   if p.lower().endswith((".jpg", ".jpeg", ".png", ".webp")))[:args.limit]
+    if not paths:
+        parser.error(f"No images found in {args.corpus}")
+
+    results = {
+        "benchmark": "formats",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "images": len(paths),
+        "quality": {fmt: quality[fmt] for fmt in FORMATS if fmt in quality},
+        "formats": run(app, paths, quality, args.repeat),
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Import-time profile for the backend entry points.
+
+Runs `python -X importtime` in a fresh interpreter against `app` (Render) or
+`api.index` (Vercel) and prints the slowest imports, so cold-start regressions
+show up as a diff in this report.
+
+Usage:
+    python benchmarks/importtime.py                 # Render entry point
+    python benchmarks/importtime.py --serverless    # Simulate Vercel (VERCEL=1)
+    python benchmarks/importtime.py --module api.index --top 30 --json out.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_importtime(module, serverless=False):
+    """Import `module` in a fresh interpreter and return the parsed -X importtime rows"""
+    env = dict(os.environ)
+    # The app refuses to import without credentials; the profile never talks to Supabase
+    env.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+    env.setdefault("SUPABASE_KEY", "importtime-profile-key")
+    if serverless:
+        env["VERCEL"] = "1"
+    else:
+        env.pop("VERCEL", None)
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        # One separator space, then two spaces of indentation per nesting level
+        name = parts[2][1:].rstrip()
+        rows.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_us": int(parts[0]),
+            "cumulative_us": int(parts[1]),
+        })
+    return rows
+
+
+def summarize(rows, top):
+    """Top-level packages by cumulative time plus the heaviest individual modules"""
+    total_us = sum(r["self_us"] for r in rows)
+    top_level = [r for r in rows if r["depth"] == 0]
+    return {
+        "total_ms": round(total_us / 1000, 1),
+        "module_count": len(rows),
+        "top_cumulative": sorted(top_level, key=lambda r: r["cumulative_us"], reverse=True)[:top],
+        "top_self": sorted(rows, key=lambda r: r["self_us"], reverse=True)[:top],
+    }
+
+
+def print_report(module, summary):
+    print(f"Import profile for '{module}': {summary['total_ms']} ms across {summary['module_count']} modules")
+    print()
+    print(f"{'cumulative ms':>14}  top-level import")
+    for r in summary["top_cumulative"]:
+        print(f"{r['cumulative_us'] / 1000:>14.1f}  {r['module']}")
+    print()
+    print(f"{'self ms':>14}  module")
+    for r in summary["top_self"]:
+        print(f"{r['self_us'] / 1000:>14.1f}  {r['module']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time breakdown for the backend")
+    parser.add_argument("--module", default="app", help="Module to import (app or api.index)")
+    parser.add_argument("--serverless", action="store_true", help="Set VERCEL=1 like the Vercel runtime")
+    parser.add_argument("--top", type=int, default=20, help="Number of rows per table")
+    parser.add_argument("--json", dest="json_path", help="Also write the summary to this JSON file")
+    args = parser.parse_args()
+
+    summary = summarize(run_importtime(args.module, args.serverless), args.top)
+    summary.update({"module": args.module, "serverless": args.serverless})
+    print_report(args.module, summary)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"\nWrote {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,504 @@
+"""
+Endpoint load test against the local Supabase stand-in.
+
+Starts fake_supabase.py in this process (with optional injected latency) and
+the backend as it runs in production (`python app.py`) in a child process,
+then drives each route scenario with a fixed number of concurrent keep-alive
+clients. For every scenario it reports:
+  - rps:            completed requests per second
+  - p50/p95/p99_ms: request latency percentiles
+  - errors:         transport failures and responses with status >= 400
+  - sb_calls:       Supabase round trips per request, counted by the stand-in
+
+Fixtures a request needs for itself (a fresh account to delete, a gallery to
+upload into, ...) are created directly in the stand-in before timing starts.
+Scenarios run one after another; the ones that queue background image work
+run last so their jobs don't slow the read scenarios down.
+
+Usage:
+    python benchmarks/loadtest.py --concurrency 8 --requests 200 --latency-ms 20 --output load.json
+    python benchmarks/loadtest.py --scenario gallery_get --scenario manifest --compare load.json
+    python benchmarks/loadtest.py --list
+"""
+
+import argparse
+import glob
+import hashlib
+import http.client
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fake_supabase  # noqa: E402
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "frontend", "public", "images")
+GOOGLE_AUTH_SALT = "loadtest-google-salt"
+
+SCENARIOS = {}
+
+
+def scenario(name, method="GET"):
+    """Register `prepare(ctx, i) -> (path, headers, body)` as a named scenario"""
+    def register(prepare):
+        SCENARIOS[name] = (method, prepare)
+        return prepare
+    return register
+
+
+def _auth(token, **headers):
+    return {"Authorization": f"Bearer {token}", **headers}
+
+
+def _json(body):
+    return json.dumps(body).encode()
+
+
+def _fresh_user(ctx, name="Load User"):
+    return ctx.store.add_user(f"load-{uuid.uuid4().hex[:12]}@example.com", "password", name)
+
+
+# ---- read scenarios on the shared demo fixtures ----
+
+@scenario("health")
+def _health(ctx, i):
+    return "/health", {}, None
+
+
+@scenario("metrics")
+def _metrics(ctx, i):
+    return "/metrics", {}, None
+
+
+@scenario("me")
+def _me(ctx, i):
+    return "/api/auth/me", _auth(ctx.token), None
+
+
+@scenario("settings_get")
+def _settings_get(ctx, i):
+    return "/api/user/settings", _auth(ctx.token), None
+
+
+@scenario("galleries_list")
+def _galleries_list(ctx, i):
+    return "/api/galleries", _auth(ctx.token), None
+
+
+@scenario("gallery_get")
+def _gallery_get(ctx, i):
+    return f"/api/galleries/{ctx.gallery_id}", _auth(ctx.token), None
+
+
+@scenario("gallery_get_revalidate")
+def _gallery_get_revalidate(ctx, i):
+    return f"/api/galleries/{ctx.gallery_id}", _auth(ctx.token, **{"If-None-Match": ctx.gallery_etag}), None
+
+
+@scenario("public_gallery")
+def _public_gallery(ctx, i):
+    return f"/api/gallery/{ctx.gallery_id}", {}, None
+
+
+@scenario("public_slug")
+def _public_slug(ctx, i):
+    return "/api/public/demo/demo-portfolio", {}, None
+
+
+@scenario("manifest")
+def _manifest(ctx, i):
+    return f"/api/gallery/{ctx.gallery_id}/manifest", {}, None
+
+
+@scenario("render")
+def _render(ctx, i):
+    # Eight widths per image: the first round renders, later ones hit the disk cache
+    image_id = ctx.image_ids[i % len(ctx.image_ids)]
+    return f"/api/images/{image_id}/render?w={200 + (i // len(ctx.image_ids)) % 8 * 50}", {"Accept": "image/webp"}, None
+
+
+@scenario("export_data")
+def _export_data(ctx, i):
+    return "/api/user/export-data", _auth(ctx.token), None
+
+
+@scenario("job_status")
+def _job_status(ctx, i):
+    return f"/api/jobs/{ctx.job_id}", _auth(ctx.job_token), None
+
+
+# ---- writes on the shared demo fixtures ----
+
+@scenario("profile_put", "PUT")
+def _profile_put(ctx, i):
+    return "/api/user/profile", _auth(ctx.token), _json({"name": "Demo User", "bio": f"bio {i % 4}"})
+
+
+@scenario("preferences_put", "PUT")
+def _preferences_put(ctx, i):
+    return "/api/user/preferences", _auth(ctx.token), _json({"defaultThreshold": 60 + i % 4 * 10})
+
+
+@scenario("gallery_update", "PATCH")
+def _gallery_update(ctx, i):
+    return f"/api/galleries/{ctx.gallery_id}", _auth(ctx.token), _json({"description": f"Edit {i % 4}"})
+
+
+@scenario("branding", "PATCH")
+def _branding(ctx, i):
+    return f"/api/galleries/{ctx.gallery_id}/branding", _auth(ctx.token), _json({"customName": f"Studio {i % 4}"})
+
+
+@scenario("transform", "PATCH")
+def _transform(ctx, i):
+    image_id = ctx.image_ids[i % len(ctx.image_ids)]
+    return f"/api/images/{image_id}/transform", _auth(ctx.token), _json({"scale": 1.0 + i % 4 / 10, "rotation": 0})
+
+
+@scenario("login", "POST")
+def _login(ctx, i):
+    return "/api/auth/login", {}, _json({"email": fake_supabase.DEMO_EMAIL, "password": fake_supabase.DEMO_PASSWORD})
+
+
+@scenario("google_login", "POST")
+def _google_login(ctx, i):
+    return "/api/auth/google", {}, _json({"idToken": "fake-id-token", "email": ctx.google_email, "name": "Google User"})
+
+
+@scenario("logout", "POST")
+def _logout(ctx, i):
+    return "/api/auth/logout", _auth(ctx.token), None
+
+
+# ---- per-request fixtures ----
+
+@scenario("signup", "POST")
+def _signup(ctx, i):
+    email = f"signup-{uuid.uuid4().hex[:12]}@example.com"
+    return "/api/auth/signup", {}, _json({"email": email, "password": "password", "name": "New User"})
+
+
+@scenario("change_password", "POST")
+def _change_password(ctx, i):
+    _, token = _fresh_user(ctx)
+    return "/api/user/change-password", _auth(token), _json({"currentPassword": "password", "newPassword": "password2"})
+
+
+@scenario("gallery_create", "POST")
+def _gallery_create(ctx, i):
+    _, token = _fresh_user(ctx)
+    return "/api/galleries", _auth(token), _json({"name": f"Portfolio {i}", "description": ""})
+
+
+@scenario("gallery_delete", "DELETE")
+def _gallery_delete(ctx, i):
+    user, token = _fresh_user(ctx)
+    gallery_id = ctx.store.add_gallery(user["id"], 3, image_bytes=ctx.photo)
+    return f"/api/galleries/{gallery_id}", _auth(token), None
+
+
+@scenario("images_delete", "DELETE")
+def _images_delete(ctx, i):
+    user, token = _fresh_user(ctx)
+    gallery_id = ctx.store.add_gallery(user["id"])
+    images = [ctx.store.add_image(user["id"], gallery_id, n, ctx.photo) for n in range(6)]
+    return (f"/api/galleries/{gallery_id}/images", _auth(token),
+            _json({"imageIds": [image["id"] for image in images[::2]], "compact": True}))
+
+
+@scenario("account_delete", "DELETE")
+def _account_delete(ctx, i):
+    user, token = _fresh_user(ctx)
+    ctx.store.add_gallery(user["id"], 3, image_bytes=ctx.photo)
+    return "/api/user/account", _auth(token), None
+
+
+# ---- background image work (run last) ----
+
+@scenario("analyze", "POST")
+def _analyze(ctx, i):
+    return f"/api/galleries/{ctx.gallery_id}/analyze", _auth(ctx.token), None
+
+
+@scenario("register_image", "POST")
+def _register_image(ctx, i):
+    user, token = _fresh_user(ctx)
+    gallery_id = ctx.store.add_gallery(user["id"], status="draft")
+    key = f"{user['id']}/{gallery_id}/{uuid.uuid4()}.jpg"
+    ctx.store.put_object(key, ctx.photo, "image/jpeg")
+    return f"/api/galleries/{gallery_id}/register-image", _auth(token), _json({
+        "url": ctx.store.public_url(key), "storageKey": key, "fileName": "photo.jpg",
+        "size": len(ctx.photo), "width": 1200, "height": 1600})
+
+
+@scenario("upload", "POST")
+def _upload(ctx, i):
+    user, token = _fresh_user(ctx)
+    gallery_id = ctx.store.add_gallery(user["id"], status="draft")
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"images\"; filename=\"photo.jpg\"\r\n"
+            f"Content-Type: image/jpeg\r\n\r\n").encode() + ctx.photo + f"\r\n--{boundary}--\r\n".encode()
+    headers = _auth(token, **{"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    return f"/api/galleries/{gallery_id}/upload", headers, body
+
+
+class Context:
+    """Shared fixtures the scenarios build requests from"""
+
+    def __init__(self, store, photo):
+        self.store = store
+        self.photo = photo
+        self.token = fake_supabase.DEMO_TOKEN
+        self.gallery_id = fake_supabase.DEMO_GALLERY_ID
+        self.image_ids = [image["id"] for image in store.tables["images"] if image["gallery_id"] == self.gallery_id]
+        self.gallery_etag = None
+        self.job_id = None
+        self.job_token = None
+        self.google_email = "google-user@example.com"
+        password = hashlib.sha256(f"{self.google_email}{GOOGLE_AUTH_SALT}".encode()).hexdigest()[:32]
+        store.add_user(self.google_email, password, "Google User", provider="google")
+
+
+class Client:
+    """One keep-alive connection per worker thread"""
+
+    def __init__(self, port):
+        self.port = port
+        self.local = threading.local()
+
+    def request(self, method, path, headers, body):
+        for attempt in range(2):
+            conn = getattr(self.local, "conn", None)
+            if conn is None:
+                conn = self.local.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=120)
+            try:
+                conn.request(method, path, body=body, headers={
+                    **({"Content-Type": "application/json"} if body and "Content-Type" not in headers else {}),
+                    **headers})
+                response = conn.getresponse()
+                data = response.read()
+                if response.getheader("Connection", "").lower() == "close":
+                    conn.close()
+                    self.local.conn = None
+                return response.status, response.headers, data
+            except (http.client.HTTPException, ConnectionError, socket.timeout):
+                conn.close()
+                self.local.conn = None
+                if attempt:
+                    raise
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def prepare_shared(client, ctx):
+    """Shared fixtures that come from the app itself: a current ETag and a job id"""
+    _, headers, _ = client.request("GET", f"/api/galleries/{ctx.gallery_id}", _auth(ctx.token), None)
+    ctx.gallery_etag = headers.get("ETag")
+    path, headers, payload = _register_image(ctx, 0)
+    _, _, body = client.request("POST", path, headers, payload)
+    ctx.job_id, ctx.job_token = json.loads(body).get("jobId"), headers["Authorization"].split(" ", 1)[1]
+
+
+def run_scenario(client, ctx, name, requests, concurrency):
+    method, prepare = SCENARIOS[name]
+    prepared = [prepare(ctx, i) for i in range(requests)]
+    queue = iter(prepared)
+    queue_lock = threading.Lock()
+    latencies, statuses, failures = [], {}, []
+    results_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with queue_lock:
+                item = next(queue, None)
+            if item is None:
+                return
+            path, headers, body = item
+            start = time.perf_counter()
+            try:
+                status, _, _ = client.request(method, path, headers, body)
+            except Exception as e:
+                status = None
+                failures.append(f"{type(e).__name__}: {e}")
+            elapsed = (time.perf_counter() - start) * 1000
+            with results_lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if status is None or status >= 400)
+    return {
+        "requests": requests,
+        "rps": round(requests / wall, 1) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(statistics.fmean(latencies), 2) if latencies else 0.0,
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=lambda s: str(s[0]))},
+        "sample_failures": failures[:3],
+    }
+
+
+def start_app(supabase_url, port, workdir, extra_env=None):
+    env = dict(os.environ)
+    env.pop("VERCEL", None)
+    env.update({
+        "SUPABASE_URL": supabase_url,
+        "SUPABASE_KEY": fake_supabase.SERVICE_KEY,
+        "PORT": str(port),
+        "GOOGLE_AUTH_SALT": GOOGLE_AUTH_SALT,
+        "JOB_DB_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "RENDER_CACHE_DIR": os.path.join(workdir, "render-cache"),
+        "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING"),
+        **(extra_env or {}),
+    })
+    proc = subprocess.Popen([sys.executable, "app.py"], cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"app.py exited during startup:\n{proc.stderr.read()[-2000:]}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("app.py did not answer /health within 60s")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def load_photo(limit_bytes=3 * 1024 * 1024):
+    """A real phone photo from the bundled corpus, so image routes do realistic work"""
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, "*.jpg"))):
+        if os.path.getsize(path) <= limit_bytes:
+            with open(path, "rb") as f:
+                return f.read()
+    raise RuntimeError(f"No JPEG under {limit_bytes} bytes in {CORPUS_DIR}")
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_table(results, baseline=None):
+    print(f"{'scenario':<24} {'rps':>8} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'errors':>7} {'sb_calls':>9}"
+          + ("  vs baseline (p50, rps)" if baseline else ""))
+    for name, row in results["scenarios"].items():
+        line = (f"{name:<24} {row['rps']:>8.1f} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} "
+                f"{row['p99_ms']:>9.1f} {row['errors']:>7} {row['supabase_calls_per_request']:>9.2f}")
+        old = (baseline or {}).get("scenarios", {}).get(name)
+        if old and old["p50_ms"] and old["rps"]:
+            line += (f"  {(row['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100:+.1f}%"
+                     f", {(row['rps'] - old['rps']) / old['rps'] * 100:+.1f}%")
+        print(line)
+        if row["errors"]:
+            print(f"{'':<24} statuses {row['statuses']} {row['sample_failures']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive every backend route at fixed concurrency")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario(s) to run (default: all, in registration order)")
+    parser.add_argument("--list", action="store_true", help="List scenarios and exit")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Injected Supabase latency per call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Extra random Supabase latency")
+    parser.add_argument("--images", type=int, default=12, help="Images in the demo gallery")
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, (method, _) in SCENARIOS.items():
+            print(f"{method:<7} {name}")
+        return
+
+    photo = load_photo()
+    store = fake_supabase.FakeSupabase(args.latency_ms, args.jitter_ms)
+    server, store, url = fake_supabase.serve(store)
+    store.seed(args.images, image_bytes=photo)
+    ctx = Context(store, photo)
+
+    workdir = tempfile.mkdtemp(prefix="cursorgallery-load-")
+    port = free_port()
+    proc = start_app(url, port, workdir)
+    client = Client(port)
+    results = {
+        "benchmark": "loadtest",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "scenarios": {},
+    }
+    try:
+        prepare_shared(client, ctx)
+
+        for name in args.scenario or list(SCENARIOS):
+            calls_before = sum(store.calls.values())
+            row = run_scenario(client, ctx, name, args.requests, args.concurrency)
+            row["supabase_calls_per_request"] = round((sum(store.calls.values()) - calls_before) / args.requests, 2)
+            results["scenarios"][name] = row
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
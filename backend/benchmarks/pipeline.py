@@ -0,0 +1,285 @@
+"""
+Image-pipeline microbenchmark over the bundled corpus (frontend/public/images).
+
+Runs the app's image entry points, plus a matrix of thumbnail pipelines,
+over every corpus photo. Each case runs in a fresh interpreter, so peak
+memory is the case's own. For each case it reports:
+  - median_ms / p95_ms: per-image latency (fastest of --repeat runs per image)
+  - images_per_s:       throughput of one pass over the corpus with --workers threads
+  - peak_rss_mb:        growth of peak RSS over the child's baseline (corpus already in memory)
+  - bytes:              total output bytes (encoded images; 0 for ingest)
+
+Cases:
+  ingest               upload path: IngestSpool in 64KB chunks (hash, spool, header probe)
+  create_thumbnail     app.create_thumbnail() as shipped
+  create_derivatives   app.create_derivatives() (variants, thumbnail, formats, placeholder)
+  placeholder          imaging.compute_placeholder() on the image shrunk to THUMBNAIL_SIZE and
+                       flattened, which is how create_derivatives() calls it
+  thumb/<filter>/<draft>/<format>
+                       open -> draft mode -> Image.thumbnail(THUMBNAIL_SIZE, filter) -> encode
+                       draft modes: none (full decode), gap2 / gap3 (Pillow's draft+reduce
+                       with that reducing_gap), exact (libjpeg draft straight to the target box)
+
+Usage:
+    python benchmarks/pipeline.py --output pipeline.json
+    python benchmarks/pipeline.py --case create_thumbnail --filter lanczos --draft gap2 --compare pipeline.json
+    python benchmarks/pipeline.py --workers 4 --limit 10
+"""
+
+import argparse
+import glob
+import io
+import itertools
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fake_supabase  # noqa: E402
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "frontend", "public", "images")
+RESULT_MARKER = "PIPELINE_RESULT "
+
+APP_CASES = ("ingest", "create_thumbnail", "create_derivatives", "placeholder")
+FILTERS = ("lanczos", "bicubic", "bilinear", "box")
+DRAFT_MODES = ("none", "gap2", "gap3", "exact")
+FORMATS = ("jpeg", "webp", "avif")
+INGEST_CHUNK = 64 * 1024
+
+
+def load_app():
+    """Import app.py for its image functions; nothing here talks to Supabase, so the stand-in need not run"""
+    os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+    os.environ.setdefault("SUPABASE_KEY", fake_supabase.SERVICE_KEY)
+    os.environ.setdefault("JOB_DB_PATH", os.path.join(tempfile.gettempdir(), "cursorgallery-bench-jobs.sqlite3"))
+    sys.path.insert(0, BACKEND_DIR)
+    import app
+    return app
+
+
+def output_size(result):
+    """Bytes produced by one call: encoded bytes, or everything inside a derivatives dict"""
+    if result is None:
+        return 0
+    if isinstance(result, (bytes, bytearray)):
+        return len(result)
+    if isinstance(result, dict):
+        return sum(output_size(value) for value in result.values())
+    if isinstance(result, str):
+        return len(result)
+    return 0
+
+
+def make_case(app, case):
+    """Callable(bytes) -> output for a case name"""
+    if case == "ingest":
+        from ingest import IngestSpool
+
+        def ingest(data):
+            spool = IngestSpool(app.MAX_FILE_SIZE)
+            view = memoryview(data)
+            for offset in range(0, len(data), INGEST_CHUNK):
+                spool.write(view[offset:offset + INGEST_CHUNK])
+            probe, _ = spool.probe, spool.sha256
+            spool.close()
+            if probe is None:
+                raise ValueError("Header probe found no image")
+            return b""  # Nothing is encoded on this path
+        return ingest
+    if case == "placeholder":
+        from imaging import compute_placeholder
+        Image = app.get_pil_image()
+
+        def placeholder(data):
+            img = Image.open(io.BytesIO(data))
+            img.draft('RGB', app.THUMBNAIL_SIZE)
+            return compute_placeholder(app.flatten_alpha(app.shrink(img, app.THUMBNAIL_SIZE)))
+        return placeholder
+    if case in ("create_thumbnail", "create_derivatives"):
+        fn = getattr(app, case)
+
+        def run(data):
+            result = fn(data)
+            if result is None:
+                raise ValueError(f"{case} returned None")
+            return result
+        return run
+
+    _, filter_name, draft, fmt = case.split("/")
+    Image = app.get_pil_image()
+    resample = getattr(Image.Resampling, filter_name.upper())
+    size = app.THUMBNAIL_SIZE
+    reducing_gap = {"gap2": 2.0, "gap3": 3.0}.get(draft)
+
+    def thumbnail(data):
+        img = Image.open(io.BytesIO(data))
+        if draft == "exact":
+            img.draft("RGB", size)
+        img.thumbnail(size, resample, reducing_gap=reducing_gap)
+        return app.encode_image(img, fmt)
+    return thumbnail
+
+
+def peak_rss_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss  # macOS reports bytes, Linux reports KB
+
+
+def run_child(spec):
+    """Measure one case in this (fresh) process and print the result line"""
+    app = load_app()
+    corpus = []
+    for path in spec["paths"]:
+        with open(path, "rb") as f:
+            corpus.append(f.read())
+    fn = make_case(app, spec["case"])
+    if spec["case"].endswith("/avif") and not app.can_encode("avif"):
+        print(RESULT_MARKER + json.dumps({"skipped": "this Pillow build can't encode avif"}))
+        return
+
+    fn(corpus[0])  # Warm-up: lazy imports, codec init
+    baseline_rss = peak_rss_kb()
+
+    timings, total_bytes, errors = [], 0, 0
+    for data in corpus:
+        best = None
+        for _ in range(spec["repeat"]):
+            start = time.perf_counter()
+            try:
+                result = fn(data)
+            except Exception:
+                errors += 1
+                result = None
+            elapsed = (time.perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        timings.append(best)
+        total_bytes += output_size(result)
+
+    def attempt(data):
+        try:
+            fn(data)
+        except Exception:
+            pass  # Already counted in the latency pass
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=spec["workers"]) as pool:
+        list(pool.map(attempt, corpus))
+    wall = time.perf_counter() - start
+
+    timings.sort()
+    print(RESULT_MARKER + json.dumps({
+        "images": len(corpus),
+        "median_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        "images_per_s": round(len(corpus) / wall, 2),
+        "peak_rss_mb": round((peak_rss_kb() - baseline_rss) / 1024, 1),
+        "bytes": total_bytes,
+        "errors": errors,
+    }))
+
+
+def run_case(case, paths, repeat, workers):
+    spec = json.dumps({"case": case, "paths": paths, "repeat": repeat, "workers": workers})
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", spec],
+                          cwd=BACKEND_DIR, capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise RuntimeError(f"Child for {case} produced no result:\n{proc.stderr[-2000:]}")
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_table(results, baseline=None):
+    print(f"{'case':<30} {'median_ms':>10} {'p95_ms':>9} {'img/s':>8} {'peak_mb':>8} {'bytes':>12}"
+          + ("  vs baseline (median, peak, bytes)" if baseline else ""))
+    for case, row in results["cases"].items():
+        if "skipped" in row:
+            print(f"{case:<30} skipped: {row['skipped']}")
+            continue
+        line = (f"{case:<30} {row['median_ms']:>10.2f} {row['p95_ms']:>9.2f} {row['images_per_s']:>8.1f} "
+                f"{row['peak_rss_mb']:>8.1f} {row['bytes']:>12,}")
+        old = (baseline or {}).get("cases", {}).get(case)
+        if old and "skipped" not in old and old["median_ms"]:
+            line += (f"  {(row['median_ms'] - old['median_ms']) / old['median_ms'] * 100:+.1f}%"
+                     f", {row['peak_rss_mb'] - old['peak_rss_mb']:+.1f}MB"
+                     f", {(row['bytes'] - old['bytes']) / old['bytes'] * 100 if old['bytes'] else 0:+.1f}%")
+        if row["errors"]:
+            line += f"  ({row['errors']} errors)"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency, throughput, memory and bytes of the image pipeline")
+    parser.add_argument("--corpus", default=CORPUS_DIR, help="Directory of sample images")
+    parser.add_argument("--limit", type=int, help="Only use the first N images")
+    parser.add_argument("--case", action="append", choices=APP_CASES,
+                        help="App entry point(s) to run (default: all)")
+    parser.add_argument("--filter", action="append", choices=FILTERS, help="Resampling filter(s) for thumb/ cases")
+    parser.add_argument("--draft", action="append", choices=DRAFT_MODES, help="Draft mode(s) for thumb/ cases")
+    parser.add_argument("--format", action="append", choices=FORMATS, help="Output format(s) for thumb/ cases")
+    parser.add_argument("--no-matrix", action="store_true", help="Only run the app entry points")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per image for latency (the fastest is kept)")
+    parser.add_argument("--workers", type=int, default=1, help="Threads for the throughput pass")
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(json.loads(args.child))
+        return
+
+    paths = sorted(p for p in glob.glob(os.path.join(args.corpus, "*"))
+                   if p.lower().endswith((".jpg", ".jpeg", ".png", ".webp")))[:args.limit]
+    if not paths:
+        parser.error(f"No images found in {args.corpus}")
+
+    cases = list(args.case or APP_CASES)
+    if not args.no_matrix:
+        cases += [f"thumb/{f}/{d}/{fmt}" for f, d, fmt in itertools.product(
+            args.filter or FILTERS, args.draft or DRAFT_MODES, args.format or FORMATS[:2])]
+
+    results = {
+        "benchmark": "pipeline",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "images": len(paths),
+        "corpus_bytes": sum(os.path.getsize(p) for p in paths),
+        "repeat": args.repeat,
+        "workers": args.workers,
+        "cases": {},
+    }
+    for case in cases:
+        results["cases"][case] = run_case(case, paths, args.repeat, args.workers)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Structured fan-out of independent blocking calls (mostly Supabase round trips).
+
+    with TaskGroup(timeout=5) as tasks:
+        settings = tasks.spawn(load_settings, user_id)
+        profile = tasks.spawn(load_profile, user_id)
+    settings.result()   # value, or raises the call's exception / DeadlineExceeded
+
+All tasks share one deadline. Leaving the `with` block waits for every task
+(up to the deadline), so no call outlives the route that started it unnoticed.
+Tasks run with a copy of the caller's contextvars, so Flask's request context
+(`g`, `request`) and the per-request Supabase metrics work inside them.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from metrics import Counter, Histogram
+
+FANOUT_TASKS = Counter("fanout_tasks_total", "Tasks run through TaskGroup by outcome", ("outcome",))
+FANOUT_GROUP_DURATION = Histogram("fanout_group_duration_seconds", "Wall time of a TaskGroup (slowest task)")
+
+DEFAULT_TIMEOUT = float(os.environ.get("FANOUT_TIMEOUT", 10))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class DeadlineExceeded(TimeoutError):
+    """The task did not finish before the group's shared deadline"""
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=int(os.environ.get("FANOUT_WORKERS", 16)),
+                                               thread_name_prefix="fanout")
+    return _executor
+
+
+class Task:
+    """Handle for one spawned call"""
+
+    def __init__(self, future):
+        self._future = future
+        self._timed_out = False
+
+    def result(self):
+        if self._timed_out:
+            raise DeadlineExceeded("Task did not finish before the deadline")
+        return self._future.result(timeout=0)
+
+    def result_or(self, default):
+        """The call's value, or `default` if it failed or timed out"""
+        try:
+            return self.result()
+        except Exception:
+            return default
+
+
+class TaskGroup:
+    """Run independent calls in parallel under one shared deadline"""
+
+    def __init__(self, timeout=None):
+        self.timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+        self._tasks = []
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.monotonic()
+        return self
+
+    def spawn(self, fn, *args, **kwargs):
+        context = contextvars.copy_context()
+        task = Task(_get_executor().submit(context.run, fn, *args, **kwargs))
+        self._tasks.append(task)
+        return task
+
+    def __exit__(self, exc_type, exc, tb):
+        remaining = max(0.0, self._started + self.timeout - time.monotonic())
+        done, pending = wait([t._future for t in self._tasks], timeout=remaining)
+        for task in self._tasks:
+            if task._future in pending:
+                task._future.cancel()  # Only stops calls that never started; running ones are abandoned
+                task._timed_out = True
+                FANOUT_TASKS.inc(outcome="timeout")
+            elif task._future.exception() is not None:
+                FANOUT_TASKS.inc(outcome="error")
+            else:
+                FANOUT_TASKS.inc(outcome="ok")
+        FANOUT_GROUP_DURATION.observe(time.monotonic() - self._started)
+        return False
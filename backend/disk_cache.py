@@ -0,0 +1,118 @@
+"""
+Size-bounded on-disk cache with LRU eviction, for rendered image variants.
+
+Entries are immutable blobs keyed by a string (the caller bakes everything
+that affects the bytes into the key). Reads are memory-mapped, so a hot entry
+is served straight from the page cache without copying it into the Python
+heap, and the response can stream it to the socket.
+
+Each worker process keeps its own LRU index over the shared directory. An
+entry evicted by another process simply reads as a miss here.
+"""
+
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from metrics import Counter, Gauge
+
+DISK_CACHE_LOOKUPS = Counter("disk_cache_lookups_total", "Disk cache lookups", ("cache", "result"))
+DISK_CACHE_BYTES = Gauge("disk_cache_bytes", "Bytes currently held by a disk cache (this process's view)", ("cache",))
+DISK_CACHE_EVICTIONS = Counter("disk_cache_evictions_total", "Entries evicted to stay under the size limit", ("cache",))
+
+
+class DiskLRUCache:
+    """Directory of blobs kept under `max_bytes`, least recently used evicted first"""
+
+    def __init__(self, name, directory, max_bytes):
+        self.name = name
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # filename -> size, least recently used first
+        self._total = 0
+        self._loaded = False
+
+    def _load(self):
+        """Index what earlier processes left behind, oldest first"""
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    found.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, filename, size in sorted(found):
+            self._entries[filename] = size
+            self._total += size
+        self._loaded = True
+        self._evict()
+
+    def _filename(self, key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def get(self, key):
+        """A read-only mmap of the entry, or None. The caller closes it."""
+        filename = self._filename(key)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            known = filename in self._entries
+            if known:
+                self._entries.move_to_end(filename)
+        if known:
+            try:
+                with open(self._path(filename), "rb") as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                DISK_CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+                return mapped
+            except (FileNotFoundError, ValueError):
+                # Removed by another process (or an empty file, which mmap refuses)
+                self._forget(filename)
+        DISK_CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+        return None
+
+    def set(self, key, data):
+        """Store `data` atomically (write to a temp file, then rename into place)"""
+        filename = self._filename(key)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(filename))
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            self._total += len(data) - self._entries.pop(filename, 0)
+            self._entries[filename] = len(data)
+            self._evict()
+
+    def _forget(self, filename):
+        with self._lock:
+            self._total -= self._entries.pop(filename, 0)
+            DISK_CACHE_BYTES.set(self._total, cache=self.name)
+
+    def _evict(self):
+        # Caller holds the lock
+        while self._total > self.max_bytes and self._entries:
+            filename, size = self._entries.popitem(last=False)
+            self._total -= size
+            DISK_CACHE_EVICTIONS.inc(cache=self.name)
+            try:
+                os.unlink(self._path(filename))
+            except FileNotFoundError:
+                pass
+        DISK_CACHE_BYTES.set(self._total, cache=self.name)
@@ -0,0 +1,321 @@
+"""
+Bounded process pool for CPU-bound image work (decode, resize, encode).
+
+Pillow releases the GIL for parts of decoding and resampling, but not for
+everything around them, so large batches on the threaded server stretch every
+other request's latency. The pool moves that work into separate processes:
+
+    derivatives = image_pool.run(create_derivatives, original_bytes)
+
+`run()` blocks the calling thread (job worker or request) until the result is
+back, so callers keep their synchronous shape. Inputs of SHARED_MEMORY_MIN_BYTES
+or more travel through a shared memory segment that the worker reads in place,
+instead of being pickled through the pool's pipe. The function then receives a
+read-only file object rather than bytes; Pillow opens either. Results (encoded
+derivatives, a few hundred KB) come back pickled.
+
+Workers are forked from the app once, by `start()` at the end of app.py's
+import. They inherit the imported app copy-on-write instead of importing it
+again, which would start another job queue in every worker. app.py forks
+before the keep-warm thread, the job workers and the server start, with the
+log writer thread paused (log_config.writer_paused), so no other thread can be
+holding a lock the workers inherit. Workers write their logs to stdout
+directly rather than into their copy of the parent's log queue. They exit on
+their own when the app process goes away.
+
+A worker that dies (OOM kill) breaks the pool: every task in flight on it fails,
+and the pool is forked anew for the next one. That re-fork happens in a threaded
+process. So no caller waits forever on a wedged worker, `run()` gives up after
+IMAGE_POOL_TIMEOUT and retires the pool: new tasks go to a freshly forked one,
+while the old pool's other tasks run to completion on its healthy workers.
+Only then (or after another IMAGE_POOL_TIMEOUT) are the old workers terminated,
+the wedged one included. ProcessPoolExecutor fails everything in flight as soon
+as any of its workers dies, so the wedged worker can't be killed on its own.
+
+Without fork (Windows), on serverless platforms (no /dev/shm, one request per
+instance), or with IMAGE_POOL_WORKERS=0, `run()` calls the function inline.
+
+Environment:
+    IMAGE_POOL_WORKERS       Worker processes (default: CPU count, at most 4)
+    IMAGE_POOL_MAX_PENDING   Tasks submitted or running at once; more wait (default 2 per worker)
+    IMAGE_POOL_WAIT          Seconds a caller waits for a slot before ImagePoolBusy (default 30)
+    IMAGE_POOL_TIMEOUT       Seconds a task may take in a worker before ImagePoolTimeout (default 120)
+"""
+
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
+
+from log_config import log_directly
+from metrics import Counter, Gauge, Histogram
+
+IMAGE_POOL_TASKS = Counter("image_pool_tasks_total",
+                           "Image pool tasks by function and outcome (inline = no pool, timeout = pool retired)",
+                           ("task", "outcome"))
+IMAGE_POOL_QUEUE_WAIT = Histogram("image_pool_queue_wait_seconds",
+                                  "Time from submit until a worker process started the task", ("task",))
+IMAGE_POOL_RUN = Histogram("image_pool_run_seconds", "Time the task ran in the worker process", ("task",))
+IMAGE_POOL_IN_FLIGHT = Gauge("image_pool_tasks_in_flight", "Image pool tasks submitted and not yet finished")
+IMAGE_POOL_QUEUE_DEPTH = Gauge("image_pool_queue_depth", "Image pool tasks waiting for a free worker process")
+IMAGE_POOL_SHARED_BYTES = Counter("image_pool_shared_memory_bytes_total",
+                                  "Input bytes handed to workers through shared memory")
+
+log = logging.getLogger("cursorgallery.image_pool")
+
+SHARED_MEMORY_MIN_BYTES = 64 * 1024  # Smaller inputs are cheaper to pickle than to map
+
+_in_worker = False  # Set in pool processes, which inherit the app's pool object but must not use it
+
+
+class ImagePoolBusy(RuntimeError):
+    """No pool slot freed up within IMAGE_POOL_WAIT"""
+
+
+class ImagePoolTimeout(ImagePoolBusy):
+    """A task ran past IMAGE_POOL_TIMEOUT; its pool was retired"""
+
+
+class SharedBuffer(io.RawIOBase):
+    """Read-only, seekable file over a memoryview, so Pillow decodes straight from shared memory"""
+
+    def __init__(self, view):
+        super().__init__()
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = max(0, min(len(buffer), len(self._view) - self._pos))
+        buffer[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else min(len(self._view), self._pos + size)
+        data = bytes(self._view[self._pos:end])
+        self._pos = max(self._pos, end)
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+def _run_task(fn, payload, args):
+    """Worker side: open the input, run fn, report when it started and finished"""
+    started = time.time()
+    shm = view = source = None
+    try:
+        if payload[0] == "shm":
+            from multiprocessing import shared_memory
+            shm = shared_memory.SharedMemory(name=payload[1])
+            view = shm.buf[:payload[2]]
+            source = SharedBuffer(view)
+            result = fn(source, *args)
+        else:
+            result = fn(payload[1], *args)
+        return result, started, time.time()
+    finally:
+        if shm is not None:
+            source.close()
+            del source
+            try:
+                view.release()
+                shm.close()
+            except BufferError:
+                pass  # Something still references the buffer; the mapping goes when that does
+
+
+def _init_worker(parent_pid):
+    global _in_worker
+    _in_worker = True
+    log_directly()
+
+    # A SIGTERM'd app skips the pool's shutdown; don't outlive it as an orphan
+    def watch_parent():
+        while os.getppid() == parent_pid:
+            time.sleep(1)
+        os._exit(0)
+
+    threading.Thread(target=watch_parent, name="image-pool-watchdog", daemon=True).start()
+
+
+def _noop():
+    return os.getpid()
+
+
+class ImagePool:
+    """Process pool with a bounded number of pending tasks and per-task timing"""
+
+    def __init__(self, workers=None, max_pending=None, wait=None, timeout=None, enabled=True):
+        self.workers = workers if workers is not None else min(os.cpu_count() or 1, 4)
+        self.max_pending = max_pending or self.workers * 2
+        self.wait = wait if wait is not None else 30.0
+        self.timeout = timeout if timeout is not None else 120.0
+        self.enabled = (enabled and self.workers > 0
+                        and "fork" in multiprocessing.get_all_start_methods())
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._futures = {}  # executor -> its futures whose run() hasn't returned
+        self._in_flight = 0
+
+    def start(self):
+        """Fork the workers now; call it while no other thread is running"""
+        if not self.enabled:
+            return
+        from multiprocessing import resource_tracker
+        # One tracker for the app and every worker, so segments they attach to are only unlinked by us
+        resource_tracker.ensure_running()
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._create()
+        log.info("Image pool started with %d worker processes", self.workers)
+
+    def _create(self):
+        executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("fork"),
+                                       initializer=_init_worker, initargs=(os.getpid(),))
+        # With fork, every worker is launched on the first submit; do that here rather than mid-request
+        executor.submit(_noop).result()
+        return executor
+
+    def _submit(self, *args):
+        """Submit to the current pool, (re)forking it if needed; returns (executor, future)"""
+        with self._lock:
+            if self._executor is None:
+                log.warning("Image pool (re)started after startup; forking from a threaded process")
+                self._executor = self._create()
+            executor = self._executor
+            future = executor.submit(*args)
+            self._futures.setdefault(executor, set()).add(future)
+            return executor, future
+
+    def _done(self, executor, future):
+        with self._lock:
+            futures = self._futures.get(executor)
+            if futures is not None:
+                futures.discard(future)
+                if not futures and executor is not self._executor:
+                    del self._futures[executor]
+
+    def _discard(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _retire(self, executor, stuck):
+        """Stop using a pool with a wedged worker; terminate its workers once its other tasks finish"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+
+        def drain():
+            deadline = time.monotonic() + self.timeout
+            while True:
+                with self._lock:
+                    others = [f for f in self._futures.get(executor, ()) if f is not stuck]
+                remaining = deadline - time.monotonic()
+                if not others or remaining <= 0:
+                    break
+                wait_futures(others, timeout=remaining)
+            # A wedged worker never returns, so shutdown() alone would leave it running
+            for process in list((executor._processes or {}).values()):
+                process.terminate()
+            executor.shutdown(wait=False, cancel_futures=True)
+            with self._lock:
+                self._futures.pop(executor, None)
+            log.info("Retired image pool drained%s", f"; {len(others)} tasks cut off" if others else "")
+
+        threading.Thread(target=drain, name="image-pool-retire", daemon=True).start()
+
+    def _track(self, delta):
+        with self._lock:
+            self._in_flight += delta
+            IMAGE_POOL_IN_FLIGHT.set(self._in_flight)
+            IMAGE_POOL_QUEUE_DEPTH.set(max(0, self._in_flight - self.workers))
+
+    def run(self, fn, data, *args):
+        """fn(data, *args) in a worker process (inline if the pool is disabled); raises what fn raises"""
+        task = fn.__name__
+        if not self.enabled or _in_worker:
+            started = time.perf_counter()
+            try:
+                result = fn(data, *args)
+            except Exception:
+                IMAGE_POOL_TASKS.inc(task=task, outcome="error")
+                raise
+            IMAGE_POOL_RUN.observe(time.perf_counter() - started, task=task)
+            IMAGE_POOL_TASKS.inc(task=task, outcome="inline")
+            return result
+
+        if not self._slots.acquire(timeout=self.wait):
+            IMAGE_POOL_TASKS.inc(task=task, outcome="busy")
+            raise ImagePoolBusy(f"No image worker free within {self.wait:g}s")
+        shm = None
+        self._track(1)
+        try:
+            payload = ("bytes", data)
+            if isinstance(data, (bytes, bytearray, memoryview)) and len(data) >= SHARED_MEMORY_MIN_BYTES:
+                shm = self._share(data)
+                if shm is not None:
+                    payload = ("shm", shm.name, len(data))
+            submitted = time.time()
+            executor, future = self._submit(_run_task, fn, payload, args)
+            try:
+                result, started, finished = future.result(self.timeout)
+            except TimeoutError:
+                IMAGE_POOL_TASKS.inc(task=task, outcome="timeout")
+                log.error("Image worker took over %gs running %s; retiring the pool", self.timeout, task)
+                self._retire(executor, future)
+                raise ImagePoolTimeout(f"{task} did not finish within {self.timeout:g}s")
+            except BrokenProcessPool:
+                IMAGE_POOL_TASKS.inc(task=task, outcome="crashed")
+                log.error("Image worker process died running %s; restarting the pool", task)
+                self._discard(executor)
+                raise
+            except Exception:
+                IMAGE_POOL_TASKS.inc(task=task, outcome="error")
+                raise
+            finally:
+                self._done(executor, future)
+            IMAGE_POOL_QUEUE_WAIT.observe(max(0.0, started - submitted), task=task)
+            IMAGE_POOL_RUN.observe(finished - started, task=task)
+            IMAGE_POOL_TASKS.inc(task=task, outcome="ok")
+            return result
+        finally:
+            self._track(-1)
+            self._slots.release()
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+    def _share(self, data):
+        """Copy `data` into a new shared memory segment, or None if /dev/shm is unavailable or full"""
+        from multiprocessing import shared_memory
+        try:
+            shm = shared_memory.SharedMemory(create=True, size=len(data))
+        except OSError as e:
+            log.warning("Shared memory unavailable, pickling image input instead: %s", e)
+            return None
+        shm.buf[:len(data)] = data
+        IMAGE_POOL_SHARED_BYTES.inc(len(data))
+        return shm
+
+    def stats(self):
+        return {"enabled": self.enabled, "workers": self.workers, "max_pending": self.max_pending,
+                "timeout": self.timeout, "in_flight": self._in_flight}
@@ -0,0 +1,147 @@
+"""
+Pixel-level helpers that work on already-opened Pillow images.
+
+Pillow is imported by get_pil_image() on first use, with MAX_IMAGE_PIXELS
+applied; every module that decodes goes through it. NumPy is imported on
+first use too, so that importing this module stays free for requests that
+never touch pixels.
+"""
+
+import base64
+import io
+import logging
+import os
+
+PLACEHOLDER_SAMPLE_SIZE = 32    # Longest side of the sample placeholders (and the LQIP) are made from
+LQIP_QUALITY = 40
+BLURHASH_COMPONENTS = (4, 3)    # (x, y); 4x3 suits the mostly landscape/portrait photos galleries get
+
+# Decoded pixels, not file bytes, are what cost memory: a 10MB PNG can be a decompression bomb
+MAX_IMAGE_PIXELS = int(float(os.environ.get("MAX_IMAGE_MEGAPIXELS", 100)) * 1_000_000)
+
+_BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+log = logging.getLogger("cursorgallery.imaging")
+
+_pil_image = None
+_pil_checked = False
+
+
+def get_pil_image():
+    """Import Pillow's Image module on first use. Returns None if Pillow is unavailable."""
+    global _pil_image, _pil_checked
+    if not _pil_checked:
+        try:
+            from PIL import Image  # Optional: may fail on serverless without native libs
+            # Pillow warns above this and raises at twice it; decode_cost() rejects anything above it
+            Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+            _pil_image = Image
+        except Exception as e:
+            log.warning("Pillow import failed or unavailable: %s", e)
+        _pil_checked = True
+    return _pil_image
+
+
+def _np():
+    import numpy
+    return numpy
+
+
+def _base83(value, length):
+    return "".join(_BASE83[(value // 83 ** (length - i - 1)) % 83] for i in range(length))
+
+
+def _srgb_to_linear(np, pixels):
+    v = pixels / 255.0
+    return np.where(v <= 0.04045, v / 12.92, ((v + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(value):
+    v = min(max(value, 0.0), 1.0)
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def downsample(img, size=PLACEHOLDER_SAMPLE_SIZE):
+    """RGB copy at most `size` px on the longest side, decoding JPEGs at reduced scale"""
+    if img.format == "JPEG":
+        img.draft("RGB", (size * 2, size * 2))  # Let libjpeg decode at 1/2..1/8 scale
+    sample = img.convert("RGB")
+    sample.thumbnail((size, size))
+    return sample
+
+
+def blurhash(pixels, components=BLURHASH_COMPONENTS):
+    """BlurHash of an (h, w, 3) uint8 array; the DCT is one einsum over the whole image"""
+    np = _np()
+    cx, cy = components
+    height, width = pixels.shape[:2]
+    linear = _srgb_to_linear(np, pixels.astype(np.float64))
+
+    basis_x = np.cos(np.pi * np.outer(np.arange(cx), np.arange(width)) / width)    # (cx, w)
+    basis_y = np.cos(np.pi * np.outer(np.arange(cy), np.arange(height)) / height)  # (cy, h)
+    factors = np.einsum("jy,ix,yxc->jic", basis_y, basis_x, linear) / (width * height)
+    factors[1:, :] *= 2
+    factors[0, 1:] *= 2
+    factors = factors.reshape(cx * cy, 3)  # Row-major (y, x) order, as the format expects
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83((cx - 1) + (cy - 1) * 9, 1)
+    if len(ac):
+        quantised_max = int(max(0, min(82, np.floor(np.abs(ac).max() * 166 - 0.5))))
+        max_value = (quantised_max + 1) / 166
+        result += _base83(quantised_max, 1)
+    else:
+        max_value = 1.0
+        result += _base83(0, 1)
+
+    r, g, b = (_linear_to_srgb(c) for c in dc)
+    result += _base83((r << 16) + (g << 8) + b, 4)
+
+    scaled = ac / max_value
+    quantised = np.clip(np.floor(np.sign(scaled) * np.sqrt(np.abs(scaled)) * 9 + 9.5), 0, 18).astype(int)
+    for qr, qg, qb in quantised:
+        result += _base83(qr * 19 * 19 + qg * 19 + qb, 2)
+    return result
+
+
+def dominant_color(pixels, bits=4):
+    """Mean color of the most populated cell of a (2**bits)^3 color histogram, as #rrggbb"""
+    np = _np()
+    flat = pixels.reshape(-1, 3)
+    shift = 8 - bits
+    cells = ((flat[:, 0].astype(np.int32) >> shift) << (2 * bits)) | ((flat[:, 1] >> shift) << bits) | (flat[:, 2] >> shift)
+    top = np.bincount(cells, minlength=1 << (3 * bits)).argmax()
+    r, g, b = flat[cells == top].mean(axis=0).round().astype(int)
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def lqip_data_uri(img, quality=LQIP_QUALITY):
+    """WebP data: URI of an (already tiny) image; JPEG where Pillow lacks WebP"""
+    buf = io.BytesIO()
+    try:
+        img.save(buf, format="WEBP", quality=quality, method=4)
+        mime = "image/webp"
+    except (KeyError, OSError):
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=quality)
+        mime = "image/jpeg"
+    return f"data:{mime};base64,{base64.b64encode(buf.getvalue()).decode('ascii')}"
+
+
+def compute_placeholder(img):
+    """
+    {"blurhash", "lqip", "dominant_color"} for an opened Pillow image, so clients
+    can paint something before the full image arrives. Everything is derived from
+    one 32px sample, so the cost barely depends on the source resolution.
+    """
+    np = _np()
+    sample = downsample(img)
+    pixels = np.asarray(sample, dtype=np.uint8)
+    return {
+        "blurhash": blurhash(pixels),
+        "lqip": lqip_data_uri(sample),
+        "dominant_color": dominant_color(pixels)
+    }
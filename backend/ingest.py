@@ -0,0 +1,137 @@
+"""
+Streaming ingestion of multipart file uploads.
+
+Werkzeug hands every uploaded part to `Request._get_file_stream()` and then
+writes the body into it chunk by chunk as it is parsed. `IngestRequest`
+returns an `IngestSpool` there, so while the part streams in it is:
+
+    - spooled to a temporary file once it outgrows UPLOAD_SPOOL_MEMORY,
+    - hashed (SHA-256) and measured,
+    - probed for image format and dimensions from its first bytes,
+    - dropped as soon as it crosses MAX_FILE_SIZE (the rest is discarded unread),
+    - dropped as soon as its header declares more than MAX_IMAGE_PIXELS pixels.
+
+Routes then read `file.stream.sha256`, `.size`, `.too_large`, `.too_many_pixels` and `.probe`
+instead of calling `file.read()`, and `with spool.upload_source() as body:` gives
+storage uploads something to stream from without another full copy in memory.
+
+App config:
+    MAX_FILE_SIZE         Per-file limit in bytes (parts above it are dropped)
+    MAX_IMAGE_PIXELS      Per-image limit in pixels, from the header (decompression bombs are dropped)
+    UPLOAD_SPOOL_MEMORY   Bytes kept in memory before spilling to disk (default 1MB)
+"""
+
+import contextlib
+import hashlib
+import io
+import os
+import tempfile
+
+from flask import Request, current_app
+
+from imaging import get_pil_image
+from metrics import Counter
+
+UPLOAD_PARTS = Counter("upload_parts_total", "Uploaded file parts by outcome; too_large parts are dropped while streaming",
+                       ("outcome",))
+
+DEFAULT_SPOOL_MEMORY = 1024 * 1024
+HEADER_PROBE_LIMIT = 512 * 1024  # JPEG EXIF blocks can push the SOF marker well past the first chunk
+
+
+class IngestSpool:
+    """Writable spool for one uploaded part that hashes, measures and probes it as it arrives"""
+
+    def __init__(self, max_size, max_memory=DEFAULT_SPOOL_MEMORY, max_pixels=None):
+        self.max_size = max_size
+        self.max_pixels = max_pixels
+        self.size = 0
+        self.too_large = False
+        self.too_many_pixels = False
+        self.probe = None  # {"format", "width", "height"} once the header has been parsed
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        self._hash = hashlib.sha256()
+        self._header = bytearray()
+        self._probing = get_pil_image() is not None
+
+    def write(self, data):
+        self.size += len(data)
+        if self.too_large or self.too_many_pixels:
+            return len(data)
+        if self.size > self.max_size:
+            self.too_large = True
+            self._drop("too_large")
+            return len(data)
+
+        self._hash.update(data)
+        if self._probing:
+            self._probe_header(data)
+            if self.too_many_pixels:
+                self._drop("too_many_pixels")
+                return len(data)
+        return self._file.write(data)
+
+    def _drop(self, outcome):
+        """Stop storing; what was spooled so far is released right away"""
+        self._probing = False
+        self._file.seek(0)
+        self._file.truncate()
+        UPLOAD_PARTS.inc(outcome=outcome)
+
+    def _probe_header(self, data):
+        self._header += data[:HEADER_PROBE_LIMIT - len(self._header)]
+        Image = get_pil_image()
+        try:
+            img = Image.open(io.BytesIO(self._header))
+            self.probe = {"format": img.format, "width": img.width, "height": img.height}
+            self._probing = False
+            self.too_many_pixels = bool(self.max_pixels) and img.width * img.height > self.max_pixels
+        except Image.DecompressionBombError:
+            # Past Pillow's own limit (twice Image.MAX_IMAGE_PIXELS)
+            self.too_many_pixels = True
+            self._probing = False
+        except Exception:
+            # Header incomplete (or not an image); give up once the probe window is full
+            self._probing = len(self._header) < HEADER_PROBE_LIMIT
+        if not self._probing:
+            self._header = bytearray()
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    @contextlib.contextmanager
+    def upload_source(self):
+        """
+        The spooled bytes in a form storage uploads accept (bytes or a BufferedReader),
+        without copying a disk-backed spool into memory
+        """
+        spooled = self._file._file
+        if isinstance(spooled, io.BytesIO):
+            yield spooled.getvalue()  # Small part, already in memory (shared until written to)
+            return
+        spooled.flush()
+        with open(os.dup(spooled.fileno()), "rb") as reader:
+            reader.seek(0)
+            yield reader
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def close(self):
+        self._file.close()
+
+    def __getattr__(self, name):
+        # read/readline/tell/... for FileStorage and Pillow
+        return getattr(self._file, name)
+
+
+class IngestRequest(Request):
+    """Flask request whose uploaded files stream into IngestSpools"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        config = current_app.config
+        UPLOAD_PARTS.inc(outcome="received")
+        return IngestSpool(config.get("MAX_FILE_SIZE", float("inf")),
+                           config.get("UPLOAD_SPOOL_MEMORY", DEFAULT_SPOOL_MEMORY),
+                           config.get("MAX_IMAGE_PIXELS"))
@@ -0,0 +1,288 @@
+"""
+Durable background jobs backed by a local SQLite file.
+
+    @job_queue.handler("image_derivatives", concurrency=2)
+    def make_derivatives(payload):
+        ...                                 # raise to retry; return value is stored as the result
+
+    job = job_queue.enqueue("image_derivatives", {"image_id": ...},
+                            idempotency_key=f"derivatives:{image_id}", owner=user_id)
+    job_queue.get(job["id"])                # {"status": "queued" | "running" | "succeeded" | "failed", ...}
+
+Jobs survive restarts: a worker leases a job before running it, and a job whose
+lease ran out (worker died mid-run) is picked up again. Failures are retried
+with exponential backoff up to `max_attempts`. Enqueueing with an idempotency
+key that already exists returns the existing job instead of adding another.
+A handler's `concurrency` caps how many workers run that kind at once, so a
+burst of one kind (a 50-image upload) leaves workers free for everything else.
+
+On serverless platforms there is no process that outlives the request, so
+`JobQueue(inline=True)` makes the first attempt synchronously inside
+`enqueue()`. A failed attempt is not retried in that request, which would
+sleep through the backoff. It stays queued, and `run_due(job_id)` runs it once
+its retry time has come, from a later request (the client polling the job's
+status). The SQLite file is per instance there (/tmp), so only a poll that
+reaches the same instance finds the job; the enqueueing request's response has
+to carry the outcome (app.inline_job_results).
+
+Environment:
+    JOB_DB_PATH       SQLite file (default backend/jobs.sqlite3; /tmp on serverless)
+    JOB_WORKERS       Worker threads (default 4)
+    JOB_LEASE         Seconds a running job is leased before it may be retried elsewhere (default 300)
+"""
+
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from metrics import Counter, Gauge, Histogram
+
+JOBS = Counter("jobs_total", "Background jobs by kind and outcome", ("kind", "outcome"))
+JOB_DURATION = Histogram("job_duration_seconds", "Background job run time", ("kind",))
+JOBS_RUNNING = Gauge("jobs_running", "Background jobs currently running", ("kind",))
+
+log = logging.getLogger("cursorgallery.jobs")
+
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 300.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id              TEXT PRIMARY KEY,
+    kind            TEXT NOT NULL,
+    payload         TEXT NOT NULL,
+    status          TEXT NOT NULL DEFAULT 'queued',
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    max_attempts    INTEGER NOT NULL,
+    run_at          REAL NOT NULL,
+    leased_until    REAL,
+    idempotency_key TEXT UNIQUE,
+    owner           TEXT,
+    result          TEXT,
+    error           TEXT,
+    created_at      REAL NOT NULL,
+    updated_at      REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(status, run_at);
+"""
+
+
+def backoff_delay(attempt):
+    """Seconds before retry number `attempt` (1-based): exponential with full jitter"""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+def _row_to_job(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    return job
+
+
+class JobQueue:
+    """SQLite-backed job queue with leased, retried jobs run by worker threads"""
+
+    def __init__(self, path, workers=4, lease=300, inline=False):
+        self.path = path
+        self.workers = workers
+        self.lease = lease
+        self.inline = inline
+        self._handlers = {}
+        self._limits = {}
+        self._running = {}
+        self._running_lock = threading.Lock()
+        self._local = threading.local()
+        self._wakeup = threading.Condition()
+        self._threads = []
+        self._stopping = False
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    # ---- storage ----
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(_SCHEMA)
+                    self._initialized = True
+        return conn
+
+    # ---- producer side ----
+
+    def handler(self, kind, concurrency=None):
+        """Register the function that runs jobs of `kind` (at most `concurrency` at once); it receives the payload"""
+        def register(fn):
+            self._handlers[kind] = fn
+            if concurrency:
+                self._limits[kind] = concurrency
+            return fn
+        return register
+
+    def enqueue(self, kind, payload, idempotency_key=None, owner=None, max_attempts=5, delay=0):
+        """Add a job (or return the existing one with the same idempotency key)"""
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind {kind!r}")
+        now = time.time()
+        job_id = str(uuid.uuid4())
+        conn = self._connect()
+        cursor = conn.execute(
+            "INSERT INTO jobs (id, kind, payload, max_attempts, run_at, idempotency_key, owner, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(idempotency_key) DO NOTHING",
+            (job_id, kind, json.dumps(payload), max_attempts, now + delay, idempotency_key, owner, now, now)
+        )
+        if cursor.rowcount == 0:
+            JOBS.inc(kind=kind, outcome="deduplicated")
+            return self.get_by_key(idempotency_key)
+
+        JOBS.inc(kind=kind, outcome="enqueued")
+        if self.inline:
+            self._run_inline(job_id)
+        else:
+            with self._wakeup:
+                self._wakeup.notify()
+        return self.get(job_id)
+
+    def get(self, job_id):
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row)
+
+    def get_by_key(self, idempotency_key):
+        row = self._connect().execute("SELECT * FROM jobs WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+        return _row_to_job(row)
+
+    def counts(self):
+        """{status: count} across all jobs"""
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    # ---- worker side ----
+
+    def _claim(self, job_id=None, due=False):
+        """Lease the next runnable job (queued and due, or running with an expired lease), or job_id
+        (only if runnable when `due` is set)"""
+        now = time.time()
+        # Claims are serialized so two workers can't both take the last free slot of a kind
+        with self._running_lock:
+            if job_id and due:
+                where = ("id = ? AND ((status = 'queued' AND run_at <= ?) "
+                         "OR (status = 'running' AND leased_until < ?))")
+                params = (job_id, now, now)
+            elif job_id:
+                where, params = "id = ?", (job_id,)
+            else:
+                saturated = [kind for kind, limit in self._limits.items() if self._running.get(kind, 0) >= limit]
+                skip = f"AND kind NOT IN ({','.join('?' * len(saturated))}) " if saturated else ""
+                where = (
+                    "id = (SELECT id FROM jobs WHERE ((status = 'queued' AND run_at <= ?) "
+                    f"OR (status = 'running' AND leased_until < ?)) {skip}ORDER BY run_at LIMIT 1)"
+                )
+                params = (now, now, *saturated)
+            row = self._connect().execute(
+                f"UPDATE jobs SET status = 'running', attempts = attempts + 1, leased_until = ?, updated_at = ? "
+                f"WHERE {where} RETURNING *",
+                (now + self.lease, now) + params
+            ).fetchone()
+            job = _row_to_job(row)
+            if job is not None:
+                self._running[job["kind"]] = self._running.get(job["kind"], 0) + 1
+        return job
+
+    def _finish(self, job, error=None, result=None):
+        now = time.time()
+        conn = self._connect()
+        if error is None:
+            conn.execute(
+                "UPDATE jobs SET status = 'succeeded', result = ?, error = NULL, leased_until = NULL, updated_at = ? "
+                "WHERE id = ?", (json.dumps(result), now, job["id"]))
+            JOBS.inc(kind=job["kind"], outcome="succeeded")
+            return None
+        if job["attempts"] < job["max_attempts"]:
+            run_at = now + backoff_delay(job["attempts"])
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', run_at = ?, error = ?, leased_until = NULL, updated_at = ? "
+                "WHERE id = ?", (run_at, error, now, job["id"]))
+            JOBS.inc(kind=job["kind"], outcome="retried")
+            return run_at
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = ?, leased_until = NULL, updated_at = ? WHERE id = ?",
+            (error, now, job["id"]))
+        JOBS.inc(kind=job["kind"], outcome="failed")
+        log.error("Job %s (%s) failed after %d attempts: %s", job["id"], job["kind"], job["attempts"], error)
+        return None
+
+    def _execute(self, job):
+        """Run one leased job; returns the retry time if it should run again"""
+        kind = job["kind"]
+        started = time.perf_counter()
+        JOBS_RUNNING.inc(kind=kind)
+        try:
+            result = self._handlers[kind](job["payload"])
+        except Exception as e:
+            log.warning("Job %s (%s) attempt %d failed: %s", job["id"], kind, job["attempts"], e)
+            return self._finish(job, error=f"{type(e).__name__}: {e}")
+        finally:
+            with self._running_lock:
+                self._running[kind] -= 1
+            JOBS_RUNNING.dec(kind=kind)
+            JOB_DURATION.observe(time.perf_counter() - started, kind=kind)
+            with self._wakeup:
+                self._wakeup.notify()  # A slot for this kind may have opened up
+        return self._finish(job, result=result)
+
+    def _run_inline(self, job_id):
+        # One attempt; a failure keeps its backoff and waits for run_due() rather than sleeping in the request
+        job = self._claim(job_id)
+        if job is not None:
+            self._execute(job)
+
+    def run_due(self, job_id):
+        """Inline mode: run a job whose retry is due (one attempt) and return it; otherwise just return it"""
+        job = self._claim(job_id, due=True)
+        if job is not None:
+            self._execute(job)
+        return self.get(job_id)
+
+    def _worker(self):
+        while not self._stopping:
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                log.warning("Job queue unavailable: %s", e)
+                job = None
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=1.0)
+                continue
+            self._execute(job)
+
+    def start(self):
+        """Start the worker threads (no-op in inline mode or if already started)"""
+        if self.inline or self._threads:
+            return
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        self._stopping = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._stopping = False
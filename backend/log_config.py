@@ -0,0 +1,175 @@
+"""
+Non-blocking, leveled logging for the backend.
+
+Request threads only put records on an in-memory queue; a background
+QueueListener thread formats them and writes to stdout. If the writer falls
+behind (e.g. log shipping backs up), new records are dropped and counted
+instead of blocking the request. Serverless mode writes inline instead.
+
+Environment:
+    LOG_LEVEL        Root level (default INFO, WARNING on serverless)
+    LOG_LEVELS       Per-logger overrides, e.g. "cursorgallery.auth=DEBUG,werkzeug=WARNING"
+    LOG_FORMAT       "text" (default) or "json"
+    LOG_QUEUE_SIZE   Max queued records before dropping (default 10000)
+"""
+
+import atexit
+import contextlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+from metrics import Counter
+
+LOG_RECORDS_DROPPED = Counter("log_records_dropped_total", "Log records dropped because the log queue was full")
+
+_listener = None
+_stream = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; fields passed via `extra=` are included"""
+
+    _reserved = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self._reserved and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep 1 in N records logged with `extra={"sample": N}`; other records pass through"""
+
+    def __init__(self):
+        super().__init__()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        every = getattr(record, "sample", None)
+        if not every or every <= 1 or record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            seen = self._counters.get(key, 0)
+            self._counters[key] = seen + 1
+        return seen % every == 0
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: records are dropped when the queue is full"""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+    def prepare(self, record):
+        # Format the message in the caller's thread (args may be mutable request objects),
+        # but leave exception formatting to the writer thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _parse_level(value, default):
+    if not value:
+        return default
+    value = value.strip().upper()
+    return int(value) if value.isdigit() else logging.getLevelName(value)
+
+
+def configure_logging(serverless=False):
+    """Install the queue handler on the root logger and start the writer thread (idempotent)"""
+    global _listener, _stream
+    if _listener is not None:
+        return
+
+    root = logging.getLogger()
+    root.setLevel(_parse_level(os.environ.get("LOG_LEVEL"), logging.WARNING if serverless else logging.INFO))
+
+    # httpx logs every Supabase round trip at INFO; that is what the metrics are for
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    for override in filter(None, os.environ.get("LOG_LEVELS", "").split(",")):
+        name, _, level = override.partition("=")
+        if name.strip() and level.strip():
+            logging.getLogger(name.strip()).setLevel(_parse_level(level, logging.INFO))
+
+    stream = logging.StreamHandler(sys.stdout)
+    if os.environ.get("LOG_FORMAT", "text").lower() == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+    _stream = stream
+
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+
+    if serverless:
+        # Serverless instances freeze between invocations, so a writer thread could sit on
+        # unflushed records; write inline there (it runs at WARNING, so this is rare)
+        stream.addFilter(SamplingFilter())
+        root.addHandler(stream)
+        _listener = stream
+        return
+
+    log_queue = queue.Queue(maxsize=int(os.environ.get("LOG_QUEUE_SIZE", 10000)))
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter())
+    root.addHandler(handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+@contextlib.contextmanager
+def writer_paused():
+    """Stop the writer thread for the duration (records queue up meanwhile), so the process can fork with no
+    logging thread inside a lock"""
+    listener = _listener if isinstance(_listener, logging.handlers.QueueListener) else None
+    if listener is not None:
+        listener.stop()
+    try:
+        yield
+    finally:
+        if listener is not None:
+            listener.start()
+
+
+def log_directly():
+    """In a forked child: write records straight to stdout. The inherited queue is a copy nobody drains."""
+    global _listener
+    if not isinstance(_listener, logging.handlers.QueueListener):
+        return  # Not configured, or serverless, which already writes inline
+    _listener = _stream
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    _stream.addFilter(SamplingFilter())
+    root.addHandler(_stream)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if isinstance(_listener, logging.handlers.QueueListener):
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,52 @@
+-- Bulk image delete for one gallery, in a single transaction: remove the rows,
+-- drop their image_objects references, set image_count from what is left and,
+-- with p_compact, renumber the remaining order_index values to 0..n-1.
+-- Returns no row when the gallery isn't p_user_id's. Otherwise it returns one row
+-- with the deleted images and the released objects, so the caller can remove
+-- the storage objects afterwards, outside the transaction.
+CREATE OR REPLACE FUNCTION delete_gallery_images(p_user_id UUID, p_gallery_id UUID, p_image_ids UUID[],
+                                                 p_compact BOOLEAN DEFAULT FALSE)
+RETURNS TABLE (deleted JSONB, released JSONB, image_count INTEGER, version BIGINT) AS $$
+#variable_conflict use_column
+DECLARE
+    v_deleted  JSONB;
+    v_released JSONB;
+    v_count    INTEGER;
+    v_version  BIGINT;
+BEGIN
+    -- Lock the gallery row: concurrent uploads and deletes take turns, so the count below is exact
+    PERFORM 1 FROM galleries g WHERE g.id = p_gallery_id AND g.user_id = p_user_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    WITH gone AS (
+        DELETE FROM images i
+        WHERE i.gallery_id = p_gallery_id AND i.id = ANY (p_image_ids)
+        RETURNING i.id, i.url, i.thumbnail_url, i.metadata
+    )
+    SELECT COALESCE(jsonb_agg(to_jsonb(gone)), '[]'::jsonb) INTO v_deleted FROM gone;
+
+    SELECT COALESCE(jsonb_agg(to_jsonb(r)), '[]'::jsonb) INTO v_released
+    FROM release_image_objects(p_user_id, ARRAY(
+        SELECT d -> 'metadata' ->> 'sha256'
+        FROM jsonb_array_elements(v_deleted) AS d
+        WHERE d -> 'metadata' ->> 'sha256' IS NOT NULL
+    )) AS r;
+
+    IF p_compact THEN
+        UPDATE images i
+        SET order_index = o.position
+        FROM (SELECT id, (ROW_NUMBER() OVER (ORDER BY order_index, created_at, id) - 1)::int AS position
+              FROM images
+              WHERE gallery_id = p_gallery_id) o
+        WHERE i.id = o.id AND i.order_index <> o.position;
+    END IF;
+
+    SELECT COUNT(*)::int INTO v_count FROM images i WHERE i.gallery_id = p_gallery_id;
+    UPDATE galleries g SET image_count = v_count WHERE g.id = p_gallery_id
+    RETURNING g.version INTO v_version;
+
+    RETURN QUERY SELECT v_deleted, v_released, v_count, v_version;
+END;
+$$ LANGUAGE plpgsql;
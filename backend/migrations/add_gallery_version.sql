@@ -0,0 +1,42 @@
+-- Monotonic per-gallery version, bumped by every write to the gallery row or to
+-- any of its images. Clients key long-lived caches on it (the preload manifest
+-- is served immutable for ?v=<version>), so it must change whenever anything a
+-- viewer sees changes.
+ALTER TABLE galleries ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 1;
+
+-- Gallery row edits (name, config, status, ...): bump unless the update already did
+CREATE OR REPLACE FUNCTION bump_gallery_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.version = OLD.version THEN
+        NEW.version := OLD.version + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bump_gallery_version_trigger ON galleries;
+CREATE TRIGGER bump_gallery_version_trigger
+    BEFORE UPDATE ON galleries
+    FOR EACH ROW
+    EXECUTE FUNCTION bump_gallery_version();
+
+-- Image inserts, edits (transforms, derivatives) and deletes bump their gallery
+CREATE OR REPLACE FUNCTION bump_gallery_version_for_image()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE galleries
+    SET version = version + 1
+    WHERE id = COALESCE(NEW.gallery_id, OLD.gallery_id);
+    IF TG_OP = 'UPDATE' AND NEW.gallery_id IS DISTINCT FROM OLD.gallery_id THEN
+        UPDATE galleries SET version = version + 1 WHERE id = OLD.gallery_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bump_gallery_version_image_trigger ON images;
+CREATE TRIGGER bump_gallery_version_image_trigger
+    AFTER INSERT OR UPDATE OR DELETE ON images
+    FOR EACH ROW
+    EXECUTE FUNCTION bump_gallery_version_for_image();
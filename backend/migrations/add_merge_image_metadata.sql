@@ -0,0 +1,14 @@
+-- Merge keys into images.metadata in place. Writers of different keys (derivative
+-- jobs, cached analysis features) then don't undo each other, which happens when
+-- each writes back a whole metadata object it read earlier.
+-- p_patches: [{"id": "<image id>", "metadata": {...keys to set}, "thumbnail_url": "..." (optional)}, ...]
+-- Returns the ids that were updated; a missing id means the image was deleted.
+CREATE OR REPLACE FUNCTION merge_image_metadata(p_patches JSONB)
+RETURNS SETOF UUID AS $$
+    UPDATE images i
+    SET metadata      = COALESCE(i.metadata, '{}'::jsonb) || COALESCE(p.patch -> 'metadata', '{}'::jsonb),
+        thumbnail_url = COALESCE(p.patch ->> 'thumbnail_url', i.thumbnail_url)
+    FROM (SELECT (e ->> 'id')::uuid AS id, e AS patch FROM jsonb_array_elements(p_patches) AS e) p
+    WHERE i.id = p.id
+    RETURNING i.id;
+$$ LANGUAGE sql;
@@ -0,0 +1,66 @@
+-- Content-addressed index of stored image objects, one row per (user, SHA-256).
+-- images rows that share the same bytes point at the same storage objects;
+-- ref_count tracks how many images rows use them so deletes only remove
+-- objects nobody references any more.
+CREATE TABLE IF NOT EXISTS image_objects
+(
+    id            UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id       UUID    NOT NULL REFERENCES auth.users (id) ON DELETE CASCADE,
+    sha256        TEXT    NOT NULL,
+    storage_key   TEXT    NOT NULL,
+    thumbnail_key TEXT,
+    url           TEXT    NOT NULL,
+    thumbnail_url TEXT,
+    metadata      JSONB            DEFAULT '{}'::jsonb,
+    ref_count     INTEGER NOT NULL DEFAULT 1,
+    created_at    TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc', NOW()),
+    UNIQUE (user_id, sha256)
+);
+
+-- Take a reference on an existing object; returns the row, or nothing if the hash is unknown
+CREATE OR REPLACE FUNCTION acquire_image_object(p_user_id UUID, p_sha256 TEXT)
+RETURNS SETOF image_objects AS $$
+    UPDATE image_objects
+    SET ref_count = ref_count + 1
+    WHERE user_id = p_user_id AND sha256 = p_sha256
+    RETURNING *;
+$$ LANGUAGE sql;
+
+-- Drop one reference per entry in p_hashes (a hash may repeat); rows that reach
+-- zero are deleted and returned so the caller can remove their storage objects
+CREATE OR REPLACE FUNCTION release_image_objects(p_user_id UUID, p_hashes TEXT[])
+RETURNS TABLE (sha256 TEXT, storage_key TEXT, thumbnail_key TEXT) AS $$
+#variable_conflict use_column
+BEGIN
+    UPDATE image_objects o
+    SET ref_count = o.ref_count - r.n
+    FROM (SELECT h, COUNT(*)::int AS n FROM unnest(p_hashes) AS h GROUP BY h) r
+    WHERE o.user_id = p_user_id AND o.sha256 = r.h;
+
+    RETURN QUERY
+    DELETE FROM image_objects o
+    WHERE o.user_id = p_user_id AND o.sha256 = ANY (p_hashes) AND o.ref_count <= 0
+    RETURNING o.sha256, o.storage_key, o.thumbnail_key;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Enable Row Level Security
+ALTER TABLE image_objects ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view their own image objects"
+    ON image_objects FOR SELECT
+    USING (auth.uid() = user_id);
+
+CREATE POLICY "Users can insert their own image objects"
+    ON image_objects FOR INSERT
+    WITH CHECK (auth.uid() = user_id);
+
+CREATE POLICY "Users can update their own image objects"
+    ON image_objects FOR UPDATE
+    USING (auth.uid() = user_id);
+
+CREATE POLICY "Users can delete their own image objects"
+    ON image_objects FOR DELETE
+    USING (auth.uid() = user_id);
+
+GRANT ALL ON image_objects TO authenticated;
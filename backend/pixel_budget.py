@@ -0,0 +1,120 @@
+"""
+Admission control for image decoding, counted in decoded pixels.
+
+MAX_FILE_SIZE bounds compressed bytes, not memory: a 10MB PNG can decode to
+hundreds of megabytes, and a few such decodes at once take the worker down.
+Before anything is decoded:
+
+    cost = decode_cost(Image, data, box=(1600, 1600))   # header only; raises ImageTooLarge
+    with decode_budget.reserve(cost.pixels):
+        derivatives = image_pool.run(create_derivatives, data)
+
+`decode_cost` reads the dimensions from the header and applies the same JPEG
+draft the decoder will use, so the reservation matches what will actually be
+allocated. A JPEG decoded for smaller output is reserved at its 1/2..1/8 draft
+scale. Images over the pixel limit are rejected outright. Pillow's own check
+only warns at Image.MAX_IMAGE_PIXELS and raises at twice that.
+
+One PixelBudget covers every decode the process dispatches, across all image
+pool workers. A decode waits until its pixels fit; one larger than the whole
+budget waits until nothing else is decoding, then runs alone.
+"""
+
+import contextlib
+import io
+import threading
+import time
+from collections import namedtuple
+
+from metrics import Counter, Gauge, Histogram
+
+DECODE_ADMISSIONS = Counter("decode_admissions_total",
+                            "Image decodes by admission result (admitted, busy = budget full too long, too_large)",
+                            ("result",))
+DECODE_ADMISSION_WAIT = Histogram("decode_admission_wait_seconds", "Time a decode waited for pixel budget")
+DECODE_PIXELS_IN_USE = Gauge("decode_pixels_in_use", "Decoded pixels currently reserved against the budget")
+DECODE_MEGAPIXELS = Histogram("decode_megapixels", "Megapixels reserved per decode (after JPEG draft scaling)",
+                              buckets=(0.25, 1, 2, 4, 8, 12, 16, 24, 32, 48, 64, 100))
+
+
+class ImageTooLarge(ValueError):
+    """The image has more pixels than MAX_IMAGE_PIXELS (a decompression bomb, or just too big to decode)"""
+
+    def __init__(self, width=None, height=None, limit=None):
+        self.width, self.height, self.limit = width, height, limit
+        size = f"{width}x{height}" if width and height else "Image"
+        super().__init__(f"{size} exceeds the {limit / 1_000_000:g} megapixel limit" if limit
+                         else f"{size} exceeds the decoder's pixel limit")
+
+
+class DecodeBudgetBusy(RuntimeError):
+    """The pixel budget did not free up within the wait"""
+
+
+class DecodeCost(namedtuple("DecodeCost", "width height decoded_width decoded_height")):
+    @property
+    def pixels(self):
+        return self.decoded_width * self.decoded_height
+
+
+def decode_cost(Image, source, box=None, max_pixels=None):
+    """
+    Header-only look at image bytes (or a file): stored size and the size the
+    decoder will produce when JPEGs are drafted to `box`. Raises ImageTooLarge
+    above `max_pixels`, and whatever Pillow raises for data it can't identify.
+    """
+    try:
+        img = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+    except Image.DecompressionBombError:
+        DECODE_ADMISSIONS.inc(result="too_large")
+        raise ImageTooLarge(limit=max_pixels)
+    try:
+        width, height = img.size
+        if max_pixels and width * height > max_pixels:
+            DECODE_ADMISSIONS.inc(result="too_large")
+            raise ImageTooLarge(width, height, max_pixels)
+        if box and img.format == "JPEG":
+            img.draft("RGB", box)  # Only rewrites the decoder's scale; nothing is decoded yet
+        return DecodeCost(width, height, *img.size)
+    finally:
+        if not isinstance(source, bytes):
+            source.seek(0)
+
+
+class PixelBudget:
+    """Counting semaphore over decoded pixels"""
+
+    def __init__(self, max_pixels, wait=30.0):
+        self.max_pixels = max_pixels
+        self.wait = wait
+        self._cond = threading.Condition()
+        self._used = 0
+
+    @contextlib.contextmanager
+    def reserve(self, pixels):
+        pixels = max(0, min(pixels, self.max_pixels))
+        started = time.monotonic()
+        deadline = started + self.wait
+        with self._cond:
+            while self._used and self._used + pixels > self.max_pixels:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    DECODE_ADMISSIONS.inc(result="busy")
+                    raise DecodeBudgetBusy(f"No room for {pixels / 1_000_000:.1f} decoded megapixels "
+                                           f"within {self.wait:g}s")
+                self._cond.wait(remaining)
+            self._used += pixels
+            DECODE_PIXELS_IN_USE.set(self._used)
+        DECODE_ADMISSIONS.inc(result="admitted")
+        DECODE_ADMISSION_WAIT.observe(time.monotonic() - started)
+        DECODE_MEGAPIXELS.observe(pixels / 1_000_000)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._used -= pixels
+                DECODE_PIXELS_IN_USE.set(self._used)
+                self._cond.notify_all()
+
+    def in_use(self):
+        return self._used
@@ -0,0 +1,64 @@
+"""
+Request coalescing ("single-flight") for identical concurrent lookups.
+
+When several threads ask for the same key at the same time, only the first
+(the leader) calls the backend; the others wait for and share its result or
+exception. Nothing is cached: once the leader finishes, the next caller
+starts a fresh call.
+"""
+
+import threading
+
+from metrics import Counter, Gauge
+
+SINGLEFLIGHT_CALLS = Counter("singleflight_calls_total",
+                             "Coalesced lookups by group; role=shared means no backend call was made",
+                             ("group", "role"))
+SINGLEFLIGHT_IN_FLIGHT = Gauge("singleflight_in_flight", "Distinct keys with a backend call in flight", ("group",))
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one backend call"""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Return fn()'s result, sharing it with any concurrent caller using the same key"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            SINGLEFLIGHT_CALLS.inc(group=self.name, role="shared")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        SINGLEFLIGHT_CALLS.inc(group=self.name, role="leader")
+        SINGLEFLIGHT_IN_FLIGHT.inc(group=self.name)
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            SINGLEFLIGHT_IN_FLIGHT.dec(group=self.name)
+            call.done.set()
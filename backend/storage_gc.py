@@ -0,0 +1,156 @@
+"""
+Incremental garbage collection of orphaned objects in the gallery-images bucket.
+
+Objects outlive their images rows in several ways:
+- a delete whose storage remove failed (only logged)
+- a direct upload that never reached register-image
+- a derivative format that is no longer configured
+- a gallery or account deleted mid-cleanup
+
+The collector walks the bucket one user folder (`<user_id>/`) at a time,
+including every `<gallery_id>/`, `thumbs/` and `variants/` folder under it. It
+compares what it finds against the keys still referenced by that user's
+images and image_objects rows. An object is removed only when:
+- no row references it, and
+- it is older than the grace period, so uploads still on their way to a row are left alone.
+
+    gc = StorageGC(lambda: supabase.storage.from_("gallery-images"), referenced_keys, grace=86400, rate=5)
+    cursor, stats = gc.run_slice(cursor)    # next `batch` user folders after `cursor`; cursor None = pass done
+
+`referenced_keys(user_ids)` returns every key the given users' rows still
+point at. An exception from it aborts the slice before anything is deleted.
+Each slice restarts from the cursor (the last user folder it finished), so a
+pass can be spread over many jobs and survives restarts. Storage API calls are
+spaced to at most `rate` per second.
+"""
+
+import logging
+import re
+import time
+from datetime import datetime, timezone
+
+from metrics import Counter, Histogram
+
+STORAGE_GC_OBJECTS = Counter("storage_gc_objects_total",
+                             "Objects seen by the storage GC by outcome (kept, young, orphaned, deleted)",
+                             ("outcome",))
+STORAGE_GC_DELETED_BYTES = Counter("storage_gc_deleted_bytes_total", "Bytes of orphaned objects removed")
+STORAGE_GC_SLICE = Histogram("storage_gc_slice_seconds", "Time to collect one slice of user folders",
+                             buckets=(1, 5, 10, 30, 60, 120, 300, 600))
+
+log = logging.getLogger("cursorgallery.storage_gc")
+
+LIST_PAGE = 1000  # Entries per list call
+REMOVE_BATCH = 1000  # Keys per remove call (the Storage API's limit)
+_FOLDER_NAME = re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$')
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart (sleeping the caller); rate 0 means no limit"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+
+    def wait(self):
+        now = time.monotonic()
+        if now < self._next:
+            time.sleep(self._next - now)
+            now = self._next
+        self._next = now + self.interval
+
+
+def _timestamp(entry):
+    value = entry.get('updated_at') or entry.get('created_at')
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class StorageGC:
+    """Collects orphaned objects a few user folders at a time"""
+
+    def __init__(self, get_bucket, referenced_keys, grace=86400, rate=5.0, batch=10, dry_run=False):
+        self.get_bucket = get_bucket
+        self.referenced_keys = referenced_keys
+        self.grace = grace
+        self.batch = batch
+        self.dry_run = dry_run
+        self._limiter = RateLimiter(rate)
+
+    def _list(self, path):
+        """Every entry of one folder, paged; folders have id None"""
+        entries, offset = [], 0
+        while True:
+            self._limiter.wait()
+            page = self.get_bucket().list(path, {"limit": LIST_PAGE, "offset": offset,
+                                                 "sortBy": {"column": "name", "order": "asc"}}) or []
+            entries.extend(page)
+            if len(page) < LIST_PAGE:
+                return entries
+            offset += LIST_PAGE
+
+    def _walk(self, path):
+        """(key, entry) for every object under a folder, at any depth"""
+        for entry in self._list(path):
+            key = f"{path}/{entry['name']}"
+            if entry.get('id') is None:
+                yield from self._walk(key)
+            else:
+                yield key, entry
+
+    def next_users(self, cursor):
+        """Up to `batch` user folder names after `cursor`, and whether the bucket has more"""
+        users = sorted(entry['name'] for entry in self._list("")
+                       if entry.get('id') is None and _FOLDER_NAME.match(entry['name']))
+        after = [name for name in users if name > (cursor or "")]
+        return after[:self.batch], len(after) > self.batch
+
+    def run_slice(self, cursor=""):
+        """Collect the next `batch` user folders after `cursor`; returns (next cursor or None, stats)"""
+        started = time.monotonic()
+        users, more = self.next_users(cursor)
+        stats = {"users": len(users), "objects": 0, "young": 0, "orphaned": 0, "deleted": 0, "deleted_bytes": 0}
+        if not users:
+            return None, stats
+
+        referenced = self.referenced_keys(users)
+        horizon = datetime.now(timezone.utc).timestamp() - self.grace
+        orphans = []
+        for user_id in users:
+            for key, entry in self._walk(user_id):
+                stats['objects'] += 1
+                if key in referenced:
+                    STORAGE_GC_OBJECTS.inc(outcome="kept")
+                    continue
+                modified = _timestamp(entry)
+                if modified is None or modified.timestamp() > horizon:
+                    stats['young'] += 1
+                    STORAGE_GC_OBJECTS.inc(outcome="young")
+                    continue
+                stats['orphaned'] += 1
+                STORAGE_GC_OBJECTS.inc(outcome="orphaned")
+                orphans.append((key, (entry.get('metadata') or {}).get('size') or 0))
+
+        if orphans and not self.dry_run:
+            for start in range(0, len(orphans), REMOVE_BATCH):
+                chunk = orphans[start:start + REMOVE_BATCH]
+                self._limiter.wait()
+                self.get_bucket().remove([key for key, _ in chunk])
+                stats['deleted'] += len(chunk)
+                stats['deleted_bytes'] += sum(size for _, size in chunk)
+                STORAGE_GC_OBJECTS.inc(len(chunk), outcome="deleted")
+                STORAGE_GC_DELETED_BYTES.inc(sum(size for _, size in chunk))
+        for key, size in orphans:
+            log.log(logging.INFO if self.dry_run else logging.DEBUG, "%s orphaned object %s (%d bytes)",
+                    "Would remove" if self.dry_run else "Removed", key, size)
+        if orphans:
+            log.info("%s %d orphaned objects under %d user folders", "Found" if self.dry_run else "Removed",
+                     len(orphans), len(users))
+
+        STORAGE_GC_SLICE.observe(time.monotonic() - started)
+        return (users[-1] if more else None), stats
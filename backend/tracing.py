@@ -0,0 +1,179 @@
+"""
+Per-request trace of Supabase round trips.
+
+Every HTTP call supabase-py makes (REST, Storage, Auth) becomes a span with
+its operation, table/bucket, start offset and duration. When a request
+finishes, spans that overlapped in time are grouped into one "round trip":
+calls fanned out through TaskGroup cost a single round trip of latency, while
+calls made one after another each cost one. The round-trip count is the
+number to keep low, since every serial call adds a full network latency to
+the response.
+
+Tracing is for development and CI (SUPABASE_TRACE=1). Traced responses carry
+X-Supabase-Calls, X-Supabase-Round-Trips and a Server-Timing entry. The full
+span list of recent requests is kept in memory for /api/debug?trace=<id>.
+
+Budgets in tests:
+
+    response = client.get(f"/api/galleries/{gallery_id}", headers=auth)
+    assert_round_trips(response, max_round_trips=2)
+"""
+
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict
+
+MAX_SPANS = 200  # Per request; a route past this is already badly broken
+_trace_ids = itertools.count(1)
+
+_REST_OPERATIONS = {"GET": "select", "HEAD": "count", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+_STORAGE_OPERATIONS = {"GET": "download", "HEAD": "info", "POST": "upload", "PUT": "update", "DELETE": "remove"}
+
+
+def describe_call(method, path, prefer=""):
+    """(service, operation, target) for a Supabase URL, e.g. ("rest", "select", "galleries")"""
+    parts = [p for p in path.split("/") if p]
+    service = parts[0] if parts else "other"
+    rest = parts[2:]  # Drop "<service>/v1"
+    if service == "rest":
+        if rest[:1] == ["rpc"]:
+            return service, "rpc", rest[1] if len(rest) > 1 else None
+        operation = _REST_OPERATIONS.get(method, method.lower())
+        if operation == "insert" and "resolution=" in (prefer or ""):
+            operation = "upsert"
+        return service, operation, rest[0] if rest else None
+    if service == "storage":
+        if rest[:1] == ["object"] and len(rest) > 1:
+            if rest[1] in ("list", "sign", "move", "copy", "info"):
+                return service, rest[1], rest[2] if len(rest) > 2 else None
+            if rest[1] in ("public", "authenticated"):
+                return service, "download", rest[2] if len(rest) > 2 else None
+            return service, _STORAGE_OPERATIONS.get(method, method.lower()), rest[1]
+        return service, method.lower(), "/".join(rest) or None
+    if service == "auth":
+        # admin/users/<id> -> "admin_users"; ids and tokens don't belong in the operation name
+        operation = "_".join(rest[:2]) if rest[:1] == ["admin"] else (rest[0] if rest else "auth")
+        return service, f"{method.lower()}_{operation}", None
+    return "other", method.lower(), path
+
+
+class RequestTrace:
+    """Spans recorded while serving one request (appended from any fan-out thread)"""
+
+    def __init__(self, method, route, path):
+        self.id = f"{next(_trace_ids):x}"
+        self.method = method
+        self.route = route
+        self.path = path
+        self.started = time.perf_counter()
+        self.spans = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def record(self, method, path, start, duration, prefer="", status=None):
+        service, operation, target = describe_call(method, path, prefer)
+        span = {
+            "service": service,
+            "operation": operation,
+            "target": target,
+            "status": status,
+            "start_ms": round((start - self.started) * 1000, 2),
+            "duration_ms": round(duration * 1000, 2),
+            "thread": threading.current_thread().name,
+        }
+        with self._lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+    def summary(self):
+        """Spans in start order, each marked serial or parallel, plus totals"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        waves, wave_end = [], None
+        for span in spans:
+            end = span["start_ms"] + span["duration_ms"]
+            if wave_end is None or span["start_ms"] >= wave_end:
+                waves.append([span])
+                wave_end = end
+            else:
+                waves[-1].append(span)
+                wave_end = max(wave_end, end)
+        for number, wave in enumerate(waves, 1):
+            for span in wave:
+                span["round_trip"] = number
+                span["mode"] = "parallel" if len(wave) > 1 else "serial"
+        return {
+            "id": self.id,
+            "method": self.method,
+            "route": self.route,
+            "path": self.path,
+            "calls": len(spans) + self.dropped,
+            "round_trips": len(waves),
+            "supabase_ms": round(sum(s["duration_ms"] for s in spans), 2),
+            "elapsed_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "dropped": self.dropped,
+            "spans": spans,
+        }
+
+
+class TraceBuffer:
+    """The most recent request traces, by id"""
+
+    def __init__(self, maxlen=100):
+        self.maxlen = maxlen
+        self._lock = threading.Lock()
+        self._traces = OrderedDict()
+
+    def add(self, summary):
+        with self._lock:
+            self._traces[summary["id"]] = summary
+            while len(self._traces) > self.maxlen:
+                self._traces.popitem(last=False)
+
+    def get(self, trace_id):
+        with self._lock:
+            return self._traces.get(trace_id)
+
+    def recent(self, limit=20, route=None):
+        """Newest first, without span lists"""
+        with self._lock:
+            traces = list(self._traces.values())
+        traces = [t for t in reversed(traces) if route is None or t["route"] == route][:limit]
+        return [{k: v for k, v in t.items() if k != "spans"} for t in traces]
+
+
+def apply_headers(response, summary):
+    response.headers["X-Trace-Id"] = summary["id"]
+    response.headers["X-Supabase-Calls"] = str(summary["calls"])
+    response.headers["X-Supabase-Round-Trips"] = str(summary["round_trips"])
+    response.headers.add("Server-Timing", f'supabase;dur={summary["supabase_ms"]};'
+                                          f'desc="{summary["calls"]} calls, {summary["round_trips"]} round trips"')
+
+
+class RoundTripBudgetExceeded(AssertionError):
+    """A route made more Supabase calls or serial round trips than its budget allows"""
+
+
+def assert_round_trips(response, max_round_trips=None, max_calls=None, traces=None):
+    """Fail if a traced response went over budget. Pass `traces` (the app's TraceBuffer) for span detail."""
+    calls = response.headers.get("X-Supabase-Calls")
+    round_trips = response.headers.get("X-Supabase-Round-Trips")
+    if calls is None or round_trips is None:
+        raise AssertionError("Response has no Supabase trace headers; is SUPABASE_TRACE=1 set for the app?")
+    over = []
+    if max_round_trips is not None and int(round_trips) > max_round_trips:
+        over.append(f"{round_trips} round trips (budget {max_round_trips})")
+    if max_calls is not None and int(calls) > max_calls:
+        over.append(f"{calls} calls (budget {max_calls})")
+    if over:
+        detail = ""
+        summary = traces.get(response.headers.get("X-Trace-Id")) if traces is not None else None
+        if summary:
+            detail = "\n" + "\n".join(json.dumps({k: s[k] for k in ("round_trip", "mode", "service", "operation",
+                                                                    "target", "duration_ms")})
+                                      for s in summary["spans"])
+        raise RoundTripBudgetExceeded(", ".join(over) + detail)
@@ -0,0 +1,56 @@
+"""
+Small thread-safe in-process cache with per-entry TTL and LRU eviction.
+
+Each worker process has its own copy, so entries are also bounded by a TTL:
+a write handled by another instance becomes visible here after at most `ttl`
+seconds. Writes handled by this process should call `set()`/`invalidate()`.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import Counter
+
+CACHE_LOOKUPS = Counter("cache_lookups_total", "In-process cache lookups", ("cache", "result"))
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Mapping of key -> value that forgets entries after `ttl` seconds or when full"""
+
+    def __init__(self, name, maxsize=1024, ttl=300):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > now:
+                self._data.move_to_end(key)
+                CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+                return entry[1]
+            if entry is not _MISSING:
+                del self._data[key]
+        CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+        return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()